@@ -22,51 +22,67 @@ _runtime_version.ValidateProtobufRuntimeVersion(
 _sym_db = _symbol_database.Default()
 
 
+from google.protobuf import field_mask_pb2 as google_dot_protobuf_dot_field__mask__pb2
+from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0bposts.proto\x12\x05posts\"j\n\x11\x43reatePostRequest\x12\r\n\x05title\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\x12\x12\n\nis_private\x18\x04 \x01(\x08\x12\x0c\n\x04tags\x18\x05 \x03(\t\"2\n\x0eGetPostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\"{\n\x11UpdatePostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\x12\r\n\x05title\x18\x03 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x04 \x01(\t\x12\x12\n\nis_private\x18\x05 \x01(\x08\x12\x0c\n\x04tags\x18\x06 \x03(\t\"5\n\x11\x44\x65letePostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\"6\n\x12\x44\x65letePostResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"P\n\x10ListPostsRequest\x12\x0c\n\x04page\x18\x01 \x01(\x05\x12\x10\n\x08per_page\x18\x02 \x01(\x05\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\x12\x0b\n\x03tag\x18\x04 \x01(\t\"g\n\x11ListPostsResponse\x12\x1a\n\x05posts\x18\x01 \x03(\x0b\x32\x0b.posts.Post\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\x12\x0c\n\x04page\x18\x03 \x01(\x05\x12\x13\n\x0btotal_pages\x18\x04 \x01(\x05\"\x91\x01\n\x04Post\x12\n\n\x02id\x18\x01 \x01(\x05\x12\r\n\x05title\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x0f\n\x07user_id\x18\x04 \x01(\x05\x12\x12\n\nis_private\x18\x05 \x01(\x08\x12\x0c\n\x04tags\x18\x06 \x03(\t\x12\x12\n\ncreated_at\x18\x07 \x01(\t\x12\x12\n\nupdated_at\x18\x08 \x01(\t\"8\n\x0cPostResponse\x12\x19\n\x04post\x18\x01 \x01(\x0b\x32\x0b.posts.Post\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"3\n\x0fViewPostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\"4\n\x10ViewPostResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"3\n\x0fLikePostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\"4\n\x10LikePostResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"I\n\x14\x43reateCommentRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\x12\x0f\n\x07\x63ontent\x18\x03 \x01(\t\"A\n\x0f\x43ommentResponse\x12\x1f\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x0e.posts.Comment\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"\\\n\x07\x43omment\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x0f\n\x07post_id\x18\x02 \x01(\x05\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\x12\x0f\n\x07\x63ontent\x18\x04 \x01(\t\x12\x12\n\ncreated_at\x18\x05 \x01(\t\"F\n\x13ListCommentsRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0c\n\x04page\x18\x02 \x01(\x05\x12\x10\n\x08per_page\x18\x03 \x01(\x05\"p\n\x14ListCommentsResponse\x12 \n\x08\x63omments\x18\x01 \x03(\x0b\x32\x0e.posts.Comment\x12\x13\n\x0btotal_count\x18\x02 \x01(\x05\x12\x0c\n\x04page\x18\x03 \x01(\x05\x12\x13\n\x0btotal_pages\x18\x04 \x01(\x05\x32\xca\x04\n\x0bPostService\x12;\n\nCreatePost\x12\x18.posts.CreatePostRequest\x1a\x13.posts.PostResponse\x12\x35\n\x07GetPost\x12\x15.posts.GetPostRequest\x1a\x13.posts.PostResponse\x12;\n\nUpdatePost\x12\x18.posts.UpdatePostRequest\x1a\x13.posts.PostResponse\x12\x41\n\nDeletePost\x12\x18.posts.DeletePostRequest\x1a\x19.posts.DeletePostResponse\x12>\n\tListPosts\x12\x17.posts.ListPostsRequest\x1a\x18.posts.ListPostsResponse\x12;\n\x08ViewPost\x12\x16.posts.ViewPostRequest\x1a\x17.posts.ViewPostResponse\x12;\n\x08LikePost\x12\x16.posts.LikePostRequest\x1a\x17.posts.LikePostResponse\x12\x44\n\rCreateComment\x12\x1b.posts.CreateCommentRequest\x1a\x16.posts.CommentResponse\x12G\n\x0cListComments\x12\x1a.posts.ListCommentsRequest\x1a\x1b.posts.ListCommentsResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0bposts.proto\x12\x05posts\x1a google/protobuf/field_mask.proto\x1a\x1fgoogle/protobuf/timestamp.proto\"j\n\x11\x43reatePostRequest\x12\r\n\x05title\x18\x01 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x02 \x01(\t\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\x12\x12\n\nis_private\x18\x04 \x01(\x08\x12\x0c\n\x04tags\x18\x05 \x03(\t\"z\n\x0eGetPostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\x12.\n\nfield_mask\x18\x03 \x01(\x0b\x32\x1a.google.protobuf.FieldMask\x12\x16\n\x0e\x65xcerpt_length\x18\x04 \x01(\x05\"9\n\x14\x42\x61tchGetPostsRequest\x12\x10\n\x08post_ids\x18\x01 \x03(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\"L\n\x15\x42\x61tchGetPostsResponse\x12$\n\x07results\x18\x01 \x03(\x0b\x32\x13.posts.PostResponse\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"{\n\x11UpdatePostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\x12\r\n\x05title\x18\x03 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x04 \x01(\t\x12\x12\n\nis_private\x18\x05 \x01(\x08\x12\x0c\n\x04tags\x18\x06 \x03(\t\"5\n\x11\x44\x65letePostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\"6\n\x12\x44\x65letePostResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"\x9d\x02\n\x10ListPostsRequest\x12\x0c\n\x04page\x18\x01 \x01(\x05\x12\x10\n\x08per_page\x18\x02 \x01(\x05\x12\x0f\n\x07user_id\x18\x03 \x01(\x05\x12\x0b\n\x03tag\x18\x04 \x01(\t\x12\x0e\n\x06\x63ursor\x18\x05 \x01(\t\x12\x1b\n\x13include_total_count\x18\x06 \x01(\x08\x12$\n\ncount_mode\x18\x07 \x01(\x0e\x32\x10.posts.CountMode\x12\x0c\n\x04tags\x18\x08 \x03(\t\x12\"\n\ttag_match\x18\t \x01(\x0e\x32\x0f.posts.TagMatch\x12.\n\nfield_mask\x18\n \x01(\x0b\x32\x1a.google.protobuf.FieldMask\x12\x16\n\x0e\x65xcerpt_length\x18\x0b \x01(\x05\"\xed\x01\n\x11ListPostsResponse\x12\x1a\n\x05posts\x18\x01 \x03(\x0b\x32\x0b.posts.Post\x12\x18\n\x0btotal_count\x18\x02 \x01(\x05H\x00\x88\x01\x01\x12\x0c\n\x04page\x18\x03 \x01(\x05\x12\x18\n\x0btotal_pages\x18\x04 \x01(\x05H\x01\x88\x01\x01\x12\x13\n\x0bnext_cursor\x18\x05 \x01(\t\x12\x10\n\x08has_more\x18\x06 \x01(\x08\x12\r\n\x05\x65rror\x18\x07 \x01(\t\x12$\n\ncount_mode\x18\x08 \x01(\x0e\x32\x10.posts.CountModeB\x0e\n\x0c_total_countB\x0e\n\x0c_total_pages\"\x8d\x02\n\x12StreamPostsRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\x05\x12\x0b\n\x03tag\x18\x02 \x01(\t\x12\x11\n\tauthor_id\x18\x03 \x01(\x05\x12\x14\n\x0c\x63reated_from\x18\x04 \x01(\t\x12\x12\n\ncreated_to\x18\x05 \x01(\t\x12\x0e\n\x06\x63ursor\x18\x06 \x01(\t\x12\x12\n\nbatch_size\x18\x07 \x01(\x05\x12\x0c\n\x04tags\x18\x08 \x03(\t\x12\"\n\ttag_match\x18\t \x01(\x0e\x32\x0f.posts.TagMatch\x12.\n\nfield_mask\x18\n \x01(\x0b\x32\x1a.google.protobuf.FieldMask\x12\x16\n\x0e\x65xcerpt_length\x18\x0b \x01(\x05\"O\n\x13StreamPostsResponse\x12\x19\n\x04post\x18\x01 \x01(\x0b\x32\x0b.posts.Post\x12\x0e\n\x06\x63ursor\x18\x02 \x01(\t\x12\r\n\x05\x65rror\x18\x03 \x01(\t\"\xc8\x02\n\x04Post\x12\n\n\x02id\x18\x01 \x01(\x03\x12\r\n\x05title\x18\x02 \x01(\t\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x0f\n\x07user_id\x18\x04 \x01(\x03\x12\x12\n\nis_private\x18\x05 \x01(\x08\x12\x0c\n\x04tags\x18\x06 \x03(\t\x12\x12\n\ncreated_at\x18\x07 \x01(\t\x12\x12\n\nupdated_at\x18\x08 \x01(\t\x12\x13\n\x0blikes_count\x18\t \x01(\x05\x12\x13\n\x0bviews_count\x18\n \x01(\x05\x12\x16\n\x0e\x63omments_count\x18\x0b \x01(\x05\x12\x30\n\x0c\x63reated_time\x18\x0c \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x30\n\x0cupdated_time\x18\r \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x0f\n\x07\x65xcerpt\x18\x0e \x01(\t\"8\n\x0cPostResponse\x12\x19\n\x04post\x18\x01 \x01(\x0b\x32\x0b.posts.Post\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"3\n\x0fViewPostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\"4\n\x10ViewPostResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"`\n\x13RecordViewsResponse\x12(\n\x07results\x18\x01 \x03(\x0b\x32\x17.posts.ViewPostResponse\x12\x10\n\x08recorded\x18\x02 \x01(\x05\x12\r\n\x05\x65rror\x18\x03 \x01(\t\"3\n\x0fLikePostRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\"4\n\x10LikePostResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\"I\n\x14\x43reateCommentRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0f\n\x07user_id\x18\x02 \x01(\x05\x12\x0f\n\x07\x63ontent\x18\x03 \x01(\t\"A\n\x0f\x43ommentResponse\x12\x1f\n\x07\x63omment\x18\x01 \x01(\x0b\x32\x0e.posts.Comment\x12\r\n\x05\x65rror\x18\x02 \x01(\t\"\x8e\x01\n\x07\x43omment\x12\n\n\x02id\x18\x01 \x01(\x03\x12\x0f\n\x07post_id\x18\x02 \x01(\x03\x12\x0f\n\x07user_id\x18\x03 \x01(\x03\x12\x0f\n\x07\x63ontent\x18\x04 \x01(\t\x12\x12\n\ncreated_at\x18\x05 \x01(\t\x12\x30\n\x0c\x63reated_time\x18\x06 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\"s\n\x13ListCommentsRequest\x12\x0f\n\x07post_id\x18\x01 \x01(\x05\x12\x0c\n\x04page\x18\x02 \x01(\x05\x12\x10\n\x08per_page\x18\x03 \x01(\x05\x12\x0e\n\x06\x63ursor\x18\x04 \x01(\t\x12\x1b\n\x13include_total_count\x18\x05 \x01(\x08\"\xd0\x01\n\x14ListCommentsResponse\x12 \n\x08\x63omments\x18\x01 \x03(\x0b\x32\x0e.posts.Comment\x12\x18\n\x0btotal_count\x18\x02 \x01(\x05H\x00\x88\x01\x01\x12\x0c\n\x04page\x18\x03 \x01(\x05\x12\x18\n\x0btotal_pages\x18\x04 \x01(\x05H\x01\x88\x01\x01\x12\x13\n\x0bnext_cursor\x18\x05 \x01(\t\x12\x10\n\x08has_more\x18\x06 \x01(\x08\x12\r\n\x05\x65rror\x18\x07 \x01(\tB\x0e\n\x0c_total_countB\x0e\n\x0c_total_pages*0\n\x08TagMatch\x12\x11\n\rTAG_MATCH_ANY\x10\x00\x12\x11\n\rTAG_MATCH_ALL\x10\x01*\x7f\n\tCountMode\x12\x16\n\x12\x43OUNT_MODE_DEFAULT\x10\x00\x12\x14\n\x10\x43OUNT_MODE_EXACT\x10\x01\x12\x15\n\x11\x43OUNT_MODE_CACHED\x10\x02\x12\x18\n\x14\x43OUNT_MODE_ESTIMATED\x10\x03\x12\x13\n\x0f\x43OUNT_MODE_NONE\x10\x04\x32\xa3\x06\n\x0bPostService\x12;\n\nCreatePost\x12\x18.posts.CreatePostRequest\x1a\x13.posts.PostResponse\x12\x35\n\x07GetPost\x12\x15.posts.GetPostRequest\x1a\x13.posts.PostResponse\x12J\n\rBatchGetPosts\x12\x1b.posts.BatchGetPostsRequest\x1a\x1c.posts.BatchGetPostsResponse\x12;\n\nUpdatePost\x12\x18.posts.UpdatePostRequest\x1a\x13.posts.PostResponse\x12\x41\n\nDeletePost\x12\x18.posts.DeletePostRequest\x1a\x19.posts.DeletePostResponse\x12>\n\tListPosts\x12\x17.posts.ListPostsRequest\x1a\x18.posts.ListPostsResponse\x12\x46\n\x0bStreamPosts\x12\x19.posts.StreamPostsRequest\x1a\x1a.posts.StreamPostsResponse0\x01\x12;\n\x08ViewPost\x12\x16.posts.ViewPostRequest\x1a\x17.posts.ViewPostResponse\x12\x43\n\x0bRecordViews\x12\x16.posts.ViewPostRequest\x1a\x1a.posts.RecordViewsResponse(\x01\x12;\n\x08LikePost\x12\x16.posts.LikePostRequest\x1a\x17.posts.LikePostResponse\x12\x44\n\rCreateComment\x12\x1b.posts.CreateCommentRequest\x1a\x16.posts.CommentResponse\x12G\n\x0cListComments\x12\x1a.posts.ListCommentsRequest\x1a\x1b.posts.ListCommentsResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'posts_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_CREATEPOSTREQUEST']._serialized_start=22
-  _globals['_CREATEPOSTREQUEST']._serialized_end=128
-  _globals['_GETPOSTREQUEST']._serialized_start=130
-  _globals['_GETPOSTREQUEST']._serialized_end=180
-  _globals['_UPDATEPOSTREQUEST']._serialized_start=182
-  _globals['_UPDATEPOSTREQUEST']._serialized_end=305
-  _globals['_DELETEPOSTREQUEST']._serialized_start=307
-  _globals['_DELETEPOSTREQUEST']._serialized_end=360
-  _globals['_DELETEPOSTRESPONSE']._serialized_start=362
-  _globals['_DELETEPOSTRESPONSE']._serialized_end=416
-  _globals['_LISTPOSTSREQUEST']._serialized_start=418
-  _globals['_LISTPOSTSREQUEST']._serialized_end=498
-  _globals['_LISTPOSTSRESPONSE']._serialized_start=500
-  _globals['_LISTPOSTSRESPONSE']._serialized_end=603
-  _globals['_POST']._serialized_start=606
-  _globals['_POST']._serialized_end=751
-  _globals['_POSTRESPONSE']._serialized_start=753
-  _globals['_POSTRESPONSE']._serialized_end=809
-  _globals['_VIEWPOSTREQUEST']._serialized_start=811
-  _globals['_VIEWPOSTREQUEST']._serialized_end=862
-  _globals['_VIEWPOSTRESPONSE']._serialized_start=864
-  _globals['_VIEWPOSTRESPONSE']._serialized_end=916
-  _globals['_LIKEPOSTREQUEST']._serialized_start=918
-  _globals['_LIKEPOSTREQUEST']._serialized_end=969
-  _globals['_LIKEPOSTRESPONSE']._serialized_start=971
-  _globals['_LIKEPOSTRESPONSE']._serialized_end=1023
-  _globals['_CREATECOMMENTREQUEST']._serialized_start=1025
-  _globals['_CREATECOMMENTREQUEST']._serialized_end=1098
-  _globals['_COMMENTRESPONSE']._serialized_start=1100
-  _globals['_COMMENTRESPONSE']._serialized_end=1165
-  _globals['_COMMENT']._serialized_start=1167
-  _globals['_COMMENT']._serialized_end=1259
-  _globals['_LISTCOMMENTSREQUEST']._serialized_start=1261
-  _globals['_LISTCOMMENTSREQUEST']._serialized_end=1331
-  _globals['_LISTCOMMENTSRESPONSE']._serialized_start=1333
-  _globals['_LISTCOMMENTSRESPONSE']._serialized_end=1445
-  _globals['_POSTSERVICE']._serialized_start=1448
-  _globals['_POSTSERVICE']._serialized_end=2034
+  _globals['_TAGMATCH']._serialized_start=2891
+  _globals['_TAGMATCH']._serialized_end=2939
+  _globals['_COUNTMODE']._serialized_start=2941
+  _globals['_COUNTMODE']._serialized_end=3068
+  _globals['_CREATEPOSTREQUEST']._serialized_start=89
+  _globals['_CREATEPOSTREQUEST']._serialized_end=195
+  _globals['_GETPOSTREQUEST']._serialized_start=197
+  _globals['_GETPOSTREQUEST']._serialized_end=319
+  _globals['_BATCHGETPOSTSREQUEST']._serialized_start=321
+  _globals['_BATCHGETPOSTSREQUEST']._serialized_end=378
+  _globals['_BATCHGETPOSTSRESPONSE']._serialized_start=380
+  _globals['_BATCHGETPOSTSRESPONSE']._serialized_end=456
+  _globals['_UPDATEPOSTREQUEST']._serialized_start=458
+  _globals['_UPDATEPOSTREQUEST']._serialized_end=581
+  _globals['_DELETEPOSTREQUEST']._serialized_start=583
+  _globals['_DELETEPOSTREQUEST']._serialized_end=636
+  _globals['_DELETEPOSTRESPONSE']._serialized_start=638
+  _globals['_DELETEPOSTRESPONSE']._serialized_end=692
+  _globals['_LISTPOSTSREQUEST']._serialized_start=695
+  _globals['_LISTPOSTSREQUEST']._serialized_end=980
+  _globals['_LISTPOSTSRESPONSE']._serialized_start=983
+  _globals['_LISTPOSTSRESPONSE']._serialized_end=1220
+  _globals['_STREAMPOSTSREQUEST']._serialized_start=1223
+  _globals['_STREAMPOSTSREQUEST']._serialized_end=1492
+  _globals['_STREAMPOSTSRESPONSE']._serialized_start=1494
+  _globals['_STREAMPOSTSRESPONSE']._serialized_end=1573
+  _globals['_POST']._serialized_start=1576
+  _globals['_POST']._serialized_end=1904
+  _globals['_POSTRESPONSE']._serialized_start=1906
+  _globals['_POSTRESPONSE']._serialized_end=1962
+  _globals['_VIEWPOSTREQUEST']._serialized_start=1964
+  _globals['_VIEWPOSTREQUEST']._serialized_end=2015
+  _globals['_VIEWPOSTRESPONSE']._serialized_start=2017
+  _globals['_VIEWPOSTRESPONSE']._serialized_end=2069
+  _globals['_RECORDVIEWSRESPONSE']._serialized_start=2071
+  _globals['_RECORDVIEWSRESPONSE']._serialized_end=2167
+  _globals['_LIKEPOSTREQUEST']._serialized_start=2169
+  _globals['_LIKEPOSTREQUEST']._serialized_end=2220
+  _globals['_LIKEPOSTRESPONSE']._serialized_start=2222
+  _globals['_LIKEPOSTRESPONSE']._serialized_end=2274
+  _globals['_CREATECOMMENTREQUEST']._serialized_start=2276
+  _globals['_CREATECOMMENTREQUEST']._serialized_end=2349
+  _globals['_COMMENTRESPONSE']._serialized_start=2351
+  _globals['_COMMENTRESPONSE']._serialized_end=2416
+  _globals['_COMMENT']._serialized_start=2419
+  _globals['_COMMENT']._serialized_end=2561
+  _globals['_LISTCOMMENTSREQUEST']._serialized_start=2563
+  _globals['_LISTCOMMENTSREQUEST']._serialized_end=2678
+  _globals['_LISTCOMMENTSRESPONSE']._serialized_start=2681
+  _globals['_LISTCOMMENTSRESPONSE']._serialized_end=2889
+  _globals['_POSTSERVICE']._serialized_start=3071
+  _globals['_POSTSERVICE']._serialized_end=3874
 # @@protoc_insertion_point(module_scope)
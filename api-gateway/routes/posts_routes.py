@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from marshmallow import Schema, fields, ValidationError, validate
 import jwt
 import grpc
+from google.protobuf.field_mask_pb2 import FieldMask
 from datetime import datetime
 from functools import wraps
 import posts_pb2
@@ -10,6 +11,14 @@ from config import Config
 
 posts_blueprint = Blueprint('posts', __name__)
 
+COUNT_MODES = {
+    'exact': posts_pb2.COUNT_MODE_EXACT,
+    'cached': posts_pb2.COUNT_MODE_CACHED,
+    'estimated': posts_pb2.COUNT_MODE_ESTIMATED,
+    'none': posts_pb2.COUNT_MODE_NONE
+}
+COUNT_MODE_NAMES = {value: name for name, value in COUNT_MODES.items()}
+
 
 class PostCreateSchema(Schema):
     title = fields.String(required=True, validate=validate.Length(min=1, max=255))
@@ -25,10 +34,30 @@ class PostUpdateSchema(Schema):
     tags = fields.List(fields.String())
 
 
-class PaginationSchema(Schema):
+class BatchGetSchema(Schema):
+    post_ids = fields.List(fields.Integer(), required=True, validate=validate.Length(min=1, max=100))
+
+
+class RecordViewsSchema(Schema):
+    post_ids = fields.List(fields.Integer(), required=True, validate=validate.Length(min=1, max=1000))
+
+
+class PostFieldsSchema(Schema):
+    # Comma-separated post fields to return, e.g. ?fields=title,user_id,likes_count,excerpt
+    field_names = fields.String(data_key='fields', load_default=None)
+    excerpt_length = fields.Integer(load_default=0, validate=validate.Range(min=1, max=10000))
+
+
+class PaginationSchema(PostFieldsSchema):
     page = fields.Integer(load_default=1, validate=validate.Range(min=1))
     per_page = fields.Integer(load_default=10, validate=validate.Range(min=1, max=100))
     tag = fields.String(load_default=None)
+    tags = fields.String(load_default=None)
+    tag_match = fields.String(load_default='any', validate=validate.OneOf(['any', 'all']))
+    cursor = fields.String(load_default=None)
+    include_total = fields.Boolean(load_default=False)
+    count_mode = fields.String(load_default=None,
+                               validate=validate.OneOf(['exact', 'cached', 'estimated', 'none']))
 
 
 class CommentCreateSchema(Schema):
@@ -38,6 +67,8 @@ class CommentCreateSchema(Schema):
 class CommentPaginationSchema(Schema):
     page = fields.Integer(load_default=1, validate=validate.Range(min=1))
     per_page = fields.Integer(load_default=10, validate=validate.Range(min=1, max=100))
+    cursor = fields.String(load_default=None)
+    include_total = fields.Boolean(load_default=False)
 
 
 def token_required(f):
@@ -66,6 +97,62 @@ def token_required(f):
     return decorated
 
 
+def message_time(message, field, legacy_field):
+    """ISO time of a Post/Comment message, from the Timestamp field when the
+    posts service sets it and from the legacy string field otherwise"""
+    if message.HasField(field):
+        return getattr(message, field).ToDatetime().isoformat()
+    return getattr(message, legacy_field)
+
+
+def split_fields(field_names):
+    if not field_names:
+        return None
+    return [name.strip() for name in field_names.split(',') if name.strip()]
+
+
+def field_mask(field_names):
+    return FieldMask(paths=field_names or [])
+
+
+def post_to_dict(post, field_names=None):
+    data = {
+        'id': post.id,
+        'title': post.title,
+        'description': post.description,
+        'user_id': post.user_id,
+        'is_private': post.is_private,
+        'tags': list(post.tags),
+        'created_at': message_time(post, 'created_time', 'created_at'),
+        'updated_at': message_time(post, 'updated_time', 'updated_at'),
+        'likes_count': post.likes_count,
+        'views_count': post.views_count,
+        'comments_count': post.comments_count
+    }
+    if field_names is None:
+        return data
+
+    data['excerpt'] = post.excerpt
+    return {name: value for name, value in data.items() if name == 'id' or name in field_names}
+
+
+def comment_to_dict(comment):
+    return {
+        'id': comment.id,
+        'post_id': comment.post_id,
+        'user_id': comment.user_id,
+        'content': comment.content,
+        'created_at': message_time(comment, 'created_time', 'created_at')
+    }
+
+
+def rpc_error_response(error):
+    # The posts service stops working on requests whose deadline has passed
+    if error.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+        return jsonify({'error': 'Posts service did not respond in time'}), 504
+    return jsonify({'error': f"gRPC error: {error.details()}"}), 500
+
+
 def get_posts_stub():
     channel = grpc.insecure_channel(f"{Config.POSTS_SERVICE_URL}:{Config.POSTS_SERVICE_PORT}")
     return posts_pb2_grpc.PostServiceStub(channel)
@@ -88,28 +175,19 @@ def create_post(user_id):
             tags=data['tags']
         )
 
-        response = stub.CreatePost(request_proto)
+        response = stub.CreatePost(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
 
         if response.error:
             return jsonify({'error': response.error}), 400
 
-        post = {
-            'id': response.post.id,
-            'title': response.post.title,
-            'description': response.post.description,
-            'user_id': response.post.user_id,
-            'is_private': response.post.is_private,
-            'tags': list(response.post.tags),
-            'created_at': response.post.created_at,
-            'updated_at': response.post.updated_at
-        }
+        post = post_to_dict(response.post)
 
         return jsonify(post), 201
 
     except ValidationError as err:
         return jsonify({'error': 'Ошибка валидации', 'details': err.messages}), 400
     except grpc.RpcError as e:
-        return jsonify({'error': f"gRPC error: {e.details()}"}), 500
+        return rpc_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -118,14 +196,19 @@ def create_post(user_id):
 @token_required
 def get_post(user_id, post_id):
     try:
+        params = PostFieldsSchema().load(request.args)
+        field_names = split_fields(params['field_names'])
+
         stub = get_posts_stub()
 
         request_proto = posts_pb2.GetPostRequest(
             post_id=post_id,
-            user_id=user_id
+            user_id=user_id,
+            field_mask=field_mask(field_names),
+            excerpt_length=params['excerpt_length']
         )
 
-        response = stub.GetPost(request_proto)
+        response = stub.GetPost(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
 
         if response.error:
             if "not found" in response.error:
@@ -135,21 +218,51 @@ def get_post(user_id, post_id):
             else:
                 return jsonify({'error': response.error}), 400
 
-        post = {
-            'id': response.post.id,
-            'title': response.post.title,
-            'description': response.post.description,
-            'user_id': response.post.user_id,
-            'is_private': response.post.is_private,
-            'tags': list(response.post.tags),
-            'created_at': response.post.created_at,
-            'updated_at': response.post.updated_at
-        }
+        post = post_to_dict(response.post, field_names)
 
         return jsonify(post), 200
 
+    except ValidationError as err:
+        return jsonify({'error': 'Ошибка валидации', 'details': err.messages}), 400
+    except grpc.RpcError as e:
+        return rpc_error_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@posts_blueprint.route('/posts:batchGet', methods=['POST'])
+@token_required
+def batch_get_posts(user_id):
+    try:
+        schema = BatchGetSchema()
+        data = schema.load(request.json)
+
+        stub = get_posts_stub()
+
+        request_proto = posts_pb2.BatchGetPostsRequest(
+            post_ids=data['post_ids'],
+            user_id=user_id
+        )
+
+        response = stub.BatchGetPosts(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
+
+        if response.error:
+            return jsonify({'error': response.error}), 400
+
+        results = []
+        for post_id, item in zip(data['post_ids'], response.results):
+            results.append({
+                'post_id': post_id,
+                'post': post_to_dict(item.post) if not item.error else None,
+                'error': item.error or None
+            })
+
+        return jsonify({'results': results}), 200
+
+    except ValidationError as err:
+        return jsonify({'error': 'Ошибка валидации', 'details': err.messages}), 400
     except grpc.RpcError as e:
-        return jsonify({'error': f"gRPC error: {e.details()}"}), 500
+        return rpc_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -172,7 +285,7 @@ def update_post(user_id, post_id):
             tags=data.get('tags', [])
         )
 
-        response = stub.UpdatePost(request_proto)
+        response = stub.UpdatePost(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
 
         if response.error:
             if "not found" in response.error:
@@ -182,23 +295,14 @@ def update_post(user_id, post_id):
             else:
                 return jsonify({'error': response.error}), 400
 
-        post = {
-            'id': response.post.id,
-            'title': response.post.title,
-            'description': response.post.description,
-            'user_id': response.post.user_id,
-            'is_private': response.post.is_private,
-            'tags': list(response.post.tags),
-            'created_at': response.post.created_at,
-            'updated_at': response.post.updated_at
-        }
+        post = post_to_dict(response.post)
 
         return jsonify(post), 200
 
     except ValidationError as err:
         return jsonify({'error': 'Ошибка валидации', 'details': err.messages}), 400
     except grpc.RpcError as e:
-        return jsonify({'error': f"gRPC error: {e.details()}"}), 500
+        return rpc_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -214,7 +318,7 @@ def delete_post(user_id, post_id):
             user_id=user_id
         )
 
-        response = stub.DeletePost(request_proto)
+        response = stub.DeletePost(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
 
         if not response.success:
             if "not found" in response.message:
@@ -227,7 +331,7 @@ def delete_post(user_id, post_id):
         return jsonify({'message': response.message}), 200
 
     except grpc.RpcError as e:
-        return jsonify({'error': f"gRPC error: {e.details()}"}), 500
+        return rpc_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -238,6 +342,7 @@ def list_posts(user_id):
     try:
         schema = PaginationSchema()
         params = schema.load(request.args)
+        field_names = split_fields(params['field_names'])
 
         stub = get_posts_stub()
 
@@ -245,29 +350,33 @@ def list_posts(user_id):
             page=params['page'],
             per_page=params['per_page'],
             user_id=user_id,
-            tag=params['tag'] or ""
+            tag=params['tag'] or "",
+            cursor=params['cursor'] or "",
+            include_total_count=params['include_total'],
+            count_mode=COUNT_MODES.get(params['count_mode'], posts_pb2.COUNT_MODE_DEFAULT),
+            tags=[tag.strip() for tag in (params['tags'] or '').split(',') if tag.strip()],
+            tag_match=posts_pb2.TAG_MATCH_ALL if params['tag_match'] == 'all' else posts_pb2.TAG_MATCH_ANY,
+            field_mask=field_mask(field_names),
+            excerpt_length=params['excerpt_length']
         )
 
-        response = stub.ListPosts(request_proto)
+        response = stub.ListPosts(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
+
+        if response.error:
+            return jsonify({'error': response.error}), 400
 
         posts = []
         for post in response.posts:
-            posts.append({
-                'id': post.id,
-                'title': post.title,
-                'description': post.description,
-                'user_id': post.user_id,
-                'is_private': post.is_private,
-                'tags': list(post.tags),
-                'created_at': post.created_at,
-                'updated_at': post.updated_at
-            })
+            posts.append(post_to_dict(post, field_names))
 
         result = {
             'posts': posts,
-            'total_count': response.total_count,
+            'total_count': response.total_count if response.HasField('total_count') else None,
             'page': response.page,
-            'total_pages': response.total_pages
+            'total_pages': response.total_pages if response.HasField('total_pages') else None,
+            'next_cursor': response.next_cursor or None,
+            'has_more': response.has_more,
+            'count_mode': COUNT_MODE_NAMES.get(response.count_mode)
         }
 
         return jsonify(result), 200
@@ -275,7 +384,7 @@ def list_posts(user_id):
     except ValidationError as err:
         return jsonify({'error': 'Ошибка валидации', 'details': err.messages}), 400
     except grpc.RpcError as e:
-        return jsonify({'error': f"gRPC error: {e.details()}"}), 500
+        return rpc_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -293,7 +402,7 @@ def view_post(user_id, post_id):
             user_id=user_id
         )
 
-        response = stub.ViewPost(request_proto)
+        response = stub.ViewPost(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
 
         if not response.success:
             if "not found" in response.message:
@@ -306,7 +415,44 @@ def view_post(user_id, post_id):
         return jsonify({'message': response.message}), 200
 
     except grpc.RpcError as e:
-        return jsonify({'error': f"gRPC error: {e.details()}"}), 500
+        return rpc_error_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@posts_blueprint.route('/posts:recordViews', methods=['POST'])
+@token_required
+def record_views(user_id):
+    try:
+        schema = RecordViewsSchema()
+        data = schema.load(request.json)
+
+        stub = get_posts_stub()
+
+        requests = (
+            posts_pb2.ViewPostRequest(post_id=post_id, user_id=user_id)
+            for post_id in data['post_ids']
+        )
+
+        response = stub.RecordViews(requests, timeout=Config.POSTS_RPC_TIMEOUT)
+
+        results = []
+        for post_id, item in zip(data['post_ids'], response.results):
+            results.append({
+                'post_id': post_id,
+                'recorded': item.success,
+                'error': item.message if not item.success else None
+            })
+
+        if response.error:
+            return jsonify({'error': response.error, 'results': results}), 500
+
+        return jsonify({'results': results, 'recorded': response.recorded}), 200
+
+    except ValidationError as err:
+        return jsonify({'error': 'Ошибка валидации', 'details': err.messages}), 400
+    except grpc.RpcError as e:
+        return rpc_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -322,7 +468,7 @@ def like_post(user_id, post_id):
             user_id=user_id
         )
 
-        response = stub.LikePost(request_proto)
+        response = stub.LikePost(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
 
         if not response.success:
             if "not found" in response.message:
@@ -335,7 +481,7 @@ def like_post(user_id, post_id):
         return jsonify({'message': response.message}), 200
 
     except grpc.RpcError as e:
-        return jsonify({'error': f"gRPC error: {e.details()}"}), 500
+        return rpc_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -355,7 +501,7 @@ def create_comment(user_id, post_id):
             content=data['content']
         )
 
-        response = stub.CreateComment(request_proto)
+        response = stub.CreateComment(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
 
         if response.error:
             if "not found" in response.error:
@@ -365,20 +511,12 @@ def create_comment(user_id, post_id):
             else:
                 return jsonify({'error': response.error}), 400
 
-        comment = {
-            'id': response.comment.id,
-            'post_id': response.comment.post_id,
-            'user_id': response.comment.user_id,
-            'content': response.comment.content,
-            'created_at': response.comment.created_at
-        }
-
-        return jsonify(comment), 201
+        return jsonify(comment_to_dict(response.comment)), 201
 
     except ValidationError as err:
         return jsonify({'error': 'Ошибка валидации', 'details': err.messages}), 400
     except grpc.RpcError as e:
-        return jsonify({'error': f"gRPC error: {e.details()}"}), 500
+        return rpc_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -395,26 +533,28 @@ def list_comments(user_id, post_id):
         request_proto = posts_pb2.ListCommentsRequest(
             post_id=post_id,
             page=params['page'],
-            per_page=params['per_page']
+            per_page=params['per_page'],
+            cursor=params['cursor'] or "",
+            include_total_count=params['include_total']
         )
 
-        response = stub.ListComments(request_proto)
+        response = stub.ListComments(request_proto, timeout=Config.POSTS_RPC_TIMEOUT)
 
-        comments = []
-        for comment in response.comments:
-            comments.append({
-                'id': comment.id,
-                'post_id': comment.post_id,
-                'user_id': comment.user_id,
-                'content': comment.content,
-                'created_at': comment.created_at
-            })
+        if response.error:
+            if "not found" in response.error:
+                return jsonify({'error': response.error}), 404
+            else:
+                return jsonify({'error': response.error}), 400
+
+        comments = [comment_to_dict(comment) for comment in response.comments]
 
         result = {
             'comments': comments,
-            'total_count': response.total_count,
+            'total_count': response.total_count if response.HasField('total_count') else None,
             'page': response.page,
-            'total_pages': response.total_pages
+            'total_pages': response.total_pages if response.HasField('total_pages') else None,
+            'next_cursor': response.next_cursor or None,
+            'has_more': response.has_more
         }
 
         return jsonify(result), 200
@@ -422,6 +562,6 @@ def list_comments(user_id, post_id):
     except ValidationError as err:
         return jsonify({'error': 'Ошибка валидации', 'details': err.messages}), 400
     except grpc.RpcError as e:
-        return jsonify({'error': f"gRPC error: {e.details()}"}), 500
+        return rpc_error_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
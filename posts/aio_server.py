@@ -0,0 +1,187 @@
+import grpc
+import posts_pb2
+import posts_pb2_grpc
+from async_posts_service import AsyncPostsService
+from converters import (
+    get_post_params, list_posts_params, stream_posts_params, list_comments_params,
+    post_response, batch_get_posts_response, list_posts_response, stream_posts_response,
+    comment_response, list_comments_response, record_views_response,
+    async_view_batches
+)
+from server import start_invalidation_listener, start_outbox_relay, server_options
+from interceptors import AsyncMetricsInterceptor, AsyncDeadlineInterceptor
+from grpc_health.v1 import health, health_pb2_grpc
+from health import watch_readiness
+from models import init_async_db
+from config import Config
+import asyncio
+import logging
+import signal
+
+
+class AsyncPostServicer(posts_pb2_grpc.PostServiceServicer):
+    """PostServicer for grpc.aio: same requests and responses, backed by AsyncPostsService"""
+
+    def __init__(self, posts_service):
+        self.posts_service = posts_service
+
+    async def CreatePost(self, request, context):
+        post, error = await self.posts_service.create_post(
+            title=request.title,
+            description=request.description,
+            user_id=request.user_id,
+            is_private=request.is_private,
+            tags=list(request.tags)
+        )
+
+        return post_response(post, error)
+
+    async def GetPost(self, request, context):
+        params = get_post_params(request)
+        post, error = await self.posts_service.get_post(**params)
+
+        return post_response(post, error, params['fields'])
+
+    async def BatchGetPosts(self, request, context):
+        results, error = await self.posts_service.batch_get_posts(
+            post_ids=list(request.post_ids),
+            user_id=request.user_id
+        )
+
+        return batch_get_posts_response(results, error)
+
+    async def UpdatePost(self, request, context):
+        post, error = await self.posts_service.update_post(
+            post_id=request.post_id,
+            user_id=request.user_id,
+            title=request.title,
+            description=request.description,
+            is_private=request.is_private,
+            tags=list(request.tags)
+        )
+
+        return post_response(post, error)
+
+    async def DeletePost(self, request, context):
+        success, message = await self.posts_service.delete_post(
+            post_id=request.post_id,
+            user_id=request.user_id
+        )
+
+        return posts_pb2.DeletePostResponse(
+            success=success,
+            message=message
+        )
+
+    async def ListPosts(self, request, context):
+        params = list_posts_params(request)
+        result, error = await self.posts_service.list_posts(**params)
+
+        return list_posts_response(result, error, params['fields'])
+
+    async def StreamPosts(self, request, context):
+        params = stream_posts_params(request)
+        posts, error = self.posts_service.stream_posts(**params)
+
+        if error:
+            yield posts_pb2.StreamPostsResponse(error=error)
+            return
+
+        async for post, cursor in posts:
+            yield stream_posts_response(post, cursor, params['fields'])
+
+    async def ViewPost(self, request, context):
+        success, message = await self.posts_service.view_post(
+            post_id=request.post_id,
+            user_id=request.user_id
+        )
+
+        return posts_pb2.ViewPostResponse(
+            success=success,
+            message=message
+        )
+
+    async def RecordViews(self, request_iterator, context):
+        results = []
+        recorded = 0
+        async for views in async_view_batches(request_iterator, Config.RECORD_VIEWS_BATCH_SIZE):
+            result, error = await self.posts_service.record_views(views)
+            if error:
+                return record_views_response(results, recorded, error)
+            results.extend(result['results'])
+            recorded += result['recorded']
+
+        return record_views_response(results, recorded, None)
+
+    async def LikePost(self, request, context):
+        success, message = await self.posts_service.like_post(
+            post_id=request.post_id,
+            user_id=request.user_id
+        )
+
+        return posts_pb2.LikePostResponse(
+            success=success,
+            message=message
+        )
+
+    async def CreateComment(self, request, context):
+        comment, error = await self.posts_service.create_comment(
+            post_id=request.post_id,
+            user_id=request.user_id,
+            content=request.content
+        )
+
+        return comment_response(comment, error)
+
+    async def ListComments(self, request, context):
+        result, error = await self.posts_service.list_comments(**list_comments_params(request))
+
+        return list_comments_response(result, error)
+
+
+async def serve():
+    db_session = await init_async_db(Config.ASYNC_DATABASE_URL)
+    posts_service = AsyncPostsService(db_session)
+
+    invalidation_listener = start_invalidation_listener(posts_service.post_cache, posts_service.count_cache)
+    outbox_relay = start_outbox_relay(posts_service.event_producer)
+
+    server = grpc.aio.server(
+        interceptors=[AsyncMetricsInterceptor(), AsyncDeadlineInterceptor()],
+        options=server_options(),
+        maximum_concurrent_rpcs=Config.MAX_CONCURRENT_RPCS or None
+    )
+    posts_pb2_grpc.add_PostServiceServicer_to_server(
+        AsyncPostServicer(posts_service), server
+    )
+    health_servicer = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+
+    server.add_insecure_port(f'[::]:{Config.GRPC_PORT}')
+    await server.start()
+    readiness = asyncio.create_task(watch_readiness(
+        health_servicer, db_session.kw['bind'], posts_service.event_producer, Config.READINESS_INTERVAL
+    ))
+
+    logging.info(f"Posts gRPC asyncio server started on port {Config.GRPC_PORT}")
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+
+    await stopped.wait()
+    readiness.cancel()
+    await health_servicer.enter_graceful_shutdown()
+    await server.stop(0)
+    if invalidation_listener:
+        invalidation_listener.stop()
+    if outbox_relay:
+        outbox_relay.stop()
+        await asyncio.to_thread(outbox_relay.join)
+    await asyncio.to_thread(posts_service.event_producer.close)
+    logging.info("Posts gRPC asyncio server stopped")
+
+
+if __name__ == '__main__':
+    asyncio.run(serve())
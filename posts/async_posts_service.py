@@ -0,0 +1,384 @@
+from sqlalchemy import select, func
+from models import Post, Comment, PostRow, CommentRow
+from kafka_producer import EventProducer
+from outbox import comment_event
+from pagination import encode_cursor, decode_cursor
+from count_cache import CountCache, count_key
+from post_cache import PostCache
+from posts_service import (
+    merge_tags, check_fields, with_excerpt, view_results, new_post, access_error, owner_error,
+    interaction_error, like_message, batch_results, update_fields, stream_filters, to_post_row, count_mode_for,
+    posts_page, comments_page
+)
+from queries import (
+    post_rows, filter_visible, filter_tags, stream_posts_statement, post_row_statement, paginate,
+    explain_statement, increment_counters_statement, comments_count_statement,
+    view_post_statement, record_views_statement, toggle_like_statement
+)
+from config import Config
+import asyncio
+import logging
+
+
+class AsyncPostsService:
+    """asyncio variant of PostsService for the grpc.aio server.
+
+    Methods take the same arguments and return the same results as in
+    PostsService, built by the same statements (queries.py) and result
+    helpers (posts_service.py). Database calls are awaited on an AsyncSession
+    (asyncpg), so an RPC waiting for Postgres does not hold a thread.
+    Interaction events go through the outbox; cache invalidation sends run in
+    the default executor.
+    """
+
+    def __init__(self, db_session):
+        self.db_session = db_session
+        self.event_producer = EventProducer(Config.KAFKA_BOOTSTRAP_SERVERS)
+        self.count_cache = CountCache(Config.COUNT_CACHE_TTL, Config.COUNT_CACHE_SIZE)
+        self.post_cache = PostCache(
+            Config.POST_CACHE_SIZE,
+            Config.POST_CACHE_TTL,
+            Config.POST_CACHE_STATS_INTERVAL
+        )
+
+    async def _send(self, send, **kwargs):
+        return await asyncio.to_thread(send, **kwargs)
+
+    async def _invalidate_post(self, post_id, version=None):
+        if not self.post_cache.enabled:
+            return
+
+        self.post_cache.invalidate(post_id, version)
+        if Config.POST_CACHE_INVALIDATION_TOPIC:
+            await self._send(
+                self.event_producer.send_cache_invalidation_event,
+                topic=Config.POST_CACHE_INVALIDATION_TOPIC,
+                post_id=post_id,
+                version=version
+            )
+
+    async def _invalidate_counts(self, author_id, tags, is_public):
+        if not self.count_cache.enabled:
+            return
+
+        self.count_cache.invalidate(author_id, tags, is_public)
+        if Config.POST_CACHE_INVALIDATION_TOPIC:
+            await self._send(
+                self.event_producer.send_count_invalidation_event,
+                topic=Config.POST_CACHE_INVALIDATION_TOPIC,
+                author_id=author_id,
+                tags=tags,
+                is_public=is_public
+            )
+
+    async def create_post(self, title, description, user_id, is_private=False, tags=None):
+        async with self.db_session() as session:
+            try:
+                post = new_post(title, description, user_id, is_private, tags)
+                session.add(post)
+                await session.commit()
+                await self._invalidate_counts(user_id, tags, not is_private)
+                return PostRow.from_post(post), None
+            except Exception as e:
+                await session.rollback()
+                logging.error(f"Error creating post: {str(e)}")
+                return None, str(e)
+
+    async def _load_post(self, session, post_id):
+        return (await session.execute(select(Post).where(Post.id == post_id))).scalar_one_or_none()
+
+    async def get_post(self, post_id, user_id, fields=None, excerpt_length=None):
+        error = check_fields(fields)
+        if error:
+            return None, error
+        excerpt_length = excerpt_length or Config.EXCERPT_LENGTH
+
+        snapshot = self.post_cache.get(post_id)
+        if snapshot is None:
+            async with self.db_session() as session:
+                try:
+                    if fields is not None and 'description' not in fields:
+                        row = (await session.execute(post_row_statement(post_id, fields, excerpt_length))).first()
+                        if not row:
+                            return None, "Post not found"
+                        snapshot = PostRow.from_row(row)
+                    else:
+                        post = await self._load_post(session, post_id)
+
+                        if not post:
+                            return None, "Post not found"
+
+                        snapshot = PostRow.from_post(post)
+                        self.post_cache.put(post_id, snapshot, post.updated_at)
+                except Exception as e:
+                    logging.error(f"Error getting post: {str(e)}")
+                    return None, str(e)
+
+        error = access_error(snapshot, user_id)
+        if error:
+            return None, error
+
+        return with_excerpt(snapshot, fields, excerpt_length), None
+
+    async def batch_get_posts(self, post_ids, user_id):
+        if len(post_ids) > Config.BATCH_GET_MAX_IDS:
+            return None, f"Too many post ids: at most {Config.BATCH_GET_MAX_IDS} per request"
+
+        async with self.db_session() as session:
+            try:
+                unique_ids = list(dict.fromkeys(post_ids))
+                rows = []
+                if unique_ids:
+                    rows = await session.execute(post_rows(select(Post)).where(Post.id.in_(unique_ids)))
+                return batch_results(post_ids, rows, user_id), None
+            except Exception as e:
+                logging.error(f"Error batch getting posts: {str(e)}")
+                return None, str(e)
+
+    async def update_post(self, post_id, user_id, title=None, description=None, is_private=None, tags=None):
+        async with self.db_session() as session:
+            try:
+                post = await self._load_post(session, post_id)
+
+                if not post:
+                    return None, "Post not found"
+
+                error = owner_error(post, user_id)
+                if error:
+                    return None, error
+
+                moved = update_fields(post, title, description, is_private, tags)
+                await session.commit()
+
+                await self._invalidate_post(post_id, post.updated_at)
+                if moved:
+                    await self._invalidate_counts(*moved)
+
+                return PostRow.from_post(post), None
+            except Exception as e:
+                await session.rollback()
+                logging.error(f"Error updating post: {str(e)}")
+                return None, str(e)
+
+    async def delete_post(self, post_id, user_id):
+        async with self.db_session() as session:
+            try:
+                post = await self._load_post(session, post_id)
+
+                if not post:
+                    return False, "Post not found"
+
+                error = owner_error(post, user_id)
+                if error:
+                    return False, error
+
+                tags = list(post.tags or [])
+                is_public = not post.is_private
+
+                await session.delete(post)
+                await session.commit()
+
+                await self._invalidate_counts(user_id, tags, is_public)
+                await self._invalidate_post(post_id)
+
+                return True, "Post deleted successfully"
+            except Exception as e:
+                await session.rollback()
+                logging.error(f"Error deleting post: {str(e)}")
+                return False, str(e)
+
+    async def _count_posts(self, session, query, count_mode, user_id, tags, match_all):
+        """Same modes and fallbacks as PostsService._count_posts"""
+        count_mode = count_mode_for(count_mode, tags)
+        if count_mode == 'none':
+            return None, 'none'
+
+        ids = query.with_only_columns(Post.id)
+
+        if count_mode == 'estimated':
+            plan = await session.scalar(explain_statement(ids, session.get_bind().dialect))
+            return int(plan[0]['Plan']['Plan Rows']), 'estimated'
+
+        count = select(func.count()).select_from(ids.subquery())
+
+        if count_mode == 'cached':
+            key = count_key(user_id, tags, match_all)
+            total_count = self.count_cache.get(key)
+            if total_count is None:
+                generation = self.count_cache.generation()
+                total_count = await session.scalar(count)
+                self.count_cache.set(key, total_count, generation)
+            return total_count, 'cached'
+
+        return await session.scalar(count), 'exact'
+
+    async def list_posts(self, page=1, per_page=10, user_id=None, tag=None, cursor=None, count_mode='exact',
+                         tags=None, match_all=False, fields=None, excerpt_length=None):
+        error = check_fields(fields)
+        if error:
+            return None, error
+        tags = merge_tags(tag, tags)
+
+        position = None
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+            except ValueError as e:
+                return None, str(e)
+
+        async with self.db_session() as session:
+            try:
+                query = filter_tags(select(Post), tags, match_all)
+                query = filter_visible(query, user_id)
+
+                total_count, count_mode = await self._count_posts(
+                    session, query, count_mode, user_id, tags, match_all
+                )
+
+                query = post_rows(query, fields, excerpt_length or Config.EXCERPT_LENGTH)
+                rows = await session.execute(paginate(query, position, page, per_page, Post.created_at, Post.id))
+                return posts_page(rows, fields, page, per_page, total_count, count_mode), None
+            except Exception as e:
+                logging.error(f"Error listing posts: {str(e)}")
+                return None, str(e)
+
+    def stream_posts(self, user_id=None, tag=None, author_id=None, created_from=None, created_to=None,
+                     cursor=None, batch_size=None, tags=None, match_all=False, fields=None, excerpt_length=None):
+        """Returns (async iterator, error); see PostsService.stream_posts"""
+        error = check_fields(fields)
+        if error:
+            return None, error
+        try:
+            position, created_from, created_to = stream_filters(cursor, created_from, created_to)
+        except ValueError as e:
+            return None, str(e)
+
+        return self._iter_posts(
+            user_id, merge_tags(tag, tags), match_all, author_id, created_from, created_to, position,
+            batch_size or Config.STREAM_BATCH_SIZE, fields, excerpt_length or Config.EXCERPT_LENGTH
+        ), None
+
+    async def _iter_posts(self, user_id, tags, match_all, author_id, created_from, created_to, position,
+                          batch_size, fields, excerpt_length):
+        async with self.db_session() as session:
+            try:
+                query = stream_posts_statement(
+                    user_id, tags, match_all, author_id, created_from, created_to, position, fields, excerpt_length
+                ).execution_options(yield_per=batch_size)
+
+                async for row in await session.stream(query):
+                    post = to_post_row(row, fields)
+                    yield post, encode_cursor(post.created_at, post.id)
+            except Exception as e:
+                logging.error(f"Error streaming posts: {str(e)}")
+                raise
+
+    async def view_post(self, post_id, user_id):
+        async with self.db_session() as session:
+            try:
+                result = (await session.execute(view_post_statement(post_id, user_id))).one()
+
+                error = interaction_error(result)
+                if error:
+                    return False, error
+
+                await session.commit()
+
+                return True, "Post viewed successfully"
+            except Exception as e:
+                await session.rollback()
+                logging.error(f"Error viewing post: {str(e)}")
+                return False, str(e)
+
+    async def record_views(self, views):
+        unique_views = list(dict.fromkeys(views))
+        if not unique_views:
+            return {'results': [], 'recorded': 0}, None
+
+        async with self.db_session() as session:
+            try:
+                rows = (await session.execute(record_views_statement(unique_views))).all()
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                logging.error(f"Error recording views: {str(e)}")
+                return None, str(e)
+
+        results, recorded = view_results(views, rows)
+        return {'results': results, 'recorded': len(recorded)}, None
+
+    async def like_post(self, post_id, user_id):
+        async with self.db_session() as session:
+            try:
+                result = (await session.execute(toggle_like_statement(post_id, user_id))).one()
+
+                error = interaction_error(result)
+                if error:
+                    return False, error
+
+                await session.commit()
+
+                return True, like_message(result)
+            except Exception as e:
+                await session.rollback()
+                logging.error(f"Error liking post: {str(e)}")
+                return False, str(e)
+
+    async def create_comment(self, post_id, user_id, content):
+        async with self.db_session() as session:
+            try:
+                post = await self._load_post(session, post_id)
+
+                if not post:
+                    return None, "Post not found"
+
+                error = access_error(post, user_id)
+                if error:
+                    return None, error
+
+                comment = Comment(
+                    post_id=post_id,
+                    user_id=user_id,
+                    content=content
+                )
+
+                session.add(comment)
+                await session.flush()
+                session.add(comment_event(comment))
+                await session.execute(increment_counters_statement(post_id, comments=1))
+                await session.commit()
+
+                return CommentRow.from_comment(comment), None
+            except Exception as e:
+                await session.rollback()
+                logging.error(f"Error creating comment: {str(e)}")
+                return None, str(e)
+
+    async def list_comments(self, post_id, page=1, per_page=10, cursor=None, with_count=True):
+        position = None
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+            except ValueError as e:
+                return None, str(e)
+
+        async with self.db_session() as session:
+            try:
+                query = select(Comment).where(Comment.post_id == post_id)
+                comments = (await session.execute(
+                    paginate(query, position, page, per_page, Comment.created_at, Comment.id)
+                )).scalars().all()
+
+                total_count = None
+                if with_count or not comments:
+                    post_row = (await session.execute(comments_count_statement(post_id))).first()
+                    if not post_row:
+                        return None, "Post not found"
+
+                    if with_count:
+                        total_count = post_row.comments_count or 0
+
+                return comments_page(comments, page, per_page, total_count), None
+            except Exception as e:
+                logging.error(f"Error listing comments: {str(e)}")
+                return None, str(e)
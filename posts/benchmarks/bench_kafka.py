@@ -0,0 +1,98 @@
+"""Bytes on the wire and producer throughput of the Kafka event settings.
+
+Serializes post view events with event_codec (json and protobuf), splits them
+between partitions by the murmur2 hash of the post_id key as the producer
+does, and builds the record batches the client would send (message format v2,
+KAFKA_BATCH_SIZE bytes per batch) with every compression codec that is
+installed. Prints the bytes per event and the events per second of
+serializing, batching and compressing (best of 3); the broker round trip is not included.
+
+    python benchmarks/bench_kafka.py [events] [partitions] [posts]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from kafka import codec
+from kafka.partitioner.default import murmur2
+from kafka.record import MemoryRecordsBuilder
+
+import event_codec
+from config import Config
+
+CODECS = {
+    'none': (0, lambda: True),
+    'gzip': (1, codec.has_gzip),
+    'snappy': (2, codec.has_snappy),
+    'lz4': (3, codec.has_lz4),
+    'zstd': (4, codec.has_zstd)
+}
+
+
+def make_events(count, posts):
+    """View events of random users on a skewed set of posts"""
+    timestamp = datetime.utcnow()
+    events = []
+    for i in range(count):
+        post_id = int(random.paretovariate(1.2)) % posts + 1
+        events.append({
+            'event_type': 'post_view',
+            'user_id': random.randint(1, 100000),
+            'post_id': post_id,
+            'timestamp': timestamp.isoformat()
+        })
+    return events
+
+
+def produce(events, event_format, compression, partitions):
+    """Serialize, partition and batch the events, returns the bytes of the closed batches"""
+    serialize = event_codec.encode_json if event_format == 'json' else event_codec.encode_protobuf
+    builders = {}
+    size = 0
+    for event_data in events:
+        key = str(event_data['post_id']).encode('utf-8')
+        value = serialize(event_data)
+        partition = (murmur2(key) & 0x7fffffff) % partitions
+        builder = builders.get(partition)
+        if builder is None or builder.append(0, key, value) is None:
+            if builder is not None:
+                builder.close()
+                size += builder.size_in_bytes()
+            builder = builders[partition] = MemoryRecordsBuilder(2, compression, Config.KAFKA_BATCH_SIZE)
+            builder.append(0, key, value)
+    for builder in builders.values():
+        builder.close()
+        size += builder.size_in_bytes()
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    partitions = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    posts = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    random.seed(0)
+    events = make_events(count, posts)
+
+    print(f"{count} view events on {posts} posts, {partitions} partitions, "
+          f"{Config.KAFKA_BATCH_SIZE} byte batches")
+    print(f"{'format':<10} {'compression':<12} {'bytes/event':>12} {'events/s':>12}")
+    for event_format in ('json', 'protobuf'):
+        for name, (compression, available) in CODECS.items():
+            if not available():
+                print(f"{event_format:<10} {name:<12} {'not installed':>12}")
+                continue
+            elapsed = []
+            for _ in range(3):
+                started = time.perf_counter()
+                size = produce(events, event_format, compression, partitions)
+                elapsed.append(time.perf_counter() - started)
+            elapsed = min(elapsed)
+            print(f"{event_format:<10} {name:<12} {size / count:12.1f} {count / elapsed:12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Per-post cost of turning fetched posts into serialized protobuf messages.
+
+Compares the v1 path (Post objects with their counters, Post.to_dict() and a
+Post message built from the dict with ISO string timestamps) with the current
+one (post_rows() column tuples, PostRow and converters.post_to_proto with
+Timestamp fields), with and without the legacy string timestamps. Hydrating
+the Post objects themselves is not included, it is the larger part of the
+saving on a real database.
+
+    python benchmarks/bench_serialization.py [posts per page] [repeats]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import posts_pb2
+import converters
+from config import Config
+from models import Post, PostCounters, PostRow
+
+
+def make_posts(count):
+    now = datetime.utcnow()
+    return [
+        Post(
+            id=i,
+            title=f'Post {i}',
+            description='Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 4,
+            user_id=i % 100,
+            is_private=False,
+            tags=['python', 'grpc', 'postgres'],
+            created_at=now - timedelta(minutes=i),
+            updated_at=now,
+            counters=PostCounters(likes_count=i, views_count=i * 10, comments_count=i // 2)
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def dict_path(posts):
+    """v1: every handler built the message from Post.to_dict()"""
+    messages = []
+    for post in posts:
+        post_data = post.to_dict()
+        messages.append(posts_pb2.Post(
+            id=post_data['id'],
+            title=post_data['title'],
+            description=post_data['description'],
+            user_id=post_data['user_id'],
+            is_private=post_data['is_private'],
+            tags=post_data['tags'],
+            created_at=post_data['created_at'],
+            updated_at=post_data['updated_at'],
+            likes_count=post_data['likes_count'],
+            views_count=post_data['views_count'],
+            comments_count=post_data['comments_count']
+        ))
+    return posts_pb2.ListPostsResponse(posts=messages).SerializeToString()
+
+
+def row_path(rows):
+    posts = [PostRow(*row) for row in rows]
+    return posts_pb2.ListPostsResponse(
+        posts=[converters.post_to_proto(post) for post in posts]
+    ).SerializeToString()
+
+
+def as_rows(posts):
+    """The tuples queries.post_rows() returns for the same posts"""
+    return [
+        (post.id, post.title, post.description, post.user_id, post.is_private, post.tags,
+         post.created_at, post.updated_at, post.counters.likes_count,
+         post.counters.views_count, post.counters.comments_count)
+        for post in posts
+    ]
+
+
+def measure(name, fn, posts, repeats):
+    best = min(timeit.repeat(lambda: fn(posts), number=repeats, repeat=5))
+    per_post = best / repeats / len(posts) * 1e6
+    size = len(fn(posts)) / len(posts)
+    print(f"{name:<40} {per_post:8.2f} us/post {size:8.1f} bytes/post")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    posts = make_posts(count)
+    rows = as_rows(posts)
+
+    print(f"{count} posts per response, best of 5 x {repeats} runs")
+    measure("to_dict + string timestamps (v1)", dict_path, posts, repeats)
+
+    Config.LEGACY_TIMESTAMP_STRINGS = True
+    measure("PostRow + Timestamp + string timestamps", row_path, rows, repeats)
+
+    Config.LEGACY_TIMESTAMP_STRINGS = False
+    measure("PostRow + Timestamp only", row_path, rows, repeats)
+
+
+if __name__ == '__main__':
+    main()
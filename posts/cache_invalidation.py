@@ -0,0 +1,61 @@
+from kafka import KafkaConsumer
+from datetime import datetime
+import json
+import logging
+import threading
+
+
+class CacheInvalidationListener(threading.Thread):
+    """Applies post cache and listing total invalidations published by other replicas.
+
+    The consumer has no group, so every replica reads every partition of the
+    topic starting from the latest offset.
+    """
+
+    def __init__(self, bootstrap_servers, topic, post_cache, count_cache=None, retry_interval=5):
+        super().__init__(name='post-cache-invalidation', daemon=True)
+        self.bootstrap_servers = bootstrap_servers
+        self.topic = topic
+        self.post_cache = post_cache
+        self.count_cache = count_cache
+        self.retry_interval = retry_interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            consumer = None
+            try:
+                consumer = KafkaConsumer(
+                    self.topic,
+                    bootstrap_servers=self.bootstrap_servers,
+                    group_id=None,
+                    auto_offset_reset='latest',
+                    value_deserializer=lambda v: json.loads(v.decode('utf-8'))
+                )
+                logging.info(f"Listening for post cache invalidations on {self.topic}")
+
+                while not self._stopped.is_set():
+                    for records in consumer.poll(timeout_ms=1000).values():
+                        for record in records:
+                            self.apply(record.value)
+            except Exception as e:
+                logging.error(f"Post cache invalidation listener failed: {str(e)}")
+                self._stopped.wait(self.retry_interval)
+            finally:
+                if consumer:
+                    consumer.close()
+
+    def apply(self, event_data):
+        if event_data.get('event_type') == 'post_count_invalidation':
+            if self.count_cache is not None:
+                self.count_cache.invalidate(event_data['author_id'], event_data['tags'], event_data['is_public'])
+            return
+
+        version = event_data.get('version')
+        self.post_cache.invalidate(
+            event_data['post_id'],
+            datetime.fromisoformat(version) if version else None
+        )
+
+    def stop(self):
+        self._stopped.set()
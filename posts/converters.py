@@ -0,0 +1,246 @@
+from datetime import datetime, timezone
+import posts_pb2
+from config import Config
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Field mask paths naming another PostRow attribute
+_FIELD_ALIASES = {'created_time': 'created_at', 'updated_time': 'updated_at'}
+_SCALAR_POST_FIELDS = ('title', 'description', 'user_id', 'is_private',
+                       'likes_count', 'views_count', 'comments_count', 'excerpt')
+
+COUNT_MODES_BY_NAME = {
+    'exact': posts_pb2.COUNT_MODE_EXACT,
+    'cached': posts_pb2.COUNT_MODE_CACHED,
+    'estimated': posts_pb2.COUNT_MODE_ESTIMATED,
+    'none': posts_pb2.COUNT_MODE_NONE
+}
+COUNT_MODE_NAMES = {value: name for name, value in COUNT_MODES_BY_NAME.items()}
+
+
+def list_posts_count_mode(request):
+    if request.count_mode != posts_pb2.COUNT_MODE_DEFAULT:
+        return COUNT_MODE_NAMES.get(request.count_mode, 'exact')
+    if request.cursor and not request.include_total_count:
+        return 'none'
+    return 'exact'
+
+
+def requested_fields(field_mask):
+    """PostRow fields named by a FieldMask, None when it is empty (every field)"""
+    if not field_mask.paths:
+        return None
+    return frozenset(_FIELD_ALIASES.get(path, path) for path in field_mask.paths)
+
+
+def get_post_params(request):
+    """Keyword arguments of PostsService.get_post for a GetPostRequest"""
+    return {
+        'post_id': request.post_id,
+        'user_id': request.user_id,
+        'fields': requested_fields(request.field_mask),
+        'excerpt_length': request.excerpt_length or None
+    }
+
+
+def list_posts_params(request):
+    """Keyword arguments of PostsService.list_posts for a ListPostsRequest"""
+    return {
+        'page': request.page,
+        'per_page': request.per_page,
+        'user_id': request.user_id,
+        'tag': request.tag if request.tag else None,
+        'cursor': request.cursor or None,
+        'count_mode': list_posts_count_mode(request),
+        'tags': list(request.tags),
+        'match_all': request.tag_match == posts_pb2.TAG_MATCH_ALL,
+        'fields': requested_fields(request.field_mask),
+        'excerpt_length': request.excerpt_length or None
+    }
+
+
+def stream_posts_params(request):
+    """Keyword arguments of PostsService.stream_posts for a StreamPostsRequest"""
+    return {
+        'user_id': request.user_id,
+        'tag': request.tag or None,
+        'author_id': request.author_id or None,
+        'created_from': request.created_from or None,
+        'created_to': request.created_to or None,
+        'cursor': request.cursor or None,
+        'batch_size': request.batch_size or None,
+        'tags': list(request.tags),
+        'match_all': request.tag_match == posts_pb2.TAG_MATCH_ALL,
+        'fields': requested_fields(request.field_mask),
+        'excerpt_length': request.excerpt_length or None
+    }
+
+
+def list_comments_params(request):
+    """Keyword arguments of PostsService.list_comments for a ListCommentsRequest"""
+    return {
+        'post_id': request.post_id,
+        'page': request.page,
+        'per_page': request.per_page,
+        'cursor': request.cursor or None,
+        'with_count': not request.cursor or request.include_total_count
+    }
+
+
+def view_batches(requests, size):
+    """(post_id, user_id) pairs of a ViewPostRequest stream in lists of at most size"""
+    batch = []
+    for request in requests:
+        batch.append((request.post_id, request.user_id))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def async_view_batches(requests, size):
+    """view_batches for the request iterator of a grpc.aio handler"""
+    batch = []
+    async for request in requests:
+        batch.append((request.post_id, request.user_id))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def set_timestamp(timestamp, value):
+    """Fill a Timestamp from a datetime, naive values being UTC as stored in the database.
+
+    Does the same as Timestamp.FromDatetime at about a third of its cost.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - _EPOCH
+    timestamp.seconds = delta.days * 86400 + delta.seconds
+    timestamp.nanos = delta.microseconds * 1000
+
+
+def post_to_proto(row, fields=None):
+    """Build a Post message from a PostRow.
+
+    Timestamps are set on the Timestamp fields from the datetimes; the legacy
+    ISO strings are only formatted while LEGACY_TIMESTAMP_STRINGS is enabled.
+    With a set of fields only those (and the id) are set.
+    """
+    if fields is not None:
+        return _sparse_post_to_proto(row, fields)
+
+    post = posts_pb2.Post(
+        id=row.id,
+        title=row.title,
+        description=row.description,
+        user_id=row.user_id,
+        is_private=row.is_private,
+        tags=row.tags,
+        likes_count=row.likes_count,
+        views_count=row.views_count,
+        comments_count=row.comments_count
+    )
+    set_timestamp(post.created_time, row.created_at)
+    set_timestamp(post.updated_time, row.updated_at)
+    if Config.LEGACY_TIMESTAMP_STRINGS:
+        post.created_at = row.created_at.isoformat()
+        post.updated_at = row.updated_at.isoformat()
+    return post
+
+
+def _sparse_post_to_proto(row, fields):
+    post = posts_pb2.Post(id=row.id)
+    for name in _SCALAR_POST_FIELDS:
+        if name in fields:
+            setattr(post, name, getattr(row, name))
+    if 'tags' in fields:
+        post.tags.extend(row.tags)
+    if 'created_at' in fields:
+        set_timestamp(post.created_time, row.created_at)
+        if Config.LEGACY_TIMESTAMP_STRINGS:
+            post.created_at = row.created_at.isoformat()
+    if 'updated_at' in fields:
+        set_timestamp(post.updated_time, row.updated_at)
+        if Config.LEGACY_TIMESTAMP_STRINGS:
+            post.updated_at = row.updated_at.isoformat()
+    return post
+
+
+def comment_to_proto(row):
+    """Build a Comment message from a CommentRow"""
+    comment = posts_pb2.Comment(
+        id=row.id,
+        post_id=row.post_id,
+        user_id=row.user_id,
+        content=row.content
+    )
+    set_timestamp(comment.created_time, row.created_at)
+    if Config.LEGACY_TIMESTAMP_STRINGS:
+        comment.created_at = row.created_at.isoformat()
+    return comment
+
+
+def record_views_response(results, recorded, error):
+    """Per-view results received so far, also when a later batch failed with error"""
+    return posts_pb2.RecordViewsResponse(
+        results=[posts_pb2.ViewPostResponse(success=success, message=message) for success, message in results],
+        recorded=recorded,
+        error=error or ''
+    )
+
+
+def post_response(row, error, fields=None):
+    if error:
+        return posts_pb2.PostResponse(error=error)
+    return posts_pb2.PostResponse(post=post_to_proto(row, fields))
+
+
+def batch_get_posts_response(results, error):
+    if error:
+        return posts_pb2.BatchGetPostsResponse(error=error)
+    return posts_pb2.BatchGetPostsResponse(
+        results=[post_response(row, item_error) for row, item_error in results]
+    )
+
+
+def list_posts_response(result, error, fields=None):
+    if error:
+        return posts_pb2.ListPostsResponse(error=error)
+
+    return posts_pb2.ListPostsResponse(
+        posts=[post_to_proto(row, fields) for row in result['posts']],
+        total_count=result['total_count'],
+        page=result['page'],
+        total_pages=result['total_pages'],
+        next_cursor=result['next_cursor'],
+        has_more=result['has_more'],
+        count_mode=COUNT_MODES_BY_NAME[result['count_mode']]
+    )
+
+
+def stream_posts_response(row, cursor, fields=None):
+    return posts_pb2.StreamPostsResponse(post=post_to_proto(row, fields), cursor=cursor)
+
+
+def comment_response(row, error):
+    if error:
+        return posts_pb2.CommentResponse(error=error)
+    return posts_pb2.CommentResponse(comment=comment_to_proto(row))
+
+
+def list_comments_response(result, error):
+    if error:
+        return posts_pb2.ListCommentsResponse(error=error)
+
+    return posts_pb2.ListCommentsResponse(
+        comments=[comment_to_proto(row) for row in result['comments']],
+        total_count=result['total_count'],
+        page=result['page'],
+        total_pages=result['total_pages'],
+        next_cursor=result['next_cursor'],
+        has_more=result['has_more']
+    )
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+SCOPE_PUBLIC = 'public'
+SCOPE_VIEWER = 'viewer'
+
+
+def count_key(viewer_id, tags=None, match_all=False):
+    """Build the cache key of a listing total: (viewer, tag filter, privacy scope)"""
+    tag_filter = None
+    if tags:
+        tags = frozenset(tags)
+        tag_filter = (tags, bool(match_all) and len(tags) > 1)
+
+    if viewer_id:
+        return viewer_id, tag_filter, SCOPE_VIEWER
+    return None, tag_filter, SCOPE_PUBLIC
+
+
+class CountCache:
+    """Thread-safe LRU cache with TTL for post listing totals.
+
+    Totals are keyed by count_key(). A write that changes which posts a listing
+    contains calls invalidate() with the author, tags and visibility of the post,
+    which drops only the totals that post is counted in; the services also
+    send it to the other workers and replicas through the cache invalidation
+    topic (CacheInvalidationListener). Every invalidation
+    bumps a generation number so a total computed concurrently with a write is
+    not stored afterwards.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_size > 0
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation=None):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, author_id, tags, is_public):
+        """Drop the totals a post with this author, tags and visibility is counted in"""
+        tags = set(tags or [])
+        with self._lock:
+            self._generation += 1
+            for key in list(self._entries):
+                viewer_id, tag_filter, scope = key
+                if tag_filter is not None:
+                    filter_tags, match_all = tag_filter
+                    if match_all and not filter_tags <= tags:
+                        continue
+                    if not match_all and not filter_tags & tags:
+                        continue
+                if is_public or (scope == SCOPE_VIEWER and viewer_id == author_id):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
@@ -0,0 +1,64 @@
+import time
+from uuid import uuid4
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from config import Config
+import metrics
+
+
+class TimedPoolMixin:
+    """Records how long each checkout waited for a connection and how many timed out"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            metrics.DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pgbouncer_connect_args():
+    """asyncpg arguments for PgBouncer transaction pooling.
+
+    Statements are not cached, and the ones asyncpg still prepares get unique
+    names, since consecutive transactions may run on different server connections.
+    """
+    return {
+        'statement_cache_size': 0,
+        'prepared_statement_cache_size': 0,
+        'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__'
+    }
+
+
+def engine_options(async_driver=False):
+    """Keyword arguments of create_engine/create_async_engine from the DB_POOL_* settings"""
+    options = {
+        'poolclass': TimedAsyncQueuePool if async_driver else TimedQueuePool,
+        'pool_size': Config.DB_POOL_SIZE,
+        'max_overflow': Config.DB_MAX_OVERFLOW,
+        'pool_timeout': Config.DB_POOL_TIMEOUT,
+        'pool_recycle': Config.DB_POOL_RECYCLE,
+        'pool_pre_ping': Config.DB_POOL_PRE_PING
+    }
+    # psycopg2 never uses server-side prepared statements
+    if Config.DB_PGBOUNCER and async_driver:
+        options['connect_args'] = pgbouncer_connect_args()
+    return options
+
+
+def watch_pool(pool):
+    """Export the checked out connections and the saturation of an engine's pool"""
+    capacity = max(Config.DB_POOL_SIZE + max(Config.DB_MAX_OVERFLOW, 0), 1)
+    metrics.DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    metrics.DB_POOL_SATURATION.set_function(lambda: pool.checkedout() / capacity)
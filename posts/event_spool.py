@@ -0,0 +1,289 @@
+"""Append-only disk spool of the Kafka records that could not be sent.
+
+Records are appended to segment files (spool-<number>.log) in the spool
+directory, a new segment being started past segment_bytes. A record is a
+header (CRC32 of the rest of the record, value, topic and key lengths)
+followed by the topic, key and value, so segments are read straight from an
+mmap and a record torn by a crash is recognised by its CRC. Appends are
+fsynced at most every fsync_interval seconds. SpoolReplay sends the records
+back in order once the broker is reachable and removes replayed segments;
+the replay position is kept in the 'position' file across restarts.
+
+The users service has a copy of this module, keep them in sync.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+import metrics
+
+# CRC32 of the rest of the record, then the value, topic and key lengths (-1 for no key)
+_CRC = struct.Struct('>I')
+_LENGTHS = struct.Struct('>IHi')
+_HEADER_SIZE = _CRC.size + _LENGTHS.size
+_SEGMENT_PREFIX = 'spool-'
+_SEGMENT_SUFFIX = '.log'
+_POSITION_FILE = 'position'
+_LOCK_FILE = 'lock'
+
+
+def encode_record(topic, key, value):
+    topic = topic.encode('utf-8')
+    record = _LENGTHS.pack(len(value), len(topic), -1 if key is None else len(key)) + topic + (key or b'') + value
+    return _CRC.pack(zlib.crc32(record)) + record
+
+
+def decode_record(data, offset, end):
+    """(end offset, topic, key, value) of the record at offset, None if it is torn or corrupt"""
+    if offset + _HEADER_SIZE > end:
+        return None
+    [crc] = _CRC.unpack_from(data, offset)
+    value_length, topic_length, key_length = _LENGTHS.unpack_from(data, offset + _CRC.size)
+    length = _HEADER_SIZE + topic_length + max(key_length, 0) + value_length
+    if offset + length > end or zlib.crc32(data[offset + _CRC.size:offset + length]) != crc:
+        return None
+
+    start = offset + _HEADER_SIZE
+    topic = data[start:start + topic_length].decode('utf-8')
+    start += topic_length
+    key = None
+    if key_length >= 0:
+        key = data[start:start + key_length]
+        start += key_length
+    return offset + length, topic, key, data[start:start + value_length]
+
+
+class EventSpool:
+    """Segment files of spooled (topic, key, value) records, oldest first.
+
+    Only closed segments are read: read() closes the segment being appended
+    to when it is the oldest one left. The directory is locked for the
+    lifetime of the spool; opening it from a second process raises
+    BlockingIOError.
+    """
+
+    def __init__(self, directory, max_bytes, segment_bytes, fsync_interval):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.lock_fd = os.open(os.path.join(directory, _LOCK_FILE), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self.lock_fd)
+            raise
+
+        self.sizes = {}
+        for name in sorted(os.listdir(directory)):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                number = int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+                self.sizes[number] = os.path.getsize(self._path(number))
+        self.segments = sorted(self.sizes)
+        self.offset = self._read_position()
+        self.size = sum(self.sizes.values()) - self.offset
+        if self.size:
+            logging.warning(f"Event spool {directory} has {self.size} bytes left to replay")
+
+        self.fd = None
+        self.active = None
+        self.last_sync = time.monotonic()
+        self.unsynced = False
+        self._open_segment(self.segments[-1] + 1 if self.segments else 1)
+        metrics.KAFKA_SPOOL_BYTES.set(self.size)
+
+    def _path(self, number):
+        return os.path.join(self.directory, f'{_SEGMENT_PREFIX}{number:010d}{_SEGMENT_SUFFIX}')
+
+    def _read_position(self):
+        """Replay offset in the oldest segment, after removing the segments replayed before it"""
+        try:
+            with open(os.path.join(self.directory, _POSITION_FILE)) as f:
+                segment, offset = (int(part) for part in f.read().split())
+        except (OSError, ValueError):
+            return 0
+
+        while self.segments and self.segments[0] < segment:
+            self._remove_segment()
+        if self.segments and self.segments[0] == segment:
+            return min(offset, self.sizes[segment])
+        return 0
+
+    def _remove_segment(self):
+        segment = self.segments.pop(0)
+        del self.sizes[segment]
+        os.remove(self._path(segment))
+
+    def _write_position(self):
+        path = os.path.join(self.directory, _POSITION_FILE)
+        with open(path + '.tmp', 'w') as f:
+            f.write(f'{self.segments[0]} {self.offset}')
+        os.replace(path + '.tmp', path)
+
+    def _open_segment(self, number):
+        self.fd = os.open(self._path(number), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.active = number
+        self.segments.append(number)
+        self.sizes[number] = 0
+
+    def _close_segment(self):
+        os.fsync(self.fd)
+        os.close(self.fd)
+        self.unsynced = False
+
+    def _sync(self):
+        os.fsync(self.fd)
+        self.unsynced = False
+        self.last_sync = time.monotonic()
+
+    def pending(self):
+        """Whether records wait for replay; new records have to be spooled behind them"""
+        return self.size > 0
+
+    def append(self, topic, key, value):
+        """Spool a record, False when it does not fit in max_bytes"""
+        record = encode_record(topic, key, value)
+        with self.lock:
+            if self.size + len(record) > self.max_bytes:
+                metrics.KAFKA_SPOOL_RECORDS.labels('dropped').inc()
+                logging.warning(f"Event spool full ({self.size} bytes), event to {topic} dropped")
+                return False
+
+            if self.sizes[self.active] and self.sizes[self.active] + len(record) > self.segment_bytes:
+                self._close_segment()
+                self._open_segment(self.active + 1)
+            os.write(self.fd, record)
+            self.sizes[self.active] += len(record)
+            self.size += len(record)
+            self.unsynced = True
+            if time.monotonic() - self.last_sync >= self.fsync_interval:
+                self._sync()
+            size = self.size
+
+        metrics.KAFKA_SPOOL_RECORDS.labels('spooled').inc()
+        metrics.KAFKA_SPOOL_BYTES.set(size)
+        return True
+
+    def sync(self):
+        """fsync the records appended since the last fsync"""
+        with self.lock:
+            if self.unsynced:
+                self._sync()
+
+    def read(self, max_records):
+        """Oldest records as (segment, end offset, topic, key, value), at most max_records of one segment"""
+        with self.lock:
+            # Segments left empty or read to the end by an earlier process
+            while self.segments[0] != self.active and self.offset >= self.sizes[self.segments[0]]:
+                self._remove_segment()
+                self.offset = 0
+            if not self.size:
+                return []
+            segment = self.segments[0]
+            if segment == self.active:
+                self._close_segment()
+                self._open_segment(self.active + 1)
+            offset = self.offset
+            size = self.sizes[segment]
+
+        records = []
+        with open(self._path(segment), 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            while offset < size and len(records) < max_records:
+                record = decode_record(data, offset, size)
+                if record is None:
+                    break
+                records.append((segment, *record))
+                offset = record[0]
+
+        if offset < size and not records:
+            # Written by a process that crashed in the middle of the record
+            logging.error(f"Corrupt record at offset {offset} of spool segment {segment}, "
+                          f"{size - offset} bytes skipped")
+            metrics.KAFKA_SPOOL_RECORDS.labels('corrupt').inc()
+            self.commit(segment, size)
+        return records
+
+    def commit(self, segment, offset):
+        """Mark the records of segment up to offset as replayed"""
+        with self.lock:
+            self.size -= offset - self.offset
+            if offset >= self.sizes[segment] and segment != self.active:
+                self._remove_segment()
+                self.offset = 0
+            else:
+                self.offset = offset
+            self._write_position()
+            size = self.size
+        metrics.KAFKA_SPOOL_BYTES.set(size)
+
+    def close(self):
+        with self.lock:
+            self._close_segment()
+            os.close(self.lock_fd)
+
+
+class SpoolReplay(threading.Thread):
+    """Sends the spooled records back to Kafka in the order they were spooled.
+
+    connect() returns whether there is a Kafka producer, creating it when
+    there is none yet; publish(records) sends (topic, key, value) records
+    and returns whether each one was acknowledged. Replay stops at the first
+    record that was not and starts again from it after retry_interval, so a
+    record can be sent twice but never after a later one.
+    """
+
+    def __init__(self, spool, connect, publish, batch_size=500, poll_interval=0.5, retry_interval=5):
+        super().__init__(name='spool-replay', daemon=True)
+        self.spool = spool
+        self.connect = connect
+        self.publish = publish
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            self.spool.sync()
+            if not self.spool.pending():
+                self._stopped.wait(self.poll_interval)
+                continue
+
+            try:
+                replayed = self.replay_batch()
+            except Exception as e:
+                logging.error(f"Event spool replay failed: {str(e)}")
+                replayed = 0
+            if not replayed:
+                self._stopped.wait(self.retry_interval)
+
+    def replay_batch(self):
+        """Send the oldest spooled records; returns the number acknowledged"""
+        if not self.connect():
+            return 0
+        records = self.spool.read(self.batch_size)
+        if not records:
+            return 0
+
+        acknowledged = self.publish([(topic, key, value) for _, _, topic, key, value in records])
+        replayed = 0
+        for ok in acknowledged:
+            if not ok:
+                break
+            replayed += 1
+
+        if replayed:
+            segment, offset = records[replayed - 1][:2]
+            self.spool.commit(segment, offset)
+            metrics.KAFKA_SPOOL_RECORDS.labels('replayed').inc(replayed)
+            logging.info(f"Replayed {replayed} spooled events")
+        return replayed
+
+    def stop(self):
+        self._stopped.set()
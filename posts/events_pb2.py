@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: events.proto
+# Protobuf Python Version: 5.29.0
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    5,
+    29,
+    0,
+    '',
+    'events.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0c\x65vents.proto\x12\x06\x65vents\"O\n\x0b\x45ventHeader\x12\x16\n\x0eschema_version\x18\x01 \x01(\r\x12\x12\n\nevent_type\x18\x02 \x01(\t\x12\x14\n\x0ctimestamp_ms\x18\x03 \x01(\x03\"4\n\rEventEnvelope\x12#\n\x06header\x18\x01 \x01(\x0b\x32\x13.events.EventHeader\"V\n\rPostViewEvent\x12#\n\x06header\x18\x01 \x01(\x0b\x32\x13.events.EventHeader\x12\x0f\n\x07user_id\x18\x02 \x01(\x03\x12\x0f\n\x07post_id\x18\x03 \x01(\x03\"V\n\rPostLikeEvent\x12#\n\x06header\x18\x01 \x01(\x0b\x32\x13.events.EventHeader\x12\x0f\n\x07user_id\x18\x02 \x01(\x03\x12\x0f\n\x07post_id\x18\x03 \x01(\x03\"X\n\x0fPostUnlikeEvent\x12#\n\x06header\x18\x01 \x01(\x0b\x32\x13.events.EventHeader\x12\x0f\n\x07user_id\x18\x02 \x01(\x03\x12\x0f\n\x07post_id\x18\x03 \x01(\x03\"m\n\x10PostCommentEvent\x12#\n\x06header\x18\x01 \x01(\x0b\x32\x13.events.EventHeader\x12\x0f\n\x07user_id\x18\x02 \x01(\x03\x12\x0f\n\x07post_id\x18\x03 \x01(\x03\x12\x12\n\ncomment_id\x18\x04 \x01(\x03\"\x9c\x01\n\x14PostViewSummaryEvent\x12#\n\x06header\x18\x01 \x01(\x0b\x32\x13.events.EventHeader\x12\x0f\n\x07post_id\x18\x02 \x01(\x03\x12\r\n\x05views\x18\x03 \x01(\x03\x12\x0f\n\x07viewers\x18\x04 \x01(\x03\x12\x17\n\x0fwindow_start_ms\x18\x05 \x01(\x03\x12\x15\n\rwindow_end_ms\x18\x06 \x01(\x03\"M\n\x15UserRegistrationEvent\x12#\n\x06header\x18\x01 \x01(\x0b\x32\x13.events.EventHeader\x12\x0f\n\x07user_id\x18\x02 \x01(\x03\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'events_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_EVENTHEADER']._serialized_start=24
+  _globals['_EVENTHEADER']._serialized_end=103
+  _globals['_EVENTENVELOPE']._serialized_start=105
+  _globals['_EVENTENVELOPE']._serialized_end=157
+  _globals['_POSTVIEWEVENT']._serialized_start=159
+  _globals['_POSTVIEWEVENT']._serialized_end=245
+  _globals['_POSTLIKEEVENT']._serialized_start=247
+  _globals['_POSTLIKEEVENT']._serialized_end=333
+  _globals['_POSTUNLIKEEVENT']._serialized_start=335
+  _globals['_POSTUNLIKEEVENT']._serialized_end=423
+  _globals['_POSTCOMMENTEVENT']._serialized_start=425
+  _globals['_POSTCOMMENTEVENT']._serialized_end=534
+  _globals['_POSTVIEWSUMMARYEVENT']._serialized_start=537
+  _globals['_POSTVIEWSUMMARYEVENT']._serialized_end=693
+  _globals['_USERREGISTRATIONEVENT']._serialized_start=695
+  _globals['_USERREGISTRATIONEVENT']._serialized_end=772
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,140 @@
+"""gRPC health checking (grpc.health.v1) of the posts service.
+
+The servers start NOT_SERVING and bind the port right away; the readiness
+probe switches the status to SERVING once the database has the schema and
+events can be published (Kafka is connected or a disk spool takes them), and
+back to NOT_SERVING when one of them goes away.
+
+    python health.py            exit with status 1 unless the local server is SERVING
+"""
+import asyncio
+import logging
+import sys
+import threading
+import grpc
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+from migrate import missing_schema
+from config import Config
+
+# '' is the status of the server as a whole
+SERVICES = ('', 'posts.PostService')
+SERVING = health_pb2.HealthCheckResponse.SERVING
+NOT_SERVING = health_pb2.HealthCheckResponse.NOT_SERVING
+
+
+def database_ready(engine):
+    """(ready, reason) of a database engine: reachable and migrated"""
+    try:
+        with engine.connect() as connection:
+            missing = missing_schema(connection)
+    except Exception as e:
+        return False, f"database unavailable: {str(e)}"
+    if missing:
+        return False, f"missing {', '.join(missing)}, run migrate.py"
+    return True, None
+
+
+async def async_database_ready(engine):
+    """database_ready for an AsyncEngine"""
+    try:
+        async with engine.connect() as connection:
+            missing = await connection.run_sync(missing_schema)
+    except Exception as e:
+        return False, f"database unavailable: {str(e)}"
+    if missing:
+        return False, f"missing {', '.join(missing)}, run migrate.py"
+    return True, None
+
+
+def kafka_ready(event_producer):
+    """(ready, reason) of an EventProducer; a disk spool keeps the events until Kafka is back"""
+    if event_producer.spool is not None or event_producer.connected():
+        return True, None
+    return False, "Kafka unavailable"
+
+
+def readiness(checks):
+    """SERVING when every (ready, reason) check passed, with the reasons of the ones that did not"""
+    reasons = [reason for ready, reason in checks if not ready]
+    return (NOT_SERVING if reasons else SERVING), reasons
+
+
+class ReadinessProbe(threading.Thread):
+    """Sets the status of a HealthServicer from the checks every interval seconds"""
+
+    def __init__(self, servicer, engine, event_producer, interval=2):
+        super().__init__(name='readiness-probe', daemon=True)
+        self.servicer = servicer
+        self.engine = engine
+        self.event_producer = event_producer
+        self.interval = interval
+        self.status = None
+        self._stopped = threading.Event()
+        for service in SERVICES:
+            servicer.set(service, NOT_SERVING)
+
+    def check(self):
+        status, reasons = readiness([database_ready(self.engine), kafka_ready(self.event_producer)])
+        if status != self.status:
+            log_status(status, reasons)
+            self.status = status
+            for service in SERVICES:
+                self.servicer.set(service, status)
+        return status
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                logging.error(f"Readiness check failed: {str(e)}")
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.servicer.enter_graceful_shutdown()
+
+
+async def watch_readiness(servicer, engine, event_producer, interval=2):
+    """ReadinessProbe of the aio server, run as a task until cancelled"""
+    status = None
+    for service in SERVICES:
+        await servicer.set(service, NOT_SERVING)
+    while True:
+        try:
+            checks = [await async_database_ready(engine), kafka_ready(event_producer)]
+            current, reasons = readiness(checks)
+            if current != status:
+                log_status(current, reasons)
+                status = current
+                for service in SERVICES:
+                    await servicer.set(service, status)
+        except Exception as e:
+            logging.error(f"Readiness check failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+def log_status(status, reasons):
+    if status == SERVING:
+        logging.info("Posts service ready")
+    else:
+        logging.warning(f"Posts service not ready: {'; '.join(reasons)}")
+
+
+def main():
+    """Exit status 0 when the server on GRPC_PORT is SERVING (docker healthcheck)"""
+    try:
+        with grpc.insecure_channel(f'localhost:{Config.GRPC_PORT}') as channel:
+            response = health_pb2_grpc.HealthStub(channel).Check(
+                health_pb2.HealthCheckRequest(service=''), timeout=2
+            )
+    except grpc.RpcError as e:
+        print(f"Health check failed: {e.code().name}")
+        return 1
+
+    print(health_pb2.HealthCheckResponse.ServingStatus.Name(response.status))
+    return 0 if response.status == SERVING else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+from .db_time import track_db_time
+from .monitoring import MetricsInterceptor, AsyncMetricsInterceptor, error_kind
+from .deadline import (
+    track_deadlines, DeadlineSession, DeadlineInterceptor, AsyncDeadlineInterceptor, DeadlineExceeded
+)
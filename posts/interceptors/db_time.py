@@ -0,0 +1,41 @@
+import contextvars
+import time
+from sqlalchemy import event
+
+# Seconds spent in statements by the RPC handled in the current context,
+# None outside of an RPC
+_db_time = contextvars.ContextVar('db_time', default=None)
+
+
+def start():
+    """Start counting statement time for the RPC handled in the current context"""
+    _db_time.set([0.0])
+
+
+def stop():
+    """Stop counting and return the seconds spent since start()"""
+    elapsed = _db_time.get()
+    _db_time.set(None)
+    return elapsed[0] if elapsed else 0.0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    elapsed = _db_time.get()
+    if elapsed is not None:
+        elapsed[0] += time.perf_counter() - started
+
+
+def track_db_time(engine):
+    """Add the time of every statement executed on the engine to the current RPC.
+
+    Also works for AsyncEngine: SQLAlchemy runs the statements in a greenlet
+    sharing the context of the awaiting task.
+    """
+    engine = getattr(engine, 'sync_engine', engine)
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,230 @@
+import contextvars
+import logging
+import math
+import time
+import grpc
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import Config
+from .monitoring import _wrap_handler
+
+# Postgres SQLSTATE of a statement cancelled by statement_timeout or a cancel request
+QUERY_CANCELED = '57014'
+
+# Largest statement_timeout Postgres accepts, in seconds; grpc reports calls
+# without a deadline with an even larger time_remaining()
+MAX_TIMEOUT = 2**31 // 1000
+
+_rpc = contextvars.ContextVar('rpc_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class RpcDeadline:
+    """Deadline and cancellation state of the RPC handled in the current context"""
+
+    def __init__(self, time_remaining):
+        if time_remaining is None or time_remaining > MAX_TIMEOUT:
+            self.deadline = None
+        else:
+            self.deadline = time.monotonic() + time_remaining
+        self.cancelled = False
+        self.timed_out = False
+        self.finished = False
+        # psycopg2 connection running a statement for this RPC, cancelled with the RPC
+        self.running = None
+
+    def remaining(self):
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def expired(self):
+        return self.timed_out or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+    def cancel(self):
+        """RPC termination callback: stop the statement still running for a cancelled RPC"""
+        if self.finished:
+            return
+        # The RPC also terminates when its deadline passes
+        if self.expired():
+            self.timed_out = True
+        else:
+            self.cancelled = True
+        connection = self.running
+        if connection is not None and hasattr(connection, 'cancel'):
+            try:
+                connection.cancel()
+            except Exception as e:
+                logging.warning(f"Could not cancel statement of a cancelled RPC: {str(e)}")
+
+
+class DeadlineSession(Session):
+    """Session whose transactions are bounded by the deadline of the RPC they serve"""
+
+
+@event.listens_for(DeadlineSession, 'after_begin')
+def _apply_statement_timeout(session, transaction, connection):
+    rpc = _rpc.get()
+    if rpc is None or not Config.DEADLINE_STATEMENT_TIMEOUT:
+        return
+    remaining = rpc.remaining()
+    if remaining is None:
+        return
+    if remaining <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+    # Statements of the transaction can't outlive the caller's patience
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(math.ceil(remaining * 1000), 1)}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    rpc = _rpc.get()
+    if rpc is None:
+        return
+    if rpc.cancelled:
+        raise DeadlineExceeded("RPC cancelled")
+    if rpc.expired():
+        raise DeadlineExceeded("Deadline exceeded")
+    rpc.running = conn.connection.dbapi_connection
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    rpc = _rpc.get()
+    if rpc is not None:
+        rpc.running = None
+
+
+def _handle_error(exception_context):
+    rpc = _rpc.get()
+    if rpc is None:
+        return
+    rpc.running = None
+    if getattr(exception_context.original_exception, 'pgcode', None) == QUERY_CANCELED or \
+            getattr(exception_context.original_exception, 'sqlstate', None) == QUERY_CANCELED:
+        rpc.timed_out = True
+
+
+def track_deadlines(engine):
+    """Refuse statements of expired or cancelled RPCs and spot statements cut by statement_timeout"""
+    engine = getattr(engine, 'sync_engine', engine)
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+def _deadline_exceeded(rpc):
+    return rpc.expired() and not rpc.cancelled
+
+
+class DeadlineInterceptor(grpc.ServerInterceptor):
+    """Bounds the database work of each RPC by its deadline.
+
+    Requests that arrive past their deadline are rejected without running;
+    otherwise transactions get a matching statement_timeout, a cancelled RPC
+    cancels its running statement, and handlers that ran out of time answer
+    with DEADLINE_EXCEEDED instead of their error string.
+    """
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        return _wrap_handler(handler, None, self._unary, self._stream)
+
+    @staticmethod
+    def _start(context):
+        rpc = RpcDeadline(context.time_remaining())
+        if rpc.expired():
+            context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline exceeded before the request was handled")
+        context.add_callback(rpc.cancel)
+        _rpc.set(rpc)
+        return rpc
+
+    @staticmethod
+    def _finish(rpc):
+        rpc.finished = True
+        _rpc.set(None)
+
+    @classmethod
+    def _unary(cls, behavior, method):
+        def wrapper(request, context):
+            rpc = cls._start(context)
+            try:
+                response = behavior(request, context)
+            finally:
+                cls._finish(rpc)
+            if rpc.cancelled:
+                context.abort(grpc.StatusCode.CANCELLED, "RPC cancelled")
+            if _deadline_exceeded(rpc):
+                context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline exceeded")
+            return response
+
+        return wrapper
+
+    @classmethod
+    def _stream(cls, behavior, method):
+        def wrapper(request, context):
+            rpc = cls._start(context)
+            try:
+                for response in behavior(request, context):
+                    if _deadline_exceeded(rpc):
+                        break
+                    yield response
+            finally:
+                cls._finish(rpc)
+            if _deadline_exceeded(rpc):
+                context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline exceeded")
+
+        return wrapper
+
+
+class AsyncDeadlineInterceptor(grpc.aio.ServerInterceptor):
+    """DeadlineInterceptor for grpc.aio servers.
+
+    A cancelled RPC cancels its handler task, and asyncpg cancels the running
+    statement with it, so no termination callback is needed here.
+    """
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        return _wrap_handler(handler, None, self._unary, self._stream)
+
+    @staticmethod
+    async def _start(context):
+        rpc = RpcDeadline(context.time_remaining())
+        if rpc.expired():
+            await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline exceeded before the request was handled")
+        _rpc.set(rpc)
+        return rpc
+
+    @classmethod
+    def _unary(cls, behavior, method):
+        async def wrapper(request, context):
+            rpc = await cls._start(context)
+            try:
+                response = await behavior(request, context)
+            finally:
+                rpc.finished = True
+            if _deadline_exceeded(rpc):
+                await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline exceeded")
+            return response
+
+        return wrapper
+
+    @classmethod
+    def _stream(cls, behavior, method):
+        async def wrapper(request, context):
+            rpc = await cls._start(context)
+            try:
+                async for response in behavior(request, context):
+                    if _deadline_exceeded(rpc):
+                        break
+                    yield response
+            finally:
+                rpc.finished = True
+            if _deadline_exceeded(rpc):
+                await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline exceeded")
+
+        return wrapper
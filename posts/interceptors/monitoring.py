@@ -0,0 +1,171 @@
+import asyncio
+import time
+import grpc
+import metrics
+from . import db_time
+
+
+def error_kind(error):
+    """Small fixed label for the free-form error text of a response"""
+    text = error.lower()
+    if 'not found' in text:
+        return 'not_found'
+    if 'access denied' in text:
+        return 'access_denied'
+    if text.startswith(('invalid', 'too many', 'content')):
+        return 'invalid_argument'
+    return 'internal'
+
+
+def response_error(response):
+    """Error text of a response: the error field, or the message of an unsuccessful one"""
+    error = getattr(response, 'error', None)
+    if error:
+        return error
+    if getattr(response, 'success', True) is False:
+        return response.message or 'failed'
+    return None
+
+
+class RpcMetrics:
+    """Latency, in-flight, error and DB time accounting of one RPC"""
+
+    def __init__(self, method):
+        self.method = method
+        self.error = None
+
+    def start(self):
+        metrics.RPC_IN_FLIGHT.labels(self.method).inc()
+        db_time.start()
+        self.started = time.perf_counter()
+
+    def response(self, response):
+        # First error of a stream is enough to count the RPC as failed
+        if self.error is None:
+            self.error = response_error(response)
+
+    def finish(self, exception=None, code=None):
+        metrics.RPC_LATENCY.labels(self.method).observe(time.perf_counter() - self.started)
+        metrics.RPC_DB_SECONDS.labels(self.method).observe(db_time.stop())
+        metrics.RPC_IN_FLIGHT.labels(self.method).dec()
+        if exception is not None and code is not None and code != grpc.StatusCode.OK:
+            # Aborted with a status code, or ended by its deadline
+            metrics.RPC_ERRORS.labels(self.method, code.name.lower()).inc()
+        elif isinstance(exception, (asyncio.CancelledError, GeneratorExit)):
+            metrics.RPC_ERRORS.labels(self.method, 'cancelled').inc()
+        elif exception is not None:
+            metrics.RPC_ERRORS.labels(self.method, 'exception').inc()
+        elif self.error:
+            metrics.RPC_ERRORS.labels(self.method, error_kind(self.error)).inc()
+
+
+def _status_code(context):
+    """Status code a failed handler ended with, None if none was set"""
+    try:
+        code = context.code()
+        if code is None and context.time_remaining() <= 0:
+            return grpc.StatusCode.DEADLINE_EXCEEDED
+        return code
+    except Exception:
+        return None
+
+
+def _method_name(handler_call_details):
+    return handler_call_details.method.rsplit('/', 1)[-1]
+
+
+def _wrap_handler(handler, method, wrap_unary, wrap_stream):
+    if handler.unary_unary:
+        return handler._replace(unary_unary=wrap_unary(handler.unary_unary, method))
+    if handler.stream_unary:
+        return handler._replace(stream_unary=wrap_unary(handler.stream_unary, method))
+    if handler.unary_stream:
+        return handler._replace(unary_stream=wrap_stream(handler.unary_stream, method))
+    if handler.stream_stream:
+        return handler._replace(stream_stream=wrap_stream(handler.stream_stream, method))
+    return handler
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records per-method latency, in-flight RPCs, errors and DB time for grpc.server"""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        return _wrap_handler(handler, _method_name(handler_call_details), self._unary, self._stream)
+
+    @staticmethod
+    def _unary(behavior, method):
+        def wrapper(request, context):
+            rpc = RpcMetrics(method)
+            rpc.start()
+            try:
+                response = behavior(request, context)
+            except BaseException as e:
+                rpc.finish(e, _status_code(context))
+                raise
+            rpc.response(response)
+            rpc.finish()
+            return response
+
+        return wrapper
+
+    @staticmethod
+    def _stream(behavior, method):
+        def wrapper(request, context):
+            rpc = RpcMetrics(method)
+            rpc.start()
+            try:
+                for response in behavior(request, context):
+                    rpc.response(response)
+                    yield response
+            # Includes GeneratorExit when the client cancels the stream
+            except BaseException as e:
+                rpc.finish(e, _status_code(context))
+                raise
+            rpc.finish()
+
+        return wrapper
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """MetricsInterceptor for grpc.aio servers"""
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        return _wrap_handler(handler, _method_name(handler_call_details), self._unary, self._stream)
+
+    @staticmethod
+    def _unary(behavior, method):
+        async def wrapper(request, context):
+            rpc = RpcMetrics(method)
+            rpc.start()
+            try:
+                response = await behavior(request, context)
+            except BaseException as e:
+                rpc.finish(e, _status_code(context))
+                raise
+            rpc.response(response)
+            rpc.finish()
+            return response
+
+        return wrapper
+
+    @staticmethod
+    def _stream(behavior, method):
+        async def wrapper(request, context):
+            rpc = RpcMetrics(method)
+            rpc.start()
+            try:
+                async for response in behavior(request, context):
+                    rpc.response(response)
+                    yield response
+            except BaseException as e:
+                rpc.finish(e, _status_code(context))
+                raise
+            rpc.finish()
+
+        return wrapper
@@ -1,36 +1,419 @@
-from kafka import KafkaProducer
-import json
+from kafka import KafkaProducer, codec
+from kafka.errors import KafkaConnectionError, KafkaTimeoutError
+from kafka.partitioner import DefaultPartitioner, Partitioner, StickyPartitioner
+import importlib
+import itertools
 import logging
+import os
+import threading
+import time
 from datetime import datetime
+from config import Config
+import event_codec
+import metrics
+from event_spool import EventSpool, SpoolReplay
+
+VIEWS_TOPIC = 'post_views'
+LIKES_TOPIC = 'post_likes'
+COMMENTS_TOPIC = 'post_comments'
+
+
+class RoundRobinPartitioner(Partitioner):
+    """Spreads records over the available partitions in turn, whatever their key"""
+
+    def __init__(self):
+        self.counter = itertools.count()
+
+    def partition(self, topic, key, serialized_key, value, serialized_value, cluster):
+        partitions = cluster.partitions_for_topic(topic)
+        if partitions is None:
+            raise ValueError(f"Topic {topic} not found in cluster metadata")
+        partitions = sorted(cluster.available_partitions_for_topic(topic) or partitions)
+        return partitions[next(self.counter) % len(partitions)]
+
+
+PARTITIONERS = {
+    'murmur2': DefaultPartitioner,
+    'sticky': StickyPartitioner,
+    'round_robin': RoundRobinPartitioner
+}
+
+_COMPRESSION_CODECS = {
+    'gzip': codec.has_gzip,
+    'snappy': codec.has_snappy,
+    'lz4': codec.has_lz4,
+    'zstd': codec.has_zstd
+}
+
+
+def make_partitioner(name):
+    """Partitioner of KAFKA_PARTITIONER: a name from PARTITIONERS or 'module:Class'"""
+    if name in PARTITIONERS:
+        return PARTITIONERS[name]()
+    module_name, _, class_name = name.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def compression_type(name, api_version):
+    """KAFKA_COMPRESSION_TYPE when the client can use it, otherwise None (uncompressed)"""
+    if name is None:
+        return None
+    if name not in _COMPRESSION_CODECS:
+        logging.error(f"Unknown Kafka compression type {name}, sending uncompressed")
+        return None
+    if not _COMPRESSION_CODECS[name]():
+        logging.warning(f"Library for Kafka {name} compression is not installed, sending uncompressed")
+        return None
+    if name == 'zstd' and api_version < (2, 1):
+        logging.warning("Kafka zstd compression needs KAFKA_API_VERSION 2.1 or newer, sending uncompressed")
+        return None
+    return name
+
+
+class _Spooled:
+    """Stands for the future of a record written to the spool instead of Kafka"""
+
+    is_done = True
+
+    def get(self, timeout=None):
+        return None
+
+    def succeeded(self):
+        return True
+
+    def failed(self):
+        return False
+
+    def add_callback(self, fn, *args):
+        pass
+
+
+SPOOLED = _Spooled()
+
+
+class _Refused:
+    """Stands for the future of a record that could not be queued, with the error why"""
+
+    is_done = True
+
+    def __init__(self, exception):
+        self.exception = exception
+
+    def succeeded(self):
+        return False
+
+    def failed(self):
+        return True
+
+    def add_callback(self, fn, *args):
+        pass
+
+
+def _encode_key(key):
+    if key is None or isinstance(key, bytes):
+        return key
+    return str(key).encode('utf-8')
+
+
+def _queued(futures):
+    """Whether every record of an event was queued or spooled"""
+    return all(future is not None and not isinstance(future, _Refused) for future in futures)
+
+
+def _delivered(futures):
+    """Whether every record of an event was acknowledged"""
+    return all(future is not None and future.succeeded() for future in futures)
+
+
+def _delivery_error(futures):
+    """None when every record of an event was acknowledged, otherwise the error of one that was not"""
+    for future in futures:
+        if future is None:
+            return KafkaTimeoutError("Kafka buffer full")
+        if not future.is_done:
+            return KafkaTimeoutError(f"Not acknowledged within {Config.KAFKA_SEND_TIMEOUT}s")
+        if future.failed():
+            return future.exception
+    return None
+
+
+def retriable_error(error):
+    """Whether a delivery error is the broker being unreachable or busy rather than the record being rejected"""
+    return getattr(error, 'retriable', False)
+
 
 class EventProducer:
+    """Kafka producer of the service events.
+
+    With KAFKA_ASYNC_SEND (the default) send_event only queues the event: the
+    client batches records for KAFKA_LINGER_MS, delivery is reported by
+    callbacks, and request handlers never wait for the broker. At most
+    KAFKA_MAX_PENDING events wait for an acknowledgement; past that new events
+    are dropped, or with KAFKA_BUFFER_FULL_POLICY=block wait up to
+    KAFKA_MAX_BLOCK_MS for room. close() flushes what is still queued.
+    With KAFKA_LAZY_CONNECT the client is created by a background thread,
+    retrying every KAFKA_RECONNECT_INTERVAL, so the constructor never waits
+    for the broker.
+
+    With a KAFKA_SPOOL_DIR, events that cannot be handed to Kafka (no
+    producer, full buffer, failed delivery) are written to an EventSpool
+    instead of being dropped, and so are new events while the spool is not
+    empty, to keep them in order; SpoolReplay sends them once the broker is
+    back. publish() never spools, its callers keep undelivered events.
+
+    Events are serialized by event_codec in EVENT_FORMAT: JSON, protobuf
+    messages on the topic with the '.pb' suffix, or both while consumers
+    migrate ('dual').
+
+    Post events are keyed by post_id, so that the events of a post stay in
+    one partition in order; KAFKA_PARTITIONER picks how keys map to
+    partitions.
+    """
+
     def __init__(self, bootstrap_servers):
+        self.async_send = Config.KAFKA_ASYNC_SEND
+        self.event_format = Config.EVENT_FORMAT
+        self.pending = 0
+        self.buffer = threading.Condition()
+        self.bootstrap_servers = bootstrap_servers
+        self.connect_lock = threading.Lock()
+        self.producer = None
+        # Set by a delivery that failed for want of a broker, cleared by the next acknowledged one
+        self._unreachable = False
+        self._closed = threading.Event()
+        if Config.KAFKA_LAZY_CONNECT:
+            threading.Thread(target=self._connect_in_background, name='kafka-connect', daemon=True).start()
+        else:
+            self.connect()
+
+        self.spool = None
+        self.spool_replay = None
+        if Config.KAFKA_SPOOL_DIR:
+            self.spool = self._open_spool(os.path.join(Config.KAFKA_SPOOL_DIR, f'worker-{Config.WORKER_INDEX}'))
+        if self.spool:
+            self.spool_replay = SpoolReplay(
+                self.spool,
+                self.connect,
+                self._publish_records,
+                batch_size=Config.KAFKA_SPOOL_REPLAY_BATCH,
+                retry_interval=Config.KAFKA_SPOOL_RETRY_INTERVAL
+            )
+            self.spool_replay.start()
+
+    def _open_spool(self, directory):
         try:
-            self.producer = KafkaProducer(
-                bootstrap_servers=bootstrap_servers,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                api_version=(0, 10)
+            return EventSpool(
+                directory,
+                max_bytes=Config.KAFKA_SPOOL_MAX_BYTES,
+                segment_bytes=Config.KAFKA_SPOOL_SEGMENT_BYTES,
+                fsync_interval=Config.KAFKA_SPOOL_FSYNC_INTERVAL
             )
-            logging.info(f"Kafka producer initialized with bootstrap servers: {bootstrap_servers}")
         except Exception as e:
-            logging.error(f"Failed to initialize Kafka producer: {str(e)}")
-            self.producer = None
+            logging.error(f"Cannot open event spool {directory}, events are dropped while Kafka "
+                          f"is unreachable: {str(e)}")
+            return None
 
-    def send_event(self, topic, event_data):
-        """Send an event to the specified Kafka topic"""
-        if not self.producer:
+    def connect(self):
+        """Create the Kafka producer if there is none yet; returns whether there is one"""
+        with self.connect_lock:
+            if self.producer is None:
+                try:
+                    self.producer = KafkaProducer(
+                        bootstrap_servers=self.bootstrap_servers,
+                        api_version=Config.KAFKA_API_VERSION,
+                        linger_ms=Config.KAFKA_LINGER_MS,
+                        batch_size=Config.KAFKA_BATCH_SIZE,
+                        compression_type=compression_type(Config.KAFKA_COMPRESSION_TYPE, Config.KAFKA_API_VERSION),
+                        partitioner=make_partitioner(Config.KAFKA_PARTITIONER),
+                        max_block_ms=Config.KAFKA_MAX_BLOCK_MS
+                    )
+                    logging.info(f"Kafka producer initialized with bootstrap servers: {self.bootstrap_servers}")
+                except Exception as e:
+                    logging.error(f"Failed to initialize Kafka producer: {str(e)}")
+            return self.producer is not None
+
+    def _connect_in_background(self):
+        while not self.connect() and not self._closed.wait(Config.KAFKA_RECONNECT_INTERVAL):
+            pass
+
+    def connected(self):
+        """Whether there is a producer and its last delivery did not fail to reach a broker.
+
+        KafkaProducer.bootstrap_connected() is only true while a bootstrap is
+        in progress, so outages are noticed through the delivery callbacks.
+        """
+        return self.producer is not None and not self._unreachable
+
+    def _reserve(self):
+        """Take a place among the pending events, False when the buffer is full"""
+        with self.buffer:
+            if self.pending >= Config.KAFKA_MAX_PENDING and Config.KAFKA_BUFFER_FULL_POLICY == 'block':
+                self.buffer.wait_for(lambda: self.pending < Config.KAFKA_MAX_PENDING,
+                                     timeout=Config.KAFKA_MAX_BLOCK_MS / 1000)
+            if self.pending >= Config.KAFKA_MAX_PENDING:
+                return False
+            self.pending += 1
+        metrics.KAFKA_PENDING.inc()
+        return True
+
+    def _release(self):
+        with self.buffer:
+            self.pending -= 1
+            self.buffer.notify()
+        metrics.KAFKA_PENDING.dec()
+
+    def _on_delivery(self, topic, started, record_metadata):
+        self._release()
+        self._unreachable = False
+        metrics.KAFKA_DELIVERY_SECONDS.labels(topic).observe(time.perf_counter() - started)
+        metrics.KAFKA_EVENTS.labels(topic, 'sent').inc()
+        logging.debug(f"Event sent to {record_metadata.topic} partition {record_metadata.partition} "
+                      f"offset {record_metadata.offset}")
+
+    def _on_error(self, topic, started, exception):
+        self._release()
+        if retriable_error(exception):
+            self._unreachable = True
+        metrics.KAFKA_DELIVERY_SECONDS.labels(topic).observe(time.perf_counter() - started)
+        metrics.KAFKA_EVENTS.labels(topic, 'failed').inc()
+        logging.error(f"Error sending event to topic {topic}: {str(exception)}")
+
+    def _send_record(self, topic, value, key=None, spool=True):
+        """Queue a serialized record with delivery callbacks.
+
+        Returns its future, SPOOLED when it went to the spool, None if it was
+        dropped, or a _Refused with the error when the producer raised.
+        """
+        spool = spool and self.spool is not None
+        if spool and (self.producer is None or self.spool.pending()):
+            return self._spool_record(topic, value, key)
+        if self.producer is None:
+            return None
+
+        if not self._reserve():
+            if spool:
+                return self._spool_record(topic, value, key)
+            metrics.KAFKA_EVENTS.labels(topic, 'dropped').inc()
+            logging.warning(f"Kafka buffer full ({self.pending} pending events), event to {topic} dropped")
+            return None
+
+        started = time.perf_counter()
+        try:
+            future = self.producer.send(topic, value, key=_encode_key(key))
+        except Exception as e:
+            self._on_error(topic, started, e)
+            return self._spool_record(topic, value, key) if spool else _Refused(e)
+
+        future.add_callback(self._on_delivery, topic, started)
+        future.add_errback(self._on_error, topic, started)
+        if spool:
+            future.add_errback(self._spool_failed, topic, value, key)
+        return future
+
+    def _publish_records(self, records):
+        """Send serialized (topic, key, value) records past the spool; whether each was acknowledged"""
+        futures = []
+        for topic, key, value in records:
+            future = self._send_record(topic, value, key, spool=False)
+            if future is None or isinstance(future, _Refused):
+                # Broker still unreachable, the rest would only wait for the same timeout
+                break
+            futures.append(future)
+        try:
+            self.producer.flush(timeout=Config.KAFKA_SEND_TIMEOUT)
+        except Exception as e:
+            logging.error(f"Error flushing {len(records)} spooled messages: {str(e)}")
+        return [future.succeeded() for future in futures] + [False] * (len(records) - len(futures))
+
+    def _spool_record(self, topic, value, key):
+        if self.spool.append(topic, _encode_key(key), value):
+            return SPOOLED
+        return None
+
+    def _spool_failed(self, topic, value, key, exception):
+        self._spool_record(topic, value, key)
+
+    def _send(self, topic, event_data, key=None, spool=True):
+        """Queue an event in every format of EVENT_FORMAT.
+
+        Returns the futures of its records, None for the ones that were
+        dropped and a _Refused when the event could not be serialized.
+        """
+        try:
+            records = event_codec.encode(event_data, self.event_format)
+        except Exception as e:
+            metrics.KAFKA_EVENTS.labels(topic, 'failed').inc()
+            logging.error(f"Error serializing event to topic {topic}: {str(e)}")
+            return [_Refused(e)]
+        return [self._send_record(topic + suffix, value, key, spool) for suffix, value in records]
+
+    def send_event(self, topic, event_data, key=None):
+        """Send an event to the specified Kafka topic.
+
+        Returns whether the event was queued or spooled, or in synchronous
+        mode whether the broker acknowledged it (failed events are spooled
+        all the same).
+        """
+        if not self.producer and not self.spool:
             logging.error(f"Cannot send message to topic {topic}: Kafka producer not initialized")
             return False
 
+        futures = self._send(topic, event_data, key)
+        if not _queued(futures):
+            return False
+        if self.async_send:
+            return True
+
         try:
-            future = self.producer.send(topic, event_data)
-            record_metadata = future.get(timeout=10)
-            logging.info(f"Event sent to {record_metadata.topic} partition {record_metadata.partition} offset {record_metadata.offset}")
+            for future in futures:
+                future.get(timeout=Config.KAFKA_SEND_TIMEOUT)
             return True
-        except Exception as e:
-            logging.error(f"Error sending event to topic {topic}: {str(e)}")
+        except Exception:
+            # Counted and logged by the errback
             return False
 
+    def send_events(self, topic, events, key_field=None):
+        """Send several events to a topic, keyed by their key_field value.
+
+        Returns the number of events queued or spooled, or in synchronous mode
+        the number the broker acknowledged (or spooled) after one flush for
+        the whole batch.
+        """
+        if not self.producer and not self.spool:
+            logging.error(f"Cannot send {len(events)} messages to topic {topic}: Kafka producer not initialized")
+            return 0
+
+        futures = [self._send(topic, event_data, event_data[key_field] if key_field else None)
+                   for event_data in events]
+        if self.async_send:
+            return sum(1 for records in futures if _queued(records))
+
+        if self.producer:
+            try:
+                self.producer.flush(timeout=Config.KAFKA_SEND_TIMEOUT)
+            except Exception as e:
+                logging.error(f"Error flushing events to topic {topic}: {str(e)}")
+        return sum(1 for records in futures if _delivered(records))
+
+    def publish(self, records):
+        """Send (topic, key, event_data) records and wait for all of them.
+
+        Returns, for each record, None when it was acknowledged and otherwise
+        the error it failed with, whatever KAFKA_ASYNC_SEND says: the outbox
+        relay only deletes delivered events, and tells an unreachable broker
+        (retriable_error) from a record that was rejected.
+        """
+        if not self.producer:
+            logging.error(f"Cannot publish {len(records)} messages: Kafka producer not initialized")
+            return [KafkaConnectionError("Kafka producer not initialized")] * len(records)
+
+        futures = [self._send(topic, event_data, key, spool=False) for topic, key, event_data in records]
+        try:
+            self.producer.flush(timeout=Config.KAFKA_SEND_TIMEOUT)
+        except Exception as e:
+            logging.error(f"Error flushing {len(records)} messages: {str(e)}")
+        return [_delivery_error(records) for records in futures]
+
     def send_view_event(self, user_id, post_id):
         """Send a post view event"""
         event_data = {
@@ -39,7 +422,20 @@ class EventProducer:
             'post_id': post_id,
             'timestamp': datetime.utcnow().isoformat()
         }
-        return self.send_event('post_views', event_data)
+        return self.send_event(VIEWS_TOPIC, event_data, key=post_id)
+
+    def send_view_events(self, views):
+        """Send post view events for (post_id, user_id) pairs as one batch"""
+        timestamp = datetime.utcnow().isoformat()
+        return self.send_events(VIEWS_TOPIC, [
+            {
+                'event_type': 'post_view',
+                'user_id': user_id,
+                'post_id': post_id,
+                'timestamp': timestamp
+            }
+            for post_id, user_id in views
+        ], key_field='post_id')
 
     def send_like_event(self, user_id, post_id):
         """Send a post like event"""
@@ -49,7 +445,7 @@ class EventProducer:
             'post_id': post_id,
             'timestamp': datetime.utcnow().isoformat()
         }
-        return self.send_event('post_likes', event_data)
+        return self.send_event(LIKES_TOPIC, event_data, key=post_id)
 
     def send_comment_event(self, user_id, post_id, comment_id):
         """Send a post comment event"""
@@ -60,10 +456,39 @@ class EventProducer:
             'comment_id': comment_id,
             'timestamp': datetime.utcnow().isoformat()
         }
-        return self.send_event('post_comments', event_data)
+        return self.send_event(COMMENTS_TOPIC, event_data, key=post_id)
+
+    def send_cache_invalidation_event(self, topic, post_id, version=None):
+        """Send a post cache invalidation to the other replicas"""
+        event_data = {
+            'event_type': 'post_cache_invalidation',
+            'post_id': post_id,
+            'version': version.isoformat() if version else None,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        return self.send_event(topic, event_data, key=post_id)
+
+    def send_count_invalidation_event(self, topic, author_id, tags, is_public):
+        """Send a listing total invalidation (CountCache.invalidate) to the other replicas"""
+        event_data = {
+            'event_type': 'post_count_invalidation',
+            'author_id': author_id,
+            'tags': list(tags or []),
+            'is_public': is_public,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        return self.send_event(topic, event_data, key=author_id)
 
     def close(self):
-        """Close the Kafka producer"""
+        """Deliver the events still queued and close the Kafka producer"""
+        self._closed.set()
+        if self.spool_replay:
+            self.spool_replay.stop()
+            self.spool_replay.join()
         if self.producer:
-            self.producer.close()
-            logging.info("Kafka producer closed")
\ No newline at end of file
+            self.producer.close(timeout=Config.KAFKA_SEND_TIMEOUT)
+            if self.pending:
+                logging.warning(f"Kafka producer closed with {self.pending} undelivered events")
+            logging.info("Kafka producer closed")
+        if self.spool:
+            self.spool.close()
\ No newline at end of file
@@ -0,0 +1,119 @@
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import time
+from config import Config
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(process)d - %(message)s'
+)
+
+
+def run_worker(index):
+    # SIGTERM from the supervisor goes through the same shutdown path as Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    Config.WORKER_INDEX = index
+
+    # Imported here so that grpc, the engine and the Kafka clients are only
+    # created in the worker, after the fork
+    from server import run
+
+    logging.info(f"Posts worker {index} started (pid {os.getpid()})")
+    try:
+        run()
+    except KeyboardInterrupt:
+        pass
+
+
+def create_schema():
+    """Create the missing tables once before forking, when AUTO_MIGRATE is set"""
+    from sqlalchemy import create_engine
+    from migrate import migrate
+
+    engine = create_engine(Config.DATABASE_URL)
+    try:
+        migrate(engine)
+    finally:
+        engine.dispose()
+
+
+class Supervisor:
+    """Prefork launcher: starts SERVER_WORKERS processes and restarts the ones that die.
+
+    Every worker runs its own gRPC server (bound with SO_REUSEPORT, so the kernel
+    spreads connections between them), engine and connection pool, caches and
+    Kafka clients. SIGTERM or SIGINT stops the workers and the supervisor.
+    """
+
+    def __init__(self, workers, restart_delay):
+        self.workers = workers
+        self.restart_delay = restart_delay
+        self.context = multiprocessing.get_context('fork')
+        self.processes = {}
+        self.stopping = False
+
+    def start_worker(self, index):
+        process = self.context.Process(target=run_worker, args=(index,), name=f'posts-worker-{index}')
+        process.start()
+        self.processes[index] = process
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        if Config.AUTO_MIGRATE:
+            create_schema()
+        for index in range(self.workers):
+            self.start_worker(index)
+        logging.info(f"Posts supervisor started {self.workers} workers on port {Config.GRPC_PORT}")
+
+        while not self.stopping:
+            sentinels = {process.sentinel: index for index, process in self.processes.items()}
+            for sentinel in multiprocessing.connection.wait(list(sentinels), timeout=1):
+                if self.stopping:
+                    break
+
+                index = sentinels[sentinel]
+                process = self.processes[index]
+                process.join()
+                logging.error(f"Posts worker {index} (pid {process.pid}) exited with code "
+                              f"{process.exitcode}, restarting in {self.restart_delay}s")
+                time.sleep(self.restart_delay)
+                self.start_worker(index)
+
+        self.shutdown()
+
+    def shutdown(self, timeout=10):
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + timeout
+        for process in self.processes.values():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+        logging.info("Posts supervisor stopped")
+
+
+def main():
+    if Config.SERVER_WORKERS <= 1:
+        if Config.AUTO_MIGRATE:
+            create_schema()
+        from server import run
+        run()
+        return
+
+    Supervisor(Config.SERVER_WORKERS, Config.WORKER_RESTART_DELAY).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import logging
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from config import Config
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'posts_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a connection from the pool',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_TIMEOUTS = Counter(
+    'posts_db_pool_checkout_timeouts_total',
+    'Checkouts that gave up after DB_POOL_TIMEOUT'
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'posts_db_pool_checked_out',
+    'Connections currently checked out of the pool'
+)
+DB_POOL_SATURATION = Gauge(
+    'posts_db_pool_saturation',
+    'Checked out connections relative to DB_POOL_SIZE + DB_MAX_OVERFLOW'
+)
+
+KAFKA_DELIVERY_SECONDS = Histogram(
+    'posts_kafka_delivery_seconds',
+    'Time from queueing an event until the broker acknowledged or rejected it',
+    ['topic'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+KAFKA_EVENTS = Counter(
+    'posts_kafka_events_total',
+    'Events by outcome: sent, failed or dropped because the buffer was full',
+    ['topic', 'outcome']
+)
+KAFKA_PENDING = Gauge(
+    'posts_kafka_pending_events',
+    'Events queued and not acknowledged yet'
+)
+KAFKA_SPOOL_RECORDS = Counter(
+    'posts_kafka_spool_records_total',
+    'Spooled records by outcome: spooled, replayed, dropped when the spool was full or corrupt',
+    ['outcome']
+)
+KAFKA_SPOOL_BYTES = Gauge(
+    'posts_kafka_spool_bytes',
+    'Bytes of spooled records waiting for replay'
+)
+VIEWS_AGGREGATED = Counter(
+    'posts_views_aggregated_total',
+    'View events the outbox relay counted into view summaries'
+)
+VIEW_SUMMARIES = Counter(
+    'posts_view_summary_events_total',
+    'Per-post view summary events acknowledged on VIEW_SUMMARY_TOPIC'
+)
+
+OUTBOX_RELAYED = Counter(
+    'posts_outbox_relayed_total',
+    'Outbox events published to Kafka and deleted'
+)
+OUTBOX_FAILED = Counter(
+    'posts_outbox_failed_total',
+    'Outbox event deliveries that failed (rejected or Kafka unreachable) and will be retried'
+)
+OUTBOX_DISCARDED = Counter(
+    'posts_outbox_discarded_total',
+    'Outbox events moved to outbox_dead_letters after OUTBOX_MAX_ATTEMPTS rejected deliveries'
+)
+
+RPC_LATENCY = Histogram(
+    'posts_grpc_server_handling_seconds',
+    'Time to handle an RPC, until the last message of a stream',
+    ['method'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+RPC_IN_FLIGHT = Gauge(
+    'posts_grpc_server_in_flight',
+    'RPCs being handled',
+    ['method']
+)
+RPC_ERRORS = Counter(
+    'posts_grpc_server_errors_total',
+    'RPCs answered with an error, by kind of the error field of the response',
+    ['method', 'kind']
+)
+RPC_DB_SECONDS = Histogram(
+    'posts_grpc_server_db_seconds',
+    'Time an RPC spent executing database statements',
+    ['method'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+
+def start_metrics_server():
+    """Serve the metrics of this process over HTTP, each worker on its own port"""
+    if not Config.METRICS_PORT:
+        return None
+
+    port = Config.METRICS_PORT + Config.WORKER_INDEX
+    start_http_server(port)
+    logging.info(f"Posts metrics served on port {port}")
+    return port
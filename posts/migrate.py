@@ -0,0 +1,171 @@
+"""Database schema of the posts service.
+
+The servers don't create tables on startup (unless AUTO_MIGRATE is set), so
+this runs once per deploy before them:
+
+    python migrate.py           bring the schema up to date with the models
+    python migrate.py check     exit with status 1 while the schema is behind the models
+
+create_all only creates the tables that don't exist yet, so the columns,
+unique constraints and indexes added to the tables of earlier deploys are
+added separately: columns with their server default, constraints after
+deleting the rows the earlier schema let through twice, indexes with
+CREATE INDEX CONCURRENTLY. post_counters is
+filled from the likes, views and comments (reconcile_counters.py) when it
+is created for existing posts and when duplicate likes or views are deleted.
+"""
+import logging
+import sys
+from sqlalchemy import create_engine, inspect, select, delete, exists, and_, text, MetaData, UniqueConstraint
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import AddConstraint, CreateIndex
+from models import Base, PostCounters
+from reconcile_counters import reconcile_counters
+from config import Config
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+def missing_tables(connection):
+    """Names of the tables of the models that don't exist yet"""
+    existing = set(inspect(connection).get_table_names())
+    return [name for name in Base.metadata.tables if name not in existing]
+
+
+def find_missing(inspector):
+    """(tables, columns, unique constraints, indexes) of the models the database lacks.
+
+    Columns, constraints and indexes are only looked for on tables that
+    exist, since create_all creates a table with all of them. A unique
+    constraint matches by its columns, an index by its name.
+    """
+    existing_tables = set(inspector.get_table_names())
+    tables, columns, constraints, indexes = [], [], [], []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            tables.append(table)
+            continue
+
+        column_names = {column['name'] for column in inspector.get_columns(table.name)}
+        columns += [column for column in table.columns if column.name not in column_names]
+
+        unique = {frozenset(constraint['column_names'])
+                  for constraint in inspector.get_unique_constraints(table.name)}
+        constraints += [
+            constraint for constraint in table.constraints
+            if isinstance(constraint, UniqueConstraint) and frozenset(constraint.columns.keys()) not in unique
+        ]
+        index_names = {index['name'] for index in inspector.get_indexes(table.name)}
+        indexes += [index for index in table.indexes if index.name not in index_names]
+    return tables, columns, constraints, indexes
+
+
+def missing_schema(connection):
+    """Descriptions of the tables, columns, unique constraints and indexes the database lacks"""
+    tables, columns, constraints, indexes = find_missing(inspect(connection))
+    return ([f'table {table.name}' for table in tables]
+            + [f'column {column.table.name}.{column.name}' for column in columns]
+            + [f'constraint {constraint.name}' for constraint in constraints]
+            + [f'index {index.name}' for index in indexes])
+
+
+def add_column(connection, column):
+    """Add a model column to its table; the existing rows get its server default"""
+    table = connection.dialect.identifier_preparer.format_table(column.table)
+    specification = connection.dialect.ddl_compiler(connection.dialect, None).get_column_specification(column)
+    connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {specification}'))
+
+
+def add_unique_constraint(connection, constraint):
+    """Delete the rows duplicating an earlier one on the constraint's columns, then add it.
+
+    The table is locked against writes until the transaction ends, so no new
+    duplicate gets in between. Returns the number of deleted rows.
+    """
+    table = constraint.table
+    earlier = table.alias('earlier')
+    preparer = connection.dialect.identifier_preparer
+    connection.execute(text(f'LOCK TABLE {preparer.format_table(table)} IN SHARE ROW EXCLUSIVE MODE'))
+    deleted = connection.execute(delete(table).where(exists(
+        select(earlier.c.id).where(
+            and_(*[earlier.c[column.name] == column for column in constraint.columns]),
+            earlier.c.id < table.c.id
+        )
+    )))
+    connection.execute(AddConstraint(constraint))
+    return deleted.rowcount
+
+
+def create_index_concurrently(connection, index):
+    """Build a model index without blocking writes to its table.
+
+    CONCURRENTLY can't run in a transaction, so the connection has to be in
+    autocommit mode. A build that failed leaves an invalid index that IF NOT
+    EXISTS skips afterwards: drop it and migrate again.
+    """
+    # Built from a copy, create_all must not get the CONCURRENTLY option
+    table = index.table.to_metadata(MetaData())
+    concurrent = next(copy for copy in table.indexes if copy.name == index.name)
+    concurrent.dialect_kwargs['postgresql_concurrently'] = True
+    connection.execute(CreateIndex(concurrent, if_not_exists=True))
+
+
+def migrate(engine):
+    """Create the missing tables, columns, unique constraints and indexes; returns what was done"""
+    changes = []
+    with engine.begin() as connection:
+        tables, columns, constraints, indexes = find_missing(inspect(connection))
+        Base.metadata.create_all(connection)
+        changes += [f'table {table.name}' for table in tables]
+        for column in columns:
+            add_column(connection, column)
+            changes.append(f'column {column.table.name}.{column.name}')
+        stale_counters = PostCounters.__table__ in tables
+        for constraint in constraints:
+            deleted = add_unique_constraint(connection, constraint)
+            changes.append(f'constraint {constraint.name} ({deleted} duplicate rows deleted)')
+            stale_counters = stale_counters or deleted > 0
+
+    if stale_counters:
+        with Session(engine) as session:
+            repaired = reconcile_counters(session)
+        changes.append(f'post_counters backfilled ({repaired} rows)')
+
+    if indexes:
+        with engine.connect() as connection:
+            connection.execution_options(isolation_level='AUTOCOMMIT')
+            for index in indexes:
+                create_index_concurrently(connection, index)
+                changes.append(f'index {index.name}')
+    return changes
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'create'
+    if command not in ('create', 'check'):
+        print(__doc__)
+        return 2
+
+    engine = create_engine(Config.DATABASE_URL)
+    try:
+        if command == 'check':
+            with engine.connect() as connection:
+                missing = missing_schema(connection)
+            if missing:
+                logging.error(f"Missing from the schema: {', '.join(missing)}")
+                return 1
+            logging.info("Posts schema is up to date")
+            return 0
+
+        changes = migrate(engine)
+        logging.info(f"Schema updated: {', '.join(changes)}" if changes else "Posts schema is up to date")
+        return 0
+    finally:
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
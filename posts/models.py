@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Table, Text
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Boolean, ForeignKey, DateTime, Table, Text, Index, UniqueConstraint, text
+)
 from sqlalchemy.orm import relationship, declarative_base
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from datetime import datetime
 
 Base = declarative_base()
@@ -16,12 +18,87 @@ class Post(Base):
     tags = Column(ARRAY(String), default=[])
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves the feed ordering and keyset pagination on (created_at, id)
+        Index('ix_posts_created_at_id', created_at.desc(), id.desc()),
+        # Serves tag filters: tags @> ARRAY[...] (all of) and tags && ARRAY[...] (any of)
+        Index('ix_posts_tags', tags, postgresql_using='gin'),
+    )
     
     # Relationships
     likes = relationship("PostLike", back_populates="post", cascade="all, delete-orphan")
     views = relationship("PostView", back_populates="post", cascade="all, delete-orphan")
     comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
+    counters = relationship("PostCounters", back_populates="post", uselist=False, lazy="joined",
+                            cascade="all, delete-orphan")
     
+    def to_dict(self):
+        counters = self.counters
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'user_id': self.user_id,
+            'is_private': self.is_private,
+            'tags': self.tags,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+            'likes_count': counters.likes_count if counters else 0,
+            'views_count': counters.views_count if counters else 0,
+            'comments_count': counters.comments_count if counters else 0
+        }
+
+class PostRow:
+    """Detached snapshot of a post and its counters.
+
+    Returned by the services instead of ORM objects, which expire on commit and
+    can't be read after their session closes. converters.py builds protobuf
+    messages from it without going through to_dict().
+    """
+
+    __slots__ = ('id', 'title', 'description', 'user_id', 'is_private', 'tags', 'created_at',
+                 'updated_at', 'likes_count', 'views_count', 'comments_count', 'excerpt')
+
+    # Rows read for a field mask only carry the requested columns, the others stay None
+    def __init__(self, id, title=None, description=None, user_id=None, is_private=None, tags=None,
+                 created_at=None, updated_at=None, likes_count=0, views_count=0, comments_count=0,
+                 excerpt=None):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.user_id = user_id
+        self.is_private = is_private
+        self.tags = tags
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.likes_count = likes_count
+        self.views_count = views_count
+        self.comments_count = comments_count
+        self.excerpt = excerpt
+
+    @classmethod
+    def from_post(cls, post, description=True):
+        """Snapshot of a loaded Post; description=False for posts loaded with it deferred"""
+        counters = post.counters
+        return cls(
+            post.id, post.title, post.description if description else None, post.user_id,
+            post.is_private, post.tags, post.created_at, post.updated_at,
+            counters.likes_count if counters else 0,
+            counters.views_count if counters else 0,
+            counters.comments_count if counters else 0
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        """PostRow from a result row of queries.post_rows() with any set of fields"""
+        return cls(**row._mapping)
+
+    def copy(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return PostRow(**values)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -32,9 +109,29 @@ class Post(Base):
             'tags': self.tags,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'likes_count': len(self.likes),
-            'views_count': len(self.views),
-            'comments_count': len(self.comments)
+            'likes_count': self.likes_count,
+            'views_count': self.views_count,
+            'comments_count': self.comments_count
+        }
+
+class PostCounters(Base):
+    __tablename__ = 'post_counters'
+
+    # Denormalized engagement counters, maintained by PostsService and
+    # repaired by reconcile_counters.py
+    post_id = Column(Integer, ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True)
+    likes_count = Column(Integer, nullable=False, default=0, server_default='0')
+    views_count = Column(Integer, nullable=False, default=0, server_default='0')
+    comments_count = Column(Integer, nullable=False, default=0, server_default='0')
+
+    post = relationship("Post", back_populates="counters")
+
+    def to_dict(self):
+        return {
+            'post_id': self.post_id,
+            'likes_count': self.likes_count,
+            'views_count': self.views_count,
+            'comments_count': self.comments_count
         }
 
 class PostLike(Base):
@@ -44,6 +141,10 @@ class PostLike(Base):
     post_id = Column(Integer, ForeignKey('posts.id'), nullable=False)
     user_id = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('post_id', 'user_id', name='uq_post_likes_post_id_user_id'),
+    )
     
     post = relationship("Post", back_populates="likes")
     
@@ -62,6 +163,10 @@ class PostView(Base):
     post_id = Column(Integer, ForeignKey('posts.id'), nullable=False)
     user_id = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('post_id', 'user_id', name='uq_post_views_post_id_user_id'),
+    )
     
     # Relationship
     post = relationship("Post", back_populates="views")
@@ -82,6 +187,11 @@ class Comment(Base):
     user_id = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves per-post comment listings ordered by (created_at, id)
+        Index('ix_comments_post_id_created_at_id', post_id, created_at.desc(), id.desc()),
+    )
     
     post = relationship("Post", back_populates="comments")
     
@@ -94,11 +204,115 @@ class Comment(Base):
             'created_at': self.created_at.isoformat()
         }
 
-def init_db(db_url):
+class CommentRow:
+    """Detached snapshot of a comment, see PostRow"""
+
+    __slots__ = ('id', 'post_id', 'user_id', 'content', 'created_at')
+
+    def __init__(self, id, post_id, user_id, content, created_at):
+        self.id = id
+        self.post_id = post_id
+        self.user_id = user_id
+        self.content = content
+        self.created_at = created_at
+
+    @classmethod
+    def from_comment(cls, comment):
+        return cls(comment.id, comment.post_id, comment.user_id, comment.content, comment.created_at)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'post_id': self.post_id,
+            'user_id': self.user_id,
+            'content': self.content,
+            'created_at': self.created_at.isoformat()
+        }
+
+class OutboxEvent(Base):
+    __tablename__ = 'outbox'
+
+    # Kafka events written in the transaction of the change they describe and
+    # published by the relay in outbox.py, in (txid, id) order
+    id = Column(BigInteger, primary_key=True)
+    # Transaction that wrote the event. Ids are taken at insert but become
+    # visible at commit, so the relay only reads events of transactions older
+    # than every running one: none can commit behind what it published
+    txid = Column(BigInteger, nullable=False, server_default=text('txid_current()'))
+    topic = Column(String(255), nullable=False)
+    # Message key; events of a post share a partition and keep their order
+    key = Column(String(64))
+    event_type = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Deliveries the broker rejected so far; failures while Kafka is unreachable don't count
+    attempts = Column(Integer, nullable=False, default=0, server_default='0')
+    # Set while a relay publishes the event, so no other relay reads past it
+    claimed_until = Column(DateTime)
+
+    __table_args__ = (
+        # Serve the relay's reads in (txid, id) order; views are read apart
+        # from the other events, which they would outnumber while a view
+        # summary window fills
+        Index('ix_outbox_txid_id', txid, id, postgresql_where=text("event_type <> 'post_view'")),
+        Index('ix_outbox_views_txid_id', txid, id, postgresql_where=text("event_type = 'post_view'")),
+    )
+
+    def event_data(self):
+        """The message as EventProducer sends it"""
+        return {
+            'event_type': self.event_type,
+            **self.payload,
+            'timestamp': self.created_at.isoformat()
+        }
+
+class OutboxDeadLetter(Base):
+    __tablename__ = 'outbox_dead_letters'
+
+    # Outbox events moved here after OUTBOX_MAX_ATTEMPTS rejected deliveries,
+    # kept with the last error until they are replayed or dropped by hand
+    id = Column(BigInteger, primary_key=True)
+    topic = Column(String(255), nullable=False)
+    key = Column(String(64))
+    event_type = Column(String(64), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    error = Column(Text)
+    failed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+def init_db(db_url, pool_size=None):
+    """Session factory of the service engine.
+
+    With pool_size, of an extra engine of that many connections, left out
+    of the pool metrics.
+    """
     from sqlalchemy import create_engine
     from sqlalchemy.orm import sessionmaker
+    from db_pool import engine_options, watch_pool
+    from interceptors import track_db_time, track_deadlines, DeadlineSession
     
-    engine = create_engine(db_url)
-    Base.metadata.create_all(engine)
+    options = engine_options()
+    if pool_size is not None:
+        options.update(pool_size=pool_size, max_overflow=0)
+    engine = create_engine(db_url, **options)
+    if pool_size is None:
+        watch_pool(engine.pool)
+    track_db_time(engine)
+    track_deadlines(engine)
     
-    return sessionmaker(bind=engine)
\ No newline at end of file
+    return sessionmaker(bind=engine, class_=DeadlineSession)
+
+async def init_async_db(db_url):
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from db_pool import engine_options, watch_pool
+    from interceptors import track_db_time, track_deadlines, DeadlineSession
+
+    engine = create_async_engine(db_url, **engine_options(async_driver=True))
+    watch_pool(engine.pool)
+    track_db_time(engine)
+    track_deadlines(engine)
+
+    # Attributes can't be lazily refreshed outside of an await, so objects
+    # keep their state after commit
+    return async_sessionmaker(bind=engine, expire_on_commit=False, sync_session_class=DeadlineSession)
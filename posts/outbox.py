@@ -0,0 +1,306 @@
+from sqlalchemy import select, delete, update, insert, exists, and_, func
+from datetime import datetime, timedelta, timezone
+from models import OutboxEvent, OutboxDeadLetter
+from kafka_producer import COMMENTS_TOPIC, retriable_error
+import metrics
+import logging
+import threading
+
+# Key of the advisory lock held by the relay draining the outbox
+OUTBOX_LOCK_ID = 0x6f7574626f78
+VIEW_EVENT = 'post_view'
+
+
+def comment_event(comment):
+    """Outbox row of the event for a new comment, which must already have its id"""
+    return OutboxEvent(
+        topic=COMMENTS_TOPIC,
+        key=str(comment.post_id),
+        event_type='post_comment',
+        payload={'user_id': comment.user_id, 'post_id': comment.post_id, 'comment_id': comment.id}
+    )
+
+
+def delivered_ids(events, acknowledged):
+    """Ids of the events that can leave the outbox, and of the ones that failed.
+
+    An event acknowledged after a failed event of the same key stays too, so
+    the events of a post are published again in order with the failed one.
+    """
+    delivered = []
+    failed = []
+    blocked = set()
+    for event, ok in zip(events, acknowledged):
+        if not ok:
+            failed.append(event.id)
+            blocked.add(event.key)
+        elif event.key not in blocked:
+            delivered.append(event.id)
+    return delivered, failed
+
+
+def _epoch_ms(moment):
+    return int(moment.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class ViewAggregator:
+    """Coalesces post view events into view count deltas.
+
+    Keeps the number of views and the distinct viewers of every post among
+    the views added, and the span of time they were written in.
+    """
+
+    def __init__(self):
+        self.views = {}
+        self.viewers = {}
+        self.window_start = None
+        self.window_end = None
+
+    def add_view(self, post_id, user_id, viewed_at):
+        self.views[post_id] = self.views.get(post_id, 0) + 1
+        self.viewers.setdefault(post_id, set()).add(user_id)
+        if self.window_start is None or viewed_at < self.window_start:
+            self.window_start = viewed_at
+        if self.window_end is None or viewed_at > self.window_end:
+            self.window_end = viewed_at
+        metrics.VIEWS_AGGREGATED.inc()
+
+    def summaries(self):
+        """One post_view_summary event per post"""
+        timestamp = datetime.utcnow().isoformat()
+        return [
+            {
+                'event_type': 'post_view_summary',
+                'post_id': post_id,
+                'views': count,
+                'viewers': len(self.viewers[post_id]),
+                'window_start_ms': _epoch_ms(self.window_start),
+                'window_end_ms': _epoch_ms(self.window_end),
+                'timestamp': timestamp
+            }
+            for post_id, count in self.views.items()
+        ]
+
+
+class OutboxRelay(threading.Thread):
+    """Publishes the events of the outbox table to Kafka.
+
+    A round claims a batch and publishes it outside of any transaction:
+
+    1. under a transaction level advisory lock, unless another relay's claim
+       is still running, read batch_size events and claim them for
+       claim_timeout seconds, then commit;
+    2. publish the events and wait for the broker;
+    3. in a second short transaction, delete the delivered events and clear
+       the claim of the others for the next round.
+
+    View events are relayed in batches of their own, or, with a
+    summary_window, as per-post summaries (relay_view_summary).
+
+    Events are read in (txid, id) order and only once the transaction that
+    wrote them is older than every running one, so an event committed late
+    can't land behind events of its post that were already published. A
+    single relay among all replicas and worker processes drains the table at
+    a time, and a relay that dies while publishing lets the next one take
+    over once its claim expires (delivery is at least once). Only deliveries
+    the broker rejected count as attempts: while there is no producer or
+    Kafka is unreachable (a retriable error) events wait however long the
+    outage lasts. An event rejected max_attempts times is moved to the
+    outbox_dead_letters table.
+    """
+
+    def __init__(self, db_session, event_producer, batch_size=500, poll_interval=0.5,
+                 retry_interval=5, max_attempts=10, claim_timeout=60, summary_window=0,
+                 summary_topic='post_view_counts', raw_views_topic=None, summary_max_entries=100000):
+        super().__init__(name='outbox-relay', daemon=True)
+        self.db_session = db_session
+        self.event_producer = event_producer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        self.summary_window = summary_window
+        self.summary_topic = summary_topic
+        self.raw_views_topic = raw_views_topic
+        self.summary_max_entries = summary_max_entries
+        self._stopped = threading.Event()
+
+    def run(self):
+        logging.info("Outbox relay started")
+        while not self._stopped.is_set():
+            try:
+                read, failed = self.relay_batch()
+            except Exception as e:
+                logging.error(f"Outbox relay failed: {str(e)}")
+                self._stopped.wait(self.retry_interval)
+                continue
+
+            if failed:
+                self._stopped.wait(self.retry_interval)
+            elif read < self.batch_size:
+                self._stopped.wait(self.poll_interval)
+
+    def relay_batch(self):
+        """Publish a batch of events and one of views; returns the number of events read and of failed deliveries"""
+        read, failed = self.relay_events(OutboxEvent.event_type != VIEW_EVENT)
+        if self.summary_window > 0:
+            views, failed_views = self.relay_view_summary()
+        else:
+            views, failed_views = self.relay_events(OutboxEvent.event_type == VIEW_EVENT)
+        return read + views, failed + failed_views
+
+    def relay_events(self, condition):
+        """Publish the next batch of the events matching condition as they are"""
+        events = self.claim_batch(condition, self.batch_size)
+        if not events:
+            return 0, 0
+
+        errors = self.event_producer.publish(
+            [(event.topic, event.key, event.event_data()) for event in events]
+        )
+        delivered, failed = delivered_ids(events, [error is None for error in errors])
+        self.settle_batch(events, errors, delivered, failed)
+        return len(events), len(failed)
+
+    def relay_view_summary(self):
+        """Publish the views as per-post summaries once the oldest is summary_window seconds old.
+
+        At most summary_max_entries views go in a summary, the next ones
+        follow in the next round. Their raw events are sent first to
+        raw_views_topic, if there is one; the views whose raw event was
+        acknowledged are counted into one post_view_summary event per post
+        sent to summary_topic, and leave the outbox once their summary is
+        acknowledged. A view whose summary failed is counted in a later one
+        (its raw event is sent again); one is only counted twice when it
+        couldn't be deleted after its summary was acknowledged.
+        """
+        oldest = OutboxEvent.__table__.alias('oldest')
+        due = exists(select(oldest.c.id).where(
+            oldest.c.event_type == VIEW_EVENT,
+            oldest.c.created_at <= func.timezone('UTC', func.now()) - timedelta(seconds=self.summary_window)
+        ))
+        events = self.claim_batch(and_(OutboxEvent.event_type == VIEW_EVENT, due), self.summary_max_entries)
+        if not events:
+            return 0, 0
+
+        errors = [None] * len(events)
+        if self.raw_views_topic:
+            errors = self.event_producer.publish(
+                [(self.raw_views_topic, event.key, event.event_data()) for event in events]
+            )
+        sent, _ = delivered_ids(events, [error is None for error in errors])
+        sent = set(sent)
+
+        aggregator = ViewAggregator()
+        for event in events:
+            if event.id in sent:
+                aggregator.add_view(event.payload['post_id'], event.payload['user_id'], event.created_at)
+        summaries = aggregator.summaries()
+        summary_errors = {}
+        if summaries:
+            summary_errors = dict(zip(
+                [summary['post_id'] for summary in summaries],
+                self.event_producer.publish(
+                    [(self.summary_topic, str(summary['post_id']), summary) for summary in summaries]
+                )
+            ))
+        metrics.VIEW_SUMMARIES.inc(sum(1 for error in summary_errors.values() if error is None))
+
+        errors = [summary_errors[event.payload['post_id']] if event.id in sent else error
+                  for event, error in zip(events, errors)]
+        delivered = [event.id for event, error in zip(events, errors) if event.id in sent and error is None]
+        failed = [event.id for event, error in zip(events, errors) if error is not None]
+        self.settle_batch(events, errors, delivered, failed)
+        return len(events), len(failed)
+
+    def claim_batch(self, condition, limit):
+        """Read and claim the next events matching condition in a transaction of its own.
+
+        Returns the events detached from the session, none while another
+        relay holds the lock or its claim.
+        """
+        session = self.db_session()
+        try:
+            if not session.execute(select(func.pg_try_advisory_xact_lock(OUTBOX_LOCK_ID))).scalar():
+                return []
+            now = func.timezone('UTC', func.now())
+            if session.execute(select(exists().where(OutboxEvent.claimed_until > now))).scalar():
+                return []
+
+            events = session.execute(
+                select(OutboxEvent)
+                .where(condition, OutboxEvent.txid < func.txid_snapshot_xmin(func.txid_current_snapshot()))
+                .order_by(OutboxEvent.txid, OutboxEvent.id)
+                .limit(limit)
+            ).scalars().all()
+            if not events:
+                return []
+
+            session.execute(
+                update(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in events]))
+                .values(claimed_until=now + timedelta(seconds=self.claim_timeout))
+            )
+            # Keep the loaded events, the commit would expire them
+            session.expunge_all()
+            session.commit()
+            return events
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def settle_batch(self, events, errors, delivered, failed):
+        """Delete the delivered events, count the rejected ones and release the claim of the rest"""
+        rejected = {
+            event.id: str(error) for event, error in zip(events, errors)
+            if error is not None and not retriable_error(error)
+        }
+        session = self.db_session()
+        try:
+            if delivered:
+                session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(delivered)))
+            if rejected:
+                session.execute(
+                    update(OutboxEvent).where(OutboxEvent.id.in_(list(rejected)))
+                    .values(attempts=OutboxEvent.attempts + 1)
+                )
+                self.move_to_dead_letters(session, rejected)
+            session.execute(
+                update(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in events]))
+                .values(claimed_until=None)
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        metrics.OUTBOX_RELAYED.inc(len(delivered))
+        metrics.OUTBOX_FAILED.inc(len(failed))
+        if len(rejected) < len(failed):
+            logging.warning(f"Kafka unreachable, {len(failed) - len(rejected)} outbox events kept for retry")
+
+    def move_to_dead_letters(self, session, rejected):
+        """Move the rejected events that ran out of attempts to outbox_dead_letters, with their last error"""
+        exhausted = session.execute(
+            delete(OutboxEvent)
+            .where(OutboxEvent.id.in_(list(rejected)), OutboxEvent.attempts >= self.max_attempts)
+            .returning(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.key, OutboxEvent.event_type,
+                       OutboxEvent.payload, OutboxEvent.created_at, OutboxEvent.attempts)
+        ).all()
+        if not exhausted:
+            return
+
+        session.execute(insert(OutboxDeadLetter), [
+            {**row._asdict(), 'error': rejected[row.id]} for row in exhausted
+        ])
+        for row in exhausted:
+            logging.error(f"Outbox event {row.id} to {row.topic} moved to outbox_dead_letters after "
+                          f"{row.attempts} rejected deliveries: {rejected[row.id]}")
+        metrics.OUTBOX_DISCARDED.inc(len(exhausted))
+
+    def stop(self):
+        self._stopped.set()
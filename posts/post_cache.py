@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+class PostCache:
+    """Thread-safe LRU cache with TTL for post snapshots (PostRow).
+
+    Every snapshot is stored with a version stamp, the post's updated_at.
+    invalidate() drops the snapshot and leaves a tombstone with the version that
+    replaced it, so a reader that loaded an older version concurrently with the
+    update can't put it back. Deleted posts are invalidated without a version,
+    which rejects every snapshot until the tombstone expires.
+
+    Counters in a snapshot may lag behind by up to ttl seconds.
+    """
+
+    def __init__(self, max_size, ttl, stats_interval=0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats_interval = stats_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._tombstones = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, post_id):
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(post_id)
+            if entry is not None and entry[2] < time.monotonic():
+                del self._entries[post_id]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(post_id)
+            self._log_stats()
+
+            return entry[0] if entry is not None else None
+
+    def put(self, post_id, snapshot, version):
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            tombstone = self._tombstones.get(post_id)
+            if tombstone is not None:
+                tombstone_version, expires_at = tombstone
+                if expires_at < now:
+                    del self._tombstones[post_id]
+                elif tombstone_version is None or version < tombstone_version:
+                    return
+
+            self._entries[post_id] = (snapshot, version, now + self.ttl)
+            self._entries.move_to_end(post_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, post_id, version=None):
+        """Drop a post's snapshot; version is the new updated_at, None if the post was deleted"""
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(post_id)
+            if entry is not None and (version is None or entry[1] < version):
+                del self._entries[post_id]
+
+            # Keep the strongest tombstone: a deletion, otherwise the newest version
+            tombstone = self._tombstones.get(post_id)
+            if tombstone is None or tombstone[1] < now or \
+                    (tombstone[0] is not None and (version is None or tombstone[0] < version)):
+                self._tombstones[post_id] = (version, now + self.ttl)
+
+            if len(self._tombstones) > self.max_size:
+                self._tombstones = {
+                    key: value for key, value in self._tombstones.items() if value[1] >= now
+                }
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _log_stats(self):
+        lookups = self.hits + self.misses
+        if self.stats_interval > 0 and lookups % self.stats_interval == 0:
+            logging.info(f"Post cache hit rate {self.hit_rate():.2%} over {lookups} lookups, "
+                         f"{len(self._entries)} entries")
@@ -44,6 +44,11 @@ class PostServiceStub(object):
                 request_serializer=posts__pb2.GetPostRequest.SerializeToString,
                 response_deserializer=posts__pb2.PostResponse.FromString,
                 _registered_method=True)
+        self.BatchGetPosts = channel.unary_unary(
+                '/posts.PostService/BatchGetPosts',
+                request_serializer=posts__pb2.BatchGetPostsRequest.SerializeToString,
+                response_deserializer=posts__pb2.BatchGetPostsResponse.FromString,
+                _registered_method=True)
         self.UpdatePost = channel.unary_unary(
                 '/posts.PostService/UpdatePost',
                 request_serializer=posts__pb2.UpdatePostRequest.SerializeToString,
@@ -59,11 +64,21 @@ class PostServiceStub(object):
                 request_serializer=posts__pb2.ListPostsRequest.SerializeToString,
                 response_deserializer=posts__pb2.ListPostsResponse.FromString,
                 _registered_method=True)
+        self.StreamPosts = channel.unary_stream(
+                '/posts.PostService/StreamPosts',
+                request_serializer=posts__pb2.StreamPostsRequest.SerializeToString,
+                response_deserializer=posts__pb2.StreamPostsResponse.FromString,
+                _registered_method=True)
         self.ViewPost = channel.unary_unary(
                 '/posts.PostService/ViewPost',
                 request_serializer=posts__pb2.ViewPostRequest.SerializeToString,
                 response_deserializer=posts__pb2.ViewPostResponse.FromString,
                 _registered_method=True)
+        self.RecordViews = channel.stream_unary(
+                '/posts.PostService/RecordViews',
+                request_serializer=posts__pb2.ViewPostRequest.SerializeToString,
+                response_deserializer=posts__pb2.RecordViewsResponse.FromString,
+                _registered_method=True)
         self.LikePost = channel.unary_unary(
                 '/posts.PostService/LikePost',
                 request_serializer=posts__pb2.LikePostRequest.SerializeToString,
@@ -96,6 +111,12 @@ class PostServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchGetPosts(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def UpdatePost(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -114,12 +135,25 @@ class PostServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def StreamPosts(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def ViewPost(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def RecordViews(self, request_iterator, context):
+        """Bulk view ingestion: views are recorded in batches as they arrive
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def LikePost(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -151,6 +185,11 @@ def add_PostServiceServicer_to_server(servicer, server):
                     request_deserializer=posts__pb2.GetPostRequest.FromString,
                     response_serializer=posts__pb2.PostResponse.SerializeToString,
             ),
+            'BatchGetPosts': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetPosts,
+                    request_deserializer=posts__pb2.BatchGetPostsRequest.FromString,
+                    response_serializer=posts__pb2.BatchGetPostsResponse.SerializeToString,
+            ),
             'UpdatePost': grpc.unary_unary_rpc_method_handler(
                     servicer.UpdatePost,
                     request_deserializer=posts__pb2.UpdatePostRequest.FromString,
@@ -166,11 +205,21 @@ def add_PostServiceServicer_to_server(servicer, server):
                     request_deserializer=posts__pb2.ListPostsRequest.FromString,
                     response_serializer=posts__pb2.ListPostsResponse.SerializeToString,
             ),
+            'StreamPosts': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamPosts,
+                    request_deserializer=posts__pb2.StreamPostsRequest.FromString,
+                    response_serializer=posts__pb2.StreamPostsResponse.SerializeToString,
+            ),
             'ViewPost': grpc.unary_unary_rpc_method_handler(
                     servicer.ViewPost,
                     request_deserializer=posts__pb2.ViewPostRequest.FromString,
                     response_serializer=posts__pb2.ViewPostResponse.SerializeToString,
             ),
+            'RecordViews': grpc.stream_unary_rpc_method_handler(
+                    servicer.RecordViews,
+                    request_deserializer=posts__pb2.ViewPostRequest.FromString,
+                    response_serializer=posts__pb2.RecordViewsResponse.SerializeToString,
+            ),
             'LikePost': grpc.unary_unary_rpc_method_handler(
                     servicer.LikePost,
                     request_deserializer=posts__pb2.LikePostRequest.FromString,
@@ -251,6 +300,33 @@ class PostService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def BatchGetPosts(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/posts.PostService/BatchGetPosts',
+            posts__pb2.BatchGetPostsRequest.SerializeToString,
+            posts__pb2.BatchGetPostsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def UpdatePost(request,
             target,
@@ -332,6 +408,33 @@ class PostService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def StreamPosts(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/posts.PostService/StreamPosts',
+            posts__pb2.StreamPostsRequest.SerializeToString,
+            posts__pb2.StreamPostsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def ViewPost(request,
             target,
@@ -359,6 +462,33 @@ class PostService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def RecordViews(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/posts.PostService/RecordViews',
+            posts__pb2.ViewPostRequest.SerializeToString,
+            posts__pb2.RecordViewsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def LikePost(request,
             target,
@@ -1,29 +1,257 @@
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 from sqlalchemy.orm import Session
-from models import Post, PostView, PostLike, Comment
+from models import Post, Comment, PostCounters, PostRow, CommentRow
 from kafka_producer import EventProducer
+from outbox import comment_event
+from pagination import encode_cursor, decode_cursor
+from count_cache import CountCache, count_key
+from post_cache import PostCache
+from queries import (
+    POST_FIELDS, post_rows, filter_visible, filter_tags, stream_posts_statement, post_row_statement, paginate,
+    explain_statement, increment_counters_statement, comments_count_statement,
+    view_post_statement, record_views_statement, toggle_like_statement
+)
 from config import Config
 import logging
 
+def merge_tags(tag, tags):
+    """Combine the legacy single tag filter with a list of tags, without duplicates"""
+    merged = list(tags or [])
+    if tag:
+        merged.append(tag)
+    return list(dict.fromkeys(merged))
+
+
+def check_fields(fields):
+    """Error for a field mask naming fields a Post doesn't have, None when it is valid"""
+    unknown = set(fields or ()) - POST_FIELDS
+    if unknown:
+        return f"Invalid field mask: unknown fields {', '.join(sorted(unknown))}"
+    return None
+
+
+def view_results(views, rows):
+    """Per-view (success, message) pairs in the order of views, and the newly recorded views"""
+    outcomes = {}
+    recorded = []
+    for row in rows:
+        view = (row.post_id, row.user_id)
+        if not row.found:
+            outcomes[view] = (False, "Post not found")
+        elif not row.allowed:
+            outcomes[view] = (False, "Access denied: this post is private")
+        else:
+            outcomes[view] = (True, "Post viewed successfully")
+        if row.inserted:
+            recorded.append(view)
+    return [outcomes[view] for view in views], recorded
+
+
+def with_excerpt(post, fields, excerpt_length):
+    """Copy of a full PostRow with the excerpt requested by the field mask"""
+    if fields is None or 'excerpt' not in fields or post.excerpt is not None:
+        return post
+    return post.copy(excerpt=post.description[:excerpt_length])
+
+
+def new_post(title, description, user_id, is_private, tags):
+    """Post with zeroed counters, ready to be added to a session"""
+    return Post(
+        title=title,
+        description=description,
+        user_id=user_id,
+        is_private=is_private,
+        tags=tags or [],
+        counters=PostCounters(likes_count=0, views_count=0, comments_count=0)
+    )
+
+
+def access_error(post, user_id):
+    """Error when the user may not see the post, None when they may"""
+    if post.is_private and post.user_id != user_id:
+        return "Access denied: this post is private"
+    return None
+
+
+def owner_error(post, user_id):
+    """Error when the user may not change the post, None when they may"""
+    if post.user_id != user_id:
+        return "Access denied: you are not the owner of this post"
+    return None
+
+
+def interaction_error(result):
+    """Error of a view or like statement result, None when it went through"""
+    if not result.found:
+        return "Post not found"
+    if not result.allowed:
+        return "Access denied: this post is private"
+    return None
+
+
+def like_message(result):
+    if result.deleted:
+        return "Post unliked successfully"
+    return "Post liked successfully"
+
+
+def batch_results(post_ids, rows, user_id):
+    """(post, error) pairs in the order of post_ids from the PostRow rows read for them"""
+    posts = {}
+    for row in rows:
+        post = PostRow(*row)
+        posts[post.id] = post
+
+    results = []
+    for post_id in post_ids:
+        post = posts.get(post_id)
+        if not post:
+            results.append((None, "Post not found"))
+        elif access_error(post, user_id):
+            results.append((None, access_error(post, user_id)))
+        else:
+            results.append((post, None))
+    return results
+
+
+def update_fields(post, title, description, is_private, tags):
+    """Apply the given changes to a post.
+
+    Returns the (author_id, tags, is_public) arguments of the count cache
+    invalidation when the post moved between listings, None otherwise.
+    """
+    old_tags = set(post.tags or [])
+    was_private = post.is_private
+
+    if title is not None:
+        post.title = title
+    if description is not None:
+        post.description = description
+    if is_private is not None:
+        post.is_private = is_private
+    if tags is not None:
+        post.tags = tags
+    post.updated_at = datetime.utcnow()
+
+    new_tags = set(post.tags or [])
+    if post.is_private == was_private and new_tags == old_tags:
+        return None
+    return post.user_id, old_tags | new_tags, not was_private or not post.is_private
+
+
+def stream_filters(cursor, created_from, created_to):
+    """Decoded cursor and dates of a stream_posts request; raises ValueError"""
+    position = decode_cursor(cursor) if cursor else None
+    created_from = datetime.fromisoformat(created_from) if created_from else None
+    created_to = datetime.fromisoformat(created_to) if created_to else None
+    return position, created_from, created_to
+
+
+def to_post_row(row, fields):
+    return PostRow(*row) if fields is None else PostRow.from_row(row)
+
+
+def count_mode_for(count_mode, tags):
+    """'estimated' only applies to tag-less listings, others fall back to 'cached'"""
+    if count_mode == 'estimated' and tags:
+        return 'cached'
+    return count_mode
+
+
+def page_count(total_count, per_page):
+    if total_count is None:
+        return None
+    return (total_count + per_page - 1) // per_page if per_page > 0 else 0
+
+
+def next_page(items, per_page):
+    """The items of a page read with one extra row, whether more follow and the cursor to them"""
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+    return items, has_more, next_cursor
+
+
+def posts_page(rows, fields, page, per_page, total_count, count_mode):
+    """list_posts result from the rows of a page"""
+    posts, has_more, next_cursor = next_page([to_post_row(row, fields) for row in rows], per_page)
+    return {
+        'posts': posts,
+        'total_count': total_count,
+        'page': page,
+        'total_pages': page_count(total_count, per_page),
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'count_mode': count_mode
+    }
+
+
+def comments_page(comments, page, per_page, total_count):
+    """list_comments result from the comments of a page"""
+    comments, has_more, next_cursor = next_page(comments, per_page)
+    return {
+        'comments': [CommentRow.from_comment(comment) for comment in comments],
+        'total_count': total_count,
+        'page': page,
+        'total_pages': page_count(total_count, per_page),
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
+
+
 class PostsService:
     def __init__(self, db_session):
         self.db_session = db_session
         self.event_producer = EventProducer(Config.KAFKA_BOOTSTRAP_SERVERS)
+        self.count_cache = CountCache(Config.COUNT_CACHE_TTL, Config.COUNT_CACHE_SIZE)
+        self.post_cache = PostCache(
+            Config.POST_CACHE_SIZE,
+            Config.POST_CACHE_TTL,
+            Config.POST_CACHE_STATS_INTERVAL
+        )
+
+    def _invalidate_post(self, post_id, version=None):
+        """Drop a post from this replica's cache and tell the other replicas to do the same"""
+        if not self.post_cache.enabled:
+            return
+
+        self.post_cache.invalidate(post_id, version)
+        if Config.POST_CACHE_INVALIDATION_TOPIC:
+            self.event_producer.send_cache_invalidation_event(
+                Config.POST_CACHE_INVALIDATION_TOPIC,
+                post_id=post_id,
+                version=version
+            )
+
+    def _invalidate_counts(self, author_id, tags, is_public):
+        """Drop the listing totals a post is counted in here and on the other replicas"""
+        if not self.count_cache.enabled:
+            return
+
+        self.count_cache.invalidate(author_id, tags, is_public)
+        if Config.POST_CACHE_INVALIDATION_TOPIC:
+            self.event_producer.send_count_invalidation_event(
+                Config.POST_CACHE_INVALIDATION_TOPIC,
+                author_id=author_id,
+                tags=tags,
+                is_public=is_public
+            )
+
+    def _increment_counters(self, session, post_id, likes=0, views=0, comments=0):
+        """Atomically adjust the denormalized counters of a post in the current transaction"""
+        session.execute(increment_counters_statement(post_id, likes, views, comments))
 
     def create_post(self, title, description, user_id, is_private=False, tags=None):
         session = self.db_session()
         try:
-            post = Post(
-                title=title,
-                description=description,
-                user_id=user_id,
-                is_private=is_private,
-                tags=tags or []
-            )
+            post = new_post(title, description, user_id, is_private, tags)
             session.add(post)
             session.commit()
-            return post.to_dict(), None
+            self._invalidate_counts(user_id, tags, not is_private)
+            return PostRow.from_post(post), None
         except Exception as e:
             session.rollback()
             logging.error(f"Error creating post: {str(e)}")
@@ -31,20 +259,65 @@ class PostsService:
         finally:
             session.close()
 
-    def get_post(self, post_id, user_id):
-        session = self.db_session()
-        try:
-            post = session.query(Post).filter(Post.id == post_id).first()
+    def get_post(self, post_id, user_id, fields=None, excerpt_length=None):
+        """Fetch a post, from the cache when possible.
 
-            if not post:
-                return None, "Post not found"
+        fields is an optional set of PostRow fields to return. Cached posts are
+        complete; on a miss, a field set without the description reads only the
+        requested columns and the partial row is not cached.
+        """
+        error = check_fields(fields)
+        if error:
+            return None, error
+        excerpt_length = excerpt_length or Config.EXCERPT_LENGTH
 
-            if post.is_private and post.user_id != user_id:
-                return None, "Access denied: this post is private"
+        snapshot = self.post_cache.get(post_id)
+        if snapshot is None:
+            session = self.db_session()
+            try:
+                if fields is not None and 'description' not in fields:
+                    row = session.execute(post_row_statement(post_id, fields, excerpt_length)).first()
+                    if not row:
+                        return None, "Post not found"
+                    snapshot = PostRow.from_row(row)
+                else:
+                    post = session.query(Post).filter(Post.id == post_id).first()
 
-            return post.to_dict(), None
+                    if not post:
+                        return None, "Post not found"
+
+                    snapshot = PostRow.from_post(post)
+                    self.post_cache.put(post_id, snapshot, post.updated_at)
+            except Exception as e:
+                logging.error(f"Error getting post: {str(e)}")
+                return None, str(e)
+            finally:
+                session.close()
+
+        error = access_error(snapshot, user_id)
+        if error:
+            return None, error
+
+        return with_excerpt(snapshot, fields, excerpt_length), None
+
+    def batch_get_posts(self, post_ids, user_id):
+        """Fetch several posts with one query, applying the privacy rule per post.
+
+        Returns a list of (post_data, error) pairs in the order of post_ids.
+        """
+        if len(post_ids) > Config.BATCH_GET_MAX_IDS:
+            return None, f"Too many post ids: at most {Config.BATCH_GET_MAX_IDS} per request"
+
+        session = self.db_session()
+        try:
+            unique_ids = list(dict.fromkeys(post_ids))
+            rows = []
+            if unique_ids:
+                # Counters are joined in, so this is the only round trip
+                rows = post_rows(session.query(Post)).filter(Post.id.in_(unique_ids)).all()
+            return batch_results(post_ids, rows, user_id), None
         except Exception as e:
-            logging.error(f"Error getting post: {str(e)}")
+            logging.error(f"Error batch getting posts: {str(e)}")
             return None, str(e)
         finally:
             session.close()
@@ -57,22 +330,18 @@ class PostsService:
             if not post:
                 return None, "Post not found"
 
-            if post.user_id != user_id:
-                return None, "Access denied: you are not the owner of this post"
-
-            if title is not None:
-                post.title = title
-            if description is not None:
-                post.description = description
-            if is_private is not None:
-                post.is_private = is_private
-            if tags is not None:
-                post.tags = tags
+            error = owner_error(post, user_id)
+            if error:
+                return None, error
 
-            post.updated_at = datetime.utcnow()
+            moved = update_fields(post, title, description, is_private, tags)
             session.commit()
 
-            return post.to_dict(), None
+            self._invalidate_post(post_id, post.updated_at)
+            if moved:
+                self._invalidate_counts(*moved)
+
+            return PostRow.from_post(post), None
         except Exception as e:
             session.rollback()
             logging.error(f"Error updating post: {str(e)}")
@@ -88,12 +357,19 @@ class PostsService:
             if not post:
                 return False, "Post not found"
 
-            if post.user_id != user_id:
-                return False, "Access denied: you are not the owner of this post"
+            error = owner_error(post, user_id)
+            if error:
+                return False, error
+
+            tags = list(post.tags or [])
+            is_public = not post.is_private
 
             session.delete(post)
             session.commit()
 
+            self._invalidate_counts(user_id, tags, is_public)
+            self._invalidate_post(post_id)
+
             return True, "Post deleted successfully"
         except Exception as e:
             session.rollback()
@@ -102,72 +378,128 @@ class PostsService:
         finally:
             session.close()
 
-    def list_posts(self, page=1, per_page=10, user_id=None, tag=None):
+    def _count_posts(self, session, query, count_mode, user_id, tags, match_all):
+        """Compute the listing total according to count_mode.
+
+        Returns (total_count, effective_mode); total_count is None for 'none'.
+        'estimated' reads the planner row estimate and only applies to tag-less
+        listings, other listings fall back to 'cached'.
+        """
+        count_mode = count_mode_for(count_mode, tags)
+        if count_mode == 'none':
+            return None, 'none'
+
+        if count_mode == 'estimated':
+            return self._estimate_count(session, query), 'estimated'
+
+        if count_mode == 'cached':
+            key = count_key(user_id, tags, match_all)
+            total_count = self.count_cache.get(key)
+            if total_count is None:
+                generation = self.count_cache.generation()
+                total_count = query.count()
+                self.count_cache.set(key, total_count, generation)
+            return total_count, 'cached'
+
+        return query.count(), 'exact'
+
+    def _estimate_count(self, session, query):
+        statement = explain_statement(query.with_entities(Post.id).statement, session.get_bind().dialect)
+        plan = session.execute(statement).scalar()
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def list_posts(self, page=1, per_page=10, user_id=None, tag=None, cursor=None, count_mode='exact',
+                   tags=None, match_all=False, fields=None, excerpt_length=None):
+        """List visible posts, newest first.
+
+        Without a cursor the page/offset mode is used. With a cursor (as returned
+        in next_cursor) the listing continues right after that post using a keyset
+        condition on (created_at, id), so deep pages cost the same as the first one.
+        count_mode is one of 'exact', 'cached', 'estimated' or 'none'. tag and tags
+        are combined; posts match any of them, or all of them with match_all.
+        fields limits the columns read to a set of PostRow fields.
+        """
+        error = check_fields(fields)
+        if error:
+            return None, error
+        tags = merge_tags(tag, tags)
+
+        position = None
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+            except ValueError as e:
+                return None, str(e)
+
         session = self.db_session()
         try:
             query = session.query(Post)
 
-            if tag:
-                query = query.filter(Post.tags.contains([tag]))
-
-            if user_id:
-                query = query.filter(
-                    (Post.user_id == user_id) |
-                    ((Post.is_private == False) & (Post.user_id != user_id))
-                )
-            else:
-                query = query.filter(Post.is_private == False)
-
-            total_count = query.count()
-            total_pages = (total_count + per_page - 1) // per_page
-
-            posts = query.order_by(Post.created_at.desc()) \
-                .offset((page - 1) * per_page) \
-                .limit(per_page) \
-                .all()
-
-            return {
-                       'posts': [post.to_dict() for post in posts],
-                       'total_count': total_count,
-                       'page': page,
-                       'total_pages': total_pages
-                   }, None
+            query = filter_tags(query, tags, match_all)
+            query = filter_visible(query, user_id)
+
+            total_count, count_mode = self._count_posts(session, query, count_mode, user_id, tags, match_all)
+
+            query = post_rows(query, fields, excerpt_length or Config.EXCERPT_LENGTH)
+            rows = paginate(query, position, page, per_page, Post.created_at, Post.id).all()
+            return posts_page(rows, fields, page, per_page, total_count, count_mode), None
         except Exception as e:
             logging.error(f"Error listing posts: {str(e)}")
             return None, str(e)
         finally:
             session.close()
             
+    def stream_posts(self, user_id=None, tag=None, author_id=None, created_from=None, created_to=None,
+                     cursor=None, batch_size=None, tags=None, match_all=False, fields=None, excerpt_length=None):
+        """Stream every visible post matching the filters in (created_at, id) order.
+
+        Returns (iterator, error). The iterator yields (PostRow, cursor) pairs and
+        fetches rows from a server-side cursor in chunks of batch_size, so memory
+        use does not depend on the number of posts. Passing the last received
+        cursor resumes the export right after that post. fields limits the
+        columns read to a set of PostRow fields, as in list_posts.
+        """
+        error = check_fields(fields)
+        if error:
+            return None, error
+        try:
+            position, created_from, created_to = stream_filters(cursor, created_from, created_to)
+        except ValueError as e:
+            return None, str(e)
+
+        return self._iter_posts(
+            user_id, merge_tags(tag, tags), match_all, author_id, created_from, created_to, position,
+            batch_size or Config.STREAM_BATCH_SIZE, fields, excerpt_length or Config.EXCERPT_LENGTH
+        ), None
+
+    def _iter_posts(self, user_id, tags, match_all, author_id, created_from, created_to, position, batch_size,
+                    fields, excerpt_length):
+        session = self.db_session()
+        try:
+            query = stream_posts_statement(
+                user_id, tags, match_all, author_id, created_from, created_to, position, fields, excerpt_length
+            ).execution_options(yield_per=batch_size)
+
+            for row in session.execute(query):
+                post = to_post_row(row, fields)
+                yield post, encode_cursor(post.created_at, post.id)
+        except Exception as e:
+            logging.error(f"Error streaming posts: {str(e)}")
+            raise
+        finally:
+            session.close()
+
     def view_post(self, post_id, user_id):
         session = self.db_session()
         try:
-            post = session.query(Post).filter(Post.id == post_id).first()
-            
-            if not post:
-                return False, "Post not found"
-                
-            if post.is_private and post.user_id != user_id:
-                return False, "Access denied: this post is private"
-                
-            existing_view = session.query(PostView).filter(
-                PostView.post_id == post_id,
-                PostView.user_id == user_id
-            ).first()
-            
-            if not existing_view:
-                view = PostView(
-                    post_id=post_id,
-                    user_id=user_id
-                )
-                session.add(view)
-                session.commit()
-                
-                # Send event to Kafka
-                self.event_producer.send_view_event(
-                    user_id=user_id,
-                    post_id=post_id
-                )
-                
+            result = session.execute(view_post_statement(post_id, user_id)).one()
+
+            error = interaction_error(result)
+            if error:
+                return False, error
+
+            session.commit()
+
             return True, "Post viewed successfully"
         except Exception as e:
             session.rollback()
@@ -176,40 +508,43 @@ class PostsService:
         finally:
             session.close()
     
+    def record_views(self, views):
+        """Record a batch of (post_id, user_id) views with one statement.
+
+        Returns the (success, message) pairs of the views in their order under
+        'results', repeated views getting the same result, and the number of
+        views recorded for the first time under 'recorded'.
+        """
+        unique_views = list(dict.fromkeys(views))
+        if not unique_views:
+            return {'results': [], 'recorded': 0}, None
+
+        session = self.db_session()
+        try:
+            rows = session.execute(record_views_statement(unique_views)).all()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logging.error(f"Error recording views: {str(e)}")
+            return None, str(e)
+        finally:
+            session.close()
+
+        results, recorded = view_results(views, rows)
+        return {'results': results, 'recorded': len(recorded)}, None
+
     def like_post(self, post_id, user_id):
         session = self.db_session()
         try:
-            post = session.query(Post).filter(Post.id == post_id).first()
-            
-            if not post:
-                return False, "Post not found"
-                
-            if post.is_private and post.user_id != user_id:
-                return False, "Access denied: this post is private"
-                
-            existing_like = session.query(PostLike).filter(
-                PostLike.post_id == post_id,
-                PostLike.user_id == user_id
-            ).first()
-            
-            if existing_like:
-                session.delete(existing_like)
-                message = "Post unliked successfully"
-            else:
-                like = PostLike(
-                    post_id=post_id,
-                    user_id=user_id
-                )
-                session.add(like)
-                message = "Post liked successfully"
-                
-                self.event_producer.send_like_event(
-                    user_id=user_id,
-                    post_id=post_id
-                )
-            
+            result = session.execute(toggle_like_statement(post_id, user_id)).one()
+
+            error = interaction_error(result)
+            if error:
+                return False, error
+
             session.commit()
-            return True, message
+
+            return True, like_message(result)
         except Exception as e:
             session.rollback()
             logging.error(f"Error liking post: {str(e)}")
@@ -224,9 +559,10 @@ class PostsService:
             
             if not post:
                 return None, "Post not found"
-                
-            if post.is_private and post.user_id != user_id:
-                return None, "Access denied: this post is private"
+
+            error = access_error(post, user_id)
+            if error:
+                return None, error
                 
             comment = Comment(
                 post_id=post_id,
@@ -235,15 +571,12 @@ class PostsService:
             )
             
             session.add(comment)
+            session.flush()
+            session.add(comment_event(comment))
+            self._increment_counters(session, post_id, comments=1)
             session.commit()
             
-            self.event_producer.send_comment_event(
-                user_id=user_id,
-                post_id=post_id,
-                comment_id=comment.id
-            )
-            
-            return comment.to_dict(), None
+            return CommentRow.from_comment(comment), None
         except Exception as e:
             session.rollback()
             logging.error(f"Error creating comment: {str(e)}")
@@ -251,29 +584,35 @@ class PostsService:
         finally:
             session.close()
     
-    def list_comments(self, post_id, page=1, per_page=10):
+    def list_comments(self, post_id, page=1, per_page=10, cursor=None, with_count=True):
+        """List comments of a post, newest first, in page/offset or cursor mode.
+
+        The total comes from post_counters instead of a count() over comments. When
+        no total is requested and the page is not empty, post existence is implied
+        and the listing is served by a single query.
+        """
+        position = None
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+            except ValueError as e:
+                return None, str(e)
+
         session = self.db_session()
         try:
-            post = session.query(Post).filter(Post.id == post_id).first()
-            if not post:
-                return None, "Post not found"
-                
             query = session.query(Comment).filter(Comment.post_id == post_id)
-            
-            total_count = query.count()
-            total_pages = (total_count + per_page - 1) // per_page if per_page > 0 else 0
-            
-            comments = query.order_by(Comment.created_at.desc()) \
-                .offset((page - 1) * per_page) \
-                .limit(per_page) \
-                .all()
-                
-            return {
-                'comments': [comment.to_dict() for comment in comments],
-                'total_count': total_count,
-                'page': page,
-                'total_pages': total_pages
-            }, None
+            comments = paginate(query, position, page, per_page, Comment.created_at, Comment.id).all()
+
+            total_count = None
+            if with_count or not comments:
+                post_row = session.execute(comments_count_statement(post_id)).first()
+                if not post_row:
+                    return None, "Post not found"
+
+                if with_count:
+                    total_count = post_row.comments_count or 0
+
+            return comments_page(comments, page, per_page, total_count), None
         except Exception as e:
             logging.error(f"Error listing comments: {str(e)}")
             return None, str(e)
@@ -0,0 +1,313 @@
+from sqlalchemy import (
+    select, delete, exists, func, literal, tuple_, and_, bindparam, cast, column, text, Integer, String, Select
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from models import Post, PostView, PostLike, PostCounters, OutboxEvent
+from kafka_producer import VIEWS_TOPIC, LIKES_TOPIC
+
+
+# Columns of a PostRow by field name, in constructor order
+POST_FIELD_COLUMNS = {
+    'id': Post.id,
+    'title': Post.title,
+    'description': Post.description,
+    'user_id': Post.user_id,
+    'is_private': Post.is_private,
+    'tags': Post.tags,
+    'created_at': Post.created_at,
+    'updated_at': Post.updated_at,
+    'likes_count': func.coalesce(PostCounters.likes_count, 0).label('likes_count'),
+    'views_count': func.coalesce(PostCounters.views_count, 0).label('views_count'),
+    'comments_count': func.coalesce(PostCounters.comments_count, 0).label('comments_count')
+}
+POST_ROW_COLUMNS = tuple(POST_FIELD_COLUMNS.values())
+COUNTER_FIELDS = frozenset(('likes_count', 'views_count', 'comments_count'))
+# Field names a field mask may contain
+POST_FIELDS = frozenset(POST_FIELD_COLUMNS) | {'excerpt'}
+# Read for every field mask: privacy checks and cursors need them
+REQUIRED_FIELDS = ('id', 'user_id', 'is_private', 'created_at')
+
+
+def post_rows(query, fields=None, excerpt_length=None):
+    """Turn a Post query or select() into one returning PostRow columns.
+
+    Rows come back as plain tuples, which costs a fraction of hydrating Post
+    objects with their counters for read-only listings. With a set of fields
+    only those columns are selected (rows are then built with PostRow.from_row),
+    the counters are only joined when one of them is requested, and 'excerpt'
+    is cut from the description by Postgres.
+    """
+    columns = POST_ROW_COLUMNS
+    join_counters = True
+    if fields is not None:
+        columns = [column for name, column in POST_FIELD_COLUMNS.items()
+                   if name in fields or name in REQUIRED_FIELDS]
+        if 'excerpt' in fields:
+            columns.append(func.left(Post.description, excerpt_length).label('excerpt'))
+        join_counters = not COUNTER_FIELDS.isdisjoint(fields)
+
+    if isinstance(query, Select):
+        query = query.with_only_columns(*columns)
+    else:
+        query = query.with_entities(*columns)
+    if join_counters:
+        query = query.outerjoin(PostCounters, PostCounters.post_id == Post.id)
+    return query
+
+
+def filter_visible(query, user_id):
+    """Restrict a Post query or select() to posts the viewer may see"""
+    if user_id:
+        return query.filter(
+            (Post.user_id == user_id) |
+            ((Post.is_private == False) & (Post.user_id != user_id))
+        )
+    return query.filter(Post.is_private == False)
+
+
+def filter_tags(query, tags, match_all=False):
+    """Filter on any (&&) or all (@>) of the tags; both are served by the GIN index"""
+    if not tags:
+        return query
+    if match_all:
+        return query.filter(Post.tags.contains(tags))
+    return query.filter(Post.tags.overlap(tags))
+
+
+def stream_posts_statement(user_id, tags, match_all, author_id, created_from, created_to, position,
+                           fields=None, excerpt_length=None):
+    """select() of the PostRow columns (only the ones of fields, if given) of
+    the visible posts matching the export filters, in (created_at, id) order
+    """
+    query = filter_visible(post_rows(select(Post), fields, excerpt_length), user_id)
+    query = filter_tags(query, tags, match_all)
+
+    if author_id:
+        query = query.filter(Post.user_id == author_id)
+    if created_from:
+        query = query.filter(Post.created_at >= created_from)
+    if created_to:
+        query = query.filter(Post.created_at < created_to)
+    if position:
+        query = query.filter(tuple_(Post.created_at, Post.id) > position)
+
+    return query.order_by(Post.created_at, Post.id)
+
+
+def post_row_statement(post_id, fields, excerpt_length):
+    """select() of the columns of fields of one post"""
+    return post_rows(select(Post), fields, excerpt_length).where(Post.id == post_id)
+
+
+def paginate(query, position, page, per_page, created_at, id_):
+    """Order a listing query or select() newest first and limit it to a page.
+
+    With a position (a decoded cursor) the page starts right after it on
+    (created_at, id), otherwise at the offset of page. One extra row is read
+    to tell whether another page follows.
+    """
+    query = query.order_by(created_at.desc(), id_.desc())
+    if position:
+        query = query.filter(tuple_(created_at, id_) < position)
+    else:
+        query = query.offset((page - 1) * per_page)
+    return query.limit(per_page + 1)
+
+
+def explain_statement(statement, dialect):
+    """EXPLAIN of a select(), whose 'Plan Rows' estimates the number of rows it returns"""
+    compiled = statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+    return text(f"EXPLAIN (FORMAT JSON) {compiled}")
+
+
+def increment_counters_statement(post_id, likes=0, views=0, comments=0):
+    """Upsert adjusting the denormalized counters of a post by the given deltas"""
+    return insert(PostCounters).values(
+        post_id=post_id,
+        likes_count=max(likes, 0),
+        views_count=max(views, 0),
+        comments_count=max(comments, 0)
+    ).on_conflict_do_update(
+        index_elements=[PostCounters.post_id],
+        set_={
+            'likes_count': PostCounters.likes_count + likes,
+            'views_count': PostCounters.views_count + views,
+            'comments_count': PostCounters.comments_count + comments
+        }
+    )
+
+
+def comments_count_statement(post_id):
+    """Post id and comments_count, no row if the post does not exist"""
+    return select(Post.id, PostCounters.comments_count) \
+        .outerjoin(PostCounters, PostCounters.post_id == Post.id) \
+        .where(Post.id == post_id)
+
+
+def _utc_now():
+    return func.timezone('UTC', func.now())
+
+
+def _count(cte):
+    return select(func.count()).select_from(cte).scalar_subquery()
+
+
+def _post_access(post_id, user_id):
+    """CTE with the post row, if it exists, and whether the user may interact with it"""
+    return select(
+        Post.id,
+        ((Post.is_private == False) | (Post.user_id == user_id)).label('allowed')
+    ).where(Post.id == post_id).cte('post')
+
+
+def _add_to_counters(rows, column):
+    """CTE that adds (post_id, delta) rows to one post_counters column"""
+    # The other counters start at their server default; Python-side defaults
+    # of a nested INSERT are not always filled in by the compiler
+    stmt = insert(PostCounters).from_select(['post_id', column], rows, include_defaults=False)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PostCounters.post_id],
+        set_={column: getattr(PostCounters, column) + getattr(stmt.excluded, column)}
+    )
+    return stmt.returning(PostCounters.post_id).cte(f'{column}_counted')
+
+
+def _add_to_outbox(rows, topic, event_type):
+    """CTE queueing an event per inserted (post_id, user_id) row in the outbox"""
+    return insert(OutboxEvent).from_select(
+        ['topic', 'key', 'event_type', 'payload', 'created_at'],
+        select(
+            literal(topic, String),
+            cast(rows.c.post_id, String),
+            literal(event_type, String),
+            func.jsonb_build_object('user_id', rows.c.user_id, 'post_id', rows.c.post_id),
+            _utc_now()
+        ),
+        include_defaults=False
+    ).returning(OutboxEvent.id).cte(f'{event_type}_queued')
+
+
+def view_post_statement(post_id, user_id):
+    """Single statement recording a view.
+
+    Checks that the post exists and is visible to the user, inserts the view
+    unless it is already recorded, bumps views_count and queues the view event
+    in the outbox, returning the columns found, allowed and inserted.
+    """
+    post = _post_access(post_id, user_id)
+
+    inserted = insert(PostView).from_select(
+        ['post_id', 'user_id', 'created_at'],
+        select(post.c.id, literal(user_id, Integer), _utc_now()).where(post.c.allowed)
+    ).on_conflict_do_nothing(
+        index_elements=[PostView.post_id, PostView.user_id]
+    ).returning(PostView.post_id, PostView.user_id).cte('inserted')
+
+    counted = _add_to_counters(
+        select(inserted.c.post_id, literal(1, Integer)),
+        'views_count'
+    )
+    queued = _add_to_outbox(inserted, VIEWS_TOPIC, 'post_view')
+
+    return select(
+        _count(post).label('found'),
+        func.coalesce(select(post.c.allowed).scalar_subquery(), False).label('allowed'),
+        _count(inserted).label('inserted'),
+        _count(counted).label('counted'),
+        _count(queued).label('queued')
+    )
+
+
+def record_views_statement(views):
+    """Single statement recording a batch of distinct (post_id, user_id) views.
+
+    The pairs are passed as two arrays and unnested, the visible ones are
+    inserted with one INSERT ... ON CONFLICT DO NOTHING, views_count is
+    bumped once per post and the new views are queued in the outbox.
+    Returns a row per pair with the columns post_id, user_id, found, allowed
+    and inserted.
+    """
+    views = func.unnest(
+        bindparam('post_ids', [post_id for post_id, _ in views], type_=ARRAY(Integer)),
+        bindparam('user_ids', [user_id for _, user_id in views], type_=ARRAY(Integer))
+    ).table_valued(column('post_id', Integer), column('user_id', Integer)).render_derived(name='views')
+    views = select(views.c.post_id, views.c.user_id).cte('views')
+
+    access = select(
+        views.c.post_id,
+        views.c.user_id,
+        ((Post.is_private == False) | (Post.user_id == views.c.user_id)).label('allowed')
+    ).join_from(views, Post, Post.id == views.c.post_id).cte('access')
+
+    inserted = insert(PostView).from_select(
+        ['post_id', 'user_id', 'created_at'],
+        select(access.c.post_id, access.c.user_id, _utc_now()).where(access.c.allowed)
+    ).on_conflict_do_nothing(
+        index_elements=[PostView.post_id, PostView.user_id]
+    ).returning(PostView.post_id, PostView.user_id).cte('inserted')
+
+    counted = _add_to_counters(
+        select(inserted.c.post_id, func.count()).group_by(inserted.c.post_id),
+        'views_count'
+    )
+    queued = _add_to_outbox(inserted, VIEWS_TOPIC, 'post_view')
+
+    return select(
+        views.c.post_id,
+        views.c.user_id,
+        access.c.post_id.is_not(None).label('found'),
+        func.coalesce(access.c.allowed, False).label('allowed'),
+        inserted.c.post_id.is_not(None).label('inserted'),
+        _count(counted).label('counted'),
+        _count(queued).label('queued')
+    ).select_from(
+        views.outerjoin(access, and_(access.c.post_id == views.c.post_id,
+                                     access.c.user_id == views.c.user_id))
+        .outerjoin(inserted, and_(inserted.c.post_id == views.c.post_id,
+                                  inserted.c.user_id == views.c.user_id))
+    )
+
+
+def toggle_like_statement(post_id, user_id):
+    """Single statement toggling a like.
+
+    Deletes the user's like if there is one, otherwise inserts it, queues the
+    post_unlike or post_like event in the outbox, and applies the difference
+    to likes_count. Returns the columns found, allowed, inserted and deleted.
+    A concurrent duplicate like hits the unique constraint and reports
+    neither inserted nor deleted.
+    """
+    post = _post_access(post_id, user_id)
+
+    deleted = delete(PostLike).where(
+        PostLike.post_id.in_(select(post.c.id).where(post.c.allowed)),
+        PostLike.user_id == user_id
+    ).returning(PostLike.post_id, PostLike.user_id).cte('deleted')
+
+    inserted = insert(PostLike).from_select(
+        ['post_id', 'user_id', 'created_at'],
+        select(post.c.id, literal(user_id, Integer), _utc_now()).where(
+            post.c.allowed,
+            ~exists(select(deleted.c.post_id))
+        )
+    ).on_conflict_do_nothing(
+        index_elements=[PostLike.post_id, PostLike.user_id]
+    ).returning(PostLike.post_id, PostLike.user_id).cte('inserted')
+
+    delta = _count(inserted) - _count(deleted)
+    counted = _add_to_counters(
+        select(post.c.id, delta).where(delta != 0),
+        'likes_count'
+    )
+    liked = _add_to_outbox(inserted, LIKES_TOPIC, 'post_like')
+    # Lets consumers of post_likes take the like back from their counts
+    unliked = _add_to_outbox(deleted, LIKES_TOPIC, 'post_unlike')
+
+    return select(
+        _count(post).label('found'),
+        func.coalesce(select(post.c.allowed).scalar_subquery(), False).label('allowed'),
+        _count(inserted).label('inserted'),
+        _count(deleted).label('deleted'),
+        _count(counted).label('counted'),
+        (_count(liked) + _count(unliked)).label('queued')
+    )
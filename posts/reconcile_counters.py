@@ -0,0 +1,85 @@
+from sqlalchemy import select, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from models import Post, PostLike, PostView, Comment, PostCounters, init_db
+from config import Config
+import logging
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+def _count_by_post(model):
+    return select(model.post_id, func.count().label('total')) \
+        .group_by(model.post_id) \
+        .subquery()
+
+
+def reconcile_counters(session):
+    """Recompute post_counters from the source tables and repair rows that drifted.
+
+    Returns the number of counter rows that were inserted or corrected.
+    """
+    likes = _count_by_post(PostLike)
+    views = _count_by_post(PostView)
+    comments = _count_by_post(Comment)
+
+    actual = select(
+        Post.id,
+        func.coalesce(likes.c.total, 0),
+        func.coalesce(views.c.total, 0),
+        func.coalesce(comments.c.total, 0)
+    ).select_from(Post) \
+        .outerjoin(likes, likes.c.post_id == Post.id) \
+        .outerjoin(views, views.c.post_id == Post.id) \
+        .outerjoin(comments, comments.c.post_id == Post.id)
+
+    stmt = insert(PostCounters).from_select(
+        ['post_id', 'likes_count', 'views_count', 'comments_count'],
+        actual
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PostCounters.post_id],
+        set_={
+            'likes_count': stmt.excluded.likes_count,
+            'views_count': stmt.excluded.views_count,
+            'comments_count': stmt.excluded.comments_count
+        },
+        where=or_(
+            PostCounters.likes_count != stmt.excluded.likes_count,
+            PostCounters.views_count != stmt.excluded.views_count,
+            PostCounters.comments_count != stmt.excluded.comments_count
+        )
+    )
+
+    try:
+        result = session.execute(stmt)
+        session.commit()
+        return result.rowcount
+    except Exception:
+        session.rollback()
+        raise
+
+
+def run():
+    db_session = init_db(Config.DATABASE_URL)
+
+    while True:
+        session = db_session()
+        try:
+            repaired = reconcile_counters(session)
+            logging.info(f"Post counters reconciled, {repaired} rows repaired")
+        except Exception as e:
+            logging.error(f"Error reconciling post counters: {str(e)}")
+        finally:
+            session.close()
+
+        if Config.COUNTERS_RECONCILE_INTERVAL <= 0:
+            break
+        time.sleep(Config.COUNTERS_RECONCILE_INTERVAL)
+
+
+if __name__ == '__main__':
+    run()
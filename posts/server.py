@@ -1,3 +1,4 @@
+import asyncio
 import grpc
 from concurrent import futures
 import time
@@ -5,7 +6,19 @@ import os
 import posts_pb2
 import posts_pb2_grpc
 from posts_service import PostsService
+from cache_invalidation import CacheInvalidationListener
+from outbox import OutboxRelay
+from converters import (
+    get_post_params, list_posts_params, stream_posts_params, list_comments_params,
+    post_response, batch_get_posts_response, list_posts_response, stream_posts_response,
+    comment_response, list_comments_response, record_views_response,
+    view_batches
+)
 from models import init_db
+from metrics import start_metrics_server
+from interceptors import MetricsInterceptor, DeadlineInterceptor
+from grpc_health.v1 import health, health_pb2_grpc
+from health import ReadinessProbe
 from config import Config
 import logging
 
@@ -19,7 +32,7 @@ class PostServicer(posts_pb2_grpc.PostServiceServicer):
         self.posts_service = posts_service
 
     def CreatePost(self, request, context):
-        post_data, error = self.posts_service.create_post(
+        post, error = self.posts_service.create_post(
             title=request.title,
             description=request.description,
             user_id=request.user_id,
@@ -27,46 +40,24 @@ class PostServicer(posts_pb2_grpc.PostServiceServicer):
             tags=list(request.tags)
         )
         
-        if error:
-            return posts_pb2.PostResponse(error=error)
-            
-        post = posts_pb2.Post(
-            id=post_data['id'],
-            title=post_data['title'],
-            description=post_data['description'],
-            user_id=post_data['user_id'],
-            is_private=post_data['is_private'],
-            tags=post_data['tags'],
-            created_at=post_data['created_at'],
-            updated_at=post_data['updated_at']
-        )
-        
-        return posts_pb2.PostResponse(post=post)
+        return post_response(post, error)
 
     def GetPost(self, request, context):
-        post_data, error = self.posts_service.get_post(
-            post_id=request.post_id,
-            user_id=request.user_id
-        )
+        params = get_post_params(request)
+        post, error = self.posts_service.get_post(**params)
         
-        if error:
-            return posts_pb2.PostResponse(error=error)
-            
-        post = posts_pb2.Post(
-            id=post_data['id'],
-            title=post_data['title'],
-            description=post_data['description'],
-            user_id=post_data['user_id'],
-            is_private=post_data['is_private'],
-            tags=post_data['tags'],
-            created_at=post_data['created_at'],
-            updated_at=post_data['updated_at']
+        return post_response(post, error, params['fields'])
+
+    def BatchGetPosts(self, request, context):
+        results, error = self.posts_service.batch_get_posts(
+            post_ids=list(request.post_ids),
+            user_id=request.user_id
         )
-        
-        return posts_pb2.PostResponse(post=post)
+
+        return batch_get_posts_response(results, error)
 
     def UpdatePost(self, request, context):
-        post_data, error = self.posts_service.update_post(
+        post, error = self.posts_service.update_post(
             post_id=request.post_id,
             user_id=request.user_id,
             title=request.title,
@@ -75,21 +66,7 @@ class PostServicer(posts_pb2_grpc.PostServiceServicer):
             tags=list(request.tags)
         )
         
-        if error:
-            return posts_pb2.PostResponse(error=error)
-            
-        post = posts_pb2.Post(
-            id=post_data['id'],
-            title=post_data['title'],
-            description=post_data['description'],
-            user_id=post_data['user_id'],
-            is_private=post_data['is_private'],
-            tags=post_data['tags'],
-            created_at=post_data['created_at'],
-            updated_at=post_data['updated_at']
-        )
-        
-        return posts_pb2.PostResponse(post=post)
+        return post_response(post, error)
 
     def DeletePost(self, request, context):
         success, message = self.posts_service.delete_post(
@@ -103,37 +80,22 @@ class PostServicer(posts_pb2_grpc.PostServiceServicer):
         )
 
     def ListPosts(self, request, context):
-        result, error = self.posts_service.list_posts(
-            page=request.page,
-            per_page=request.per_page,
-            user_id=request.user_id,
-            tag=request.tag if request.tag else None
-        )
+        params = list_posts_params(request)
+        result, error = self.posts_service.list_posts(**params)
         
-        if error:
-            return posts_pb2.ListPostsResponse()
-            
-        posts_proto = []
-        for post_data in result['posts']:
-            post = posts_pb2.Post(
-                id=post_data['id'],
-                title=post_data['title'],
-                description=post_data['description'],
-                user_id=post_data['user_id'],
-                is_private=post_data['is_private'],
-                tags=post_data['tags'],
-                created_at=post_data['created_at'],
-                updated_at=post_data['updated_at']
-            )
-            posts_proto.append(post)
-            
-        return posts_pb2.ListPostsResponse(
-            posts=posts_proto,
-            total_count=result['total_count'],
-            page=result['page'],
-            total_pages=result['total_pages']
-        )
+        return list_posts_response(result, error, params['fields'])
     
+    def StreamPosts(self, request, context):
+        params = stream_posts_params(request)
+        posts, error = self.posts_service.stream_posts(**params)
+
+        if error:
+            yield posts_pb2.StreamPostsResponse(error=error)
+            return
+
+        for post, cursor in posts:
+            yield stream_posts_response(post, cursor, params['fields'])
+
     # New methods that implement the gRPC service definitions
     def ViewPost(self, request, context):
         success, message = self.posts_service.view_post(
@@ -146,6 +108,18 @@ class PostServicer(posts_pb2_grpc.PostServiceServicer):
             message=message
         )
     
+    def RecordViews(self, request_iterator, context):
+        results = []
+        recorded = 0
+        for views in view_batches(request_iterator, Config.RECORD_VIEWS_BATCH_SIZE):
+            result, error = self.posts_service.record_views(views)
+            if error:
+                return record_views_response(results, recorded, error)
+            results.extend(result['results'])
+            recorded += result['recorded']
+
+        return record_views_response(results, recorded, None)
+
     def LikePost(self, request, context):
         success, message = self.posts_service.like_post(
             post_id=request.post_id,
@@ -158,65 +132,89 @@ class PostServicer(posts_pb2_grpc.PostServiceServicer):
         )
     
     def CreateComment(self, request, context):
-        comment_data, error = self.posts_service.create_comment(
+        comment, error = self.posts_service.create_comment(
             post_id=request.post_id,
             user_id=request.user_id,
             content=request.content
         )
         
-        if error:
-            return posts_pb2.CommentResponse(error=error)
-            
-        comment = posts_pb2.Comment(
-            id=comment_data['id'],
-            post_id=comment_data['post_id'],
-            user_id=comment_data['user_id'],
-            content=comment_data['content'],
-            created_at=comment_data['created_at']
-        )
-        
-        return posts_pb2.CommentResponse(comment=comment)
+        return comment_response(comment, error)
     
     def ListComments(self, request, context):
-        result, error = self.posts_service.list_comments(
-            post_id=request.post_id,
-            page=request.page,
-            per_page=request.per_page
-        )
+        result, error = self.posts_service.list_comments(**list_comments_params(request))
         
-        if error:
-            return posts_pb2.ListCommentsResponse()
-            
-        comments_proto = []
-        for comment_data in result['comments']:
-            comment = posts_pb2.Comment(
-                id=comment_data['id'],
-                post_id=comment_data['post_id'],
-                user_id=comment_data['user_id'],
-                content=comment_data['content'],
-                created_at=comment_data['created_at']
-            )
-            comments_proto.append(comment)
-            
-        return posts_pb2.ListCommentsResponse(
-            comments=comments_proto,
-            total_count=result['total_count'],
-            page=result['page'],
-            total_pages=result['total_pages']
-        )
+        return list_comments_response(result, error)
+
+
+def start_invalidation_listener(post_cache, count_cache):
+    if not (post_cache.enabled or count_cache.enabled) or not Config.POST_CACHE_INVALIDATION_TOPIC:
+        return None
+
+    listener = CacheInvalidationListener(
+        Config.KAFKA_BOOTSTRAP_SERVERS,
+        Config.POST_CACHE_INVALIDATION_TOPIC,
+        post_cache,
+        count_cache
+    )
+    listener.start()
+    return listener
+
+
+def start_outbox_relay(event_producer, db_session=None):
+    """Start the outbox relay; the aio server passes no session and the relay gets its own engine"""
+    if not Config.OUTBOX_RELAY_ENABLED:
+        return None
+
+    if db_session is None:
+        db_session = init_db(Config.DATABASE_URL, pool_size=1)
+
+    relay = OutboxRelay(
+        db_session,
+        event_producer,
+        batch_size=Config.OUTBOX_BATCH_SIZE,
+        poll_interval=Config.OUTBOX_POLL_INTERVAL,
+        retry_interval=Config.OUTBOX_RETRY_INTERVAL,
+        max_attempts=Config.OUTBOX_MAX_ATTEMPTS,
+        claim_timeout=Config.OUTBOX_CLAIM_TIMEOUT,
+        summary_window=Config.VIEW_SUMMARY_WINDOW,
+        summary_topic=Config.VIEW_SUMMARY_TOPIC,
+        raw_views_topic=Config.VIEW_SUMMARY_RAW_TOPIC,
+        summary_max_entries=Config.VIEW_SUMMARY_MAX_ENTRIES
+    )
+    relay.start()
+    return relay
+
+
+def server_options():
+    # Worker processes started by launcher.py share the port
+    return [('grpc.so_reuseport', int(Config.SERVER_WORKERS > 1))]
 
 
 def serve():
     db_session = init_db(Config.DATABASE_URL)
     posts_service = PostsService(db_session)
+
+    invalidation_listener = start_invalidation_listener(posts_service.post_cache, posts_service.count_cache)
+    outbox_relay = start_outbox_relay(posts_service.event_producer, db_session)
     
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=Config.GRPC_MAX_WORKERS),
+        interceptors=[MetricsInterceptor(), DeadlineInterceptor()],
+        options=server_options(),
+        maximum_concurrent_rpcs=Config.MAX_CONCURRENT_RPCS or None
+    )
     posts_pb2_grpc.add_PostServiceServicer_to_server(
         PostServicer(posts_service), server
     )
+    health_servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    readiness_probe = ReadinessProbe(
+        health_servicer, db_session.kw['bind'], posts_service.event_producer, Config.READINESS_INTERVAL
+    )
     
     server.add_insecure_port(f'[::]:{Config.GRPC_PORT}')
     server.start()
+    readiness_probe.start()
     
     logging.info(f"Posts gRPC server started on port {Config.GRPC_PORT}")
     
@@ -224,9 +222,26 @@ def serve():
         while True:
             time.sleep(86400)
     except KeyboardInterrupt:
+        readiness_probe.stop()
         server.stop(0)
+        if invalidation_listener:
+            invalidation_listener.stop()
+        if outbox_relay:
+            outbox_relay.stop()
+            outbox_relay.join()
+        posts_service.event_producer.close()
         logging.info("Posts gRPC server stopped")
 
 
+def run():
+    """Run the server selected by SERVER_MODE in this process"""
+    start_metrics_server()
+    if Config.SERVER_MODE == 'aio':
+        from aio_server import serve as serve_aio
+        asyncio.run(serve_aio())
+    else:
+        serve()
+
+
 if __name__ == '__main__':
-    serve()
\ No newline at end of file
+    run()
\ No newline at end of file
@@ -0,0 +1,242 @@
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from async_posts_service import AsyncPostsService
+from models import Post, PostRow
+import posts_pb2
+from config import Config
+from converters import (
+    list_posts_params, list_posts_response, post_response, post_to_proto, requested_fields,
+    stream_posts_params
+)
+
+
+class TestAsyncPostsService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.event_producer_patch = patch('async_posts_service.EventProducer')
+        self.mock_event_producer = self.event_producer_patch.start()
+        self.mock_event_producer_instance = self.mock_event_producer.return_value
+
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
+        self.db_session = MagicMock()
+        self.db_session.return_value.__aenter__.return_value = self.session
+        self.posts_service = AsyncPostsService(self.db_session)
+
+    def tearDown(self):
+        self.event_producer_patch.stop()
+
+    def _mock_post(self, **fields):
+        mock_post = MagicMock(spec=Post)
+        mock_post.updated_at = datetime.utcnow()
+        mock_post.counters = None
+        for name, value in fields.items():
+            setattr(mock_post, name, value)
+        return mock_post
+
+    async def test_get_post_served_from_cache(self):
+        mock_post = self._mock_post(id=1, user_id=1, is_private=True, created_at=datetime.utcnow())
+        self.result.scalar_one_or_none.return_value = mock_post
+
+        first, error = await self.posts_service.get_post(post_id=1, user_id=1)
+        denied, denied_error = await self.posts_service.get_post(post_id=1, user_id=2)
+
+        self.assertIsNone(error)
+        self.assertEqual(first.id, 1)
+        self.assertIsNone(denied)
+        self.assertIn("Access denied", denied_error)
+        self.session.execute.assert_awaited_once()
+
+    async def test_get_post_not_found(self):
+        self.result.scalar_one_or_none.return_value = None
+
+        result, error = await self.posts_service.get_post(post_id=999, user_id=1)
+
+        self.assertIsNone(result)
+        self.assertEqual(error, "Post not found")
+
+    async def test_update_post_not_owner(self):
+        mock_post = self._mock_post(id=1, user_id=1, is_private=False)
+        self.result.scalar_one_or_none.return_value = mock_post
+
+        result, error = await self.posts_service.update_post(post_id=1, user_id=2, title='Updated')
+
+        self.assertIsNone(result)
+        self.assertIn("Access denied", error)
+        self.session.commit.assert_not_awaited()
+
+    async def test_view_post_queues_event(self):
+        row = MagicMock(found=1, allowed=True, inserted=1)
+        self.result.one.return_value = row
+
+        success, message = await self.posts_service.view_post(post_id=1, user_id=2)
+
+        self.assertTrue(success)
+        self.assertEqual(message, "Post viewed successfully")
+        self.session.commit.assert_awaited_once()
+        # Queued in the outbox by the statement, not sent from the request
+        self.mock_event_producer_instance.send_view_event.assert_not_called()
+
+    async def test_like_post_private(self):
+        row = MagicMock(found=1, allowed=False, inserted=0, deleted=0)
+        self.result.one.return_value = row
+
+        success, message = await self.posts_service.like_post(post_id=1, user_id=2)
+
+        self.assertFalse(success)
+        self.assertIn("Access denied", message)
+        self.session.commit.assert_not_awaited()
+        self.mock_event_producer_instance.send_like_event.assert_not_called()
+
+    async def test_list_posts_invalid_cursor(self):
+        result, error = await self.posts_service.list_posts(cursor='not-a-cursor')
+
+        self.assertIsNone(result)
+        self.assertEqual(error, "Invalid cursor")
+        self.db_session.assert_not_called()
+
+    async def test_list_posts_without_count(self):
+        created_at = datetime(2025, 1, 1, 12, 0, 0)
+        self.result.__iter__.return_value = iter([
+            (i, 't', 'd', 1, False, [], created_at, created_at, 0, 0, 0) for i in (3, 2, 1)
+        ])
+
+        result, error = await self.posts_service.list_posts(per_page=2, count_mode='none')
+
+        self.assertIsNone(error)
+        self.assertEqual([post.id for post in result['posts']], [3, 2])
+        self.assertTrue(result['has_more'])
+        self.assertIsNotNone(result['next_cursor'])
+        self.assertIsNone(result['total_count'])
+        self.session.scalar.assert_not_awaited()
+
+    def test_stream_posts_invalid_date(self):
+        posts, error = self.posts_service.stream_posts(created_from='yesterday')
+
+        self.assertIsNone(posts)
+        self.assertIsNotNone(error)
+
+    async def test_stream_posts_reads_requested_columns(self):
+        created_at = datetime(2025, 3, 1, 12, 0, 0)
+        row = MagicMock()
+        row._mapping = {'id': 1, 'user_id': 3, 'is_private': False, 'created_at': created_at, 'title': 'Post 1'}
+
+        async def rows():
+            yield row
+        self.session.stream.return_value = rows()
+
+        stream, error = self.posts_service.stream_posts(fields=frozenset({'title'}))
+        results = [post async for post, _ in stream]
+
+        self.assertIsNone(error)
+        self.assertEqual(results[0].title, 'Post 1')
+        self.assertIsNone(results[0].description)
+        statement = self.session.stream.call_args[0][0]
+        self.assertEqual([column.name for column in statement.selected_columns],
+                         ['id', 'title', 'user_id', 'is_private', 'created_at'])
+
+    def test_stream_posts_unknown_field(self):
+        posts, error = self.posts_service.stream_posts(fields=frozenset({'password'}))
+
+        self.assertIsNone(posts)
+        self.assertIn('password', error)
+
+
+class TestConverters(unittest.TestCase):
+
+    def test_list_posts_params(self):
+        request = posts_pb2.ListPostsRequest(
+            page=2, per_page=5, tag='news', cursor='abc', tags=['a'], tag_match=posts_pb2.TAG_MATCH_ALL
+        )
+
+        params = list_posts_params(request)
+
+        self.assertEqual(params['tag'], 'news')
+        self.assertEqual(params['tags'], ['a'])
+        self.assertTrue(params['match_all'])
+        self.assertEqual(params['count_mode'], 'none')
+
+    def test_stream_posts_params(self):
+        request = posts_pb2.StreamPostsRequest(author_id=3, excerpt_length=20)
+        request.field_mask.paths.extend(['title', 'excerpt'])
+
+        params = stream_posts_params(request)
+
+        self.assertEqual(params['fields'], {'title', 'excerpt'})
+        self.assertEqual(params['excerpt_length'], 20)
+        self.assertIsNone(stream_posts_params(posts_pb2.StreamPostsRequest())['fields'])
+
+    def test_post_response_error(self):
+        response = post_response(None, "Post not found")
+
+        self.assertEqual(response.error, "Post not found")
+        self.assertFalse(response.HasField('post'))
+
+    def test_list_posts_response(self):
+        created_at = datetime(2025, 1, 1)
+        post = PostRow(1, 't', 'd', 1, False, [], created_at, created_at, 2, 3, 4)
+
+        response = list_posts_response({
+            'posts': [post], 'total_count': None, 'page': 1, 'total_pages': None,
+            'next_cursor': None, 'has_more': False, 'count_mode': 'none'
+        }, None)
+
+        self.assertEqual(response.posts[0].views_count, 3)
+        self.assertFalse(response.HasField('total_count'))
+        self.assertEqual(response.count_mode, posts_pb2.COUNT_MODE_NONE)
+
+    def test_post_to_proto_timestamps(self):
+        created_at = datetime(2025, 3, 1, 12, 30, 15, 250000)
+        post = PostRow(2**40, 't', 'd', 2**33, False, ['a'], created_at, created_at)
+
+        with patch.object(Config, 'LEGACY_TIMESTAMP_STRINGS', True):
+            message = post_to_proto(post)
+
+        self.assertEqual(message.id, 2**40)
+        self.assertEqual(message.user_id, 2**33)
+        self.assertEqual(message.created_time.ToDatetime(), created_at)
+        self.assertEqual(message.updated_time.nanos, 250000000)
+        self.assertEqual(message.created_at, '2025-03-01T12:30:15.250000')
+
+    def test_requested_fields(self):
+        request = posts_pb2.GetPostRequest(post_id=1)
+        self.assertIsNone(requested_fields(request.field_mask))
+
+        request.field_mask.paths.extend(['title', 'created_time'])
+        self.assertEqual(requested_fields(request.field_mask), {'title', 'created_at'})
+
+    def test_sparse_post_to_proto(self):
+        created_at = datetime(2025, 3, 1)
+        post = PostRow(7, 'Title', None, 3, False, None, created_at, excerpt='Desc')
+
+        message = post_to_proto(post, frozenset({'title', 'excerpt', 'created_at'}))
+
+        self.assertEqual(message.id, 7)
+        self.assertEqual(message.title, 'Title')
+        self.assertEqual(message.excerpt, 'Desc')
+        self.assertEqual(message.created_time.ToDatetime(), created_at)
+        self.assertEqual(message.user_id, 0)
+        self.assertEqual(message.description, '')
+        self.assertFalse(message.HasField('updated_time'))
+
+    def test_post_to_proto_without_legacy_strings(self):
+        created_at = datetime(2025, 3, 1, 12, 30, 15)
+        post = PostRow(1, 't', 'd', 1, False, [], created_at, created_at)
+
+        with patch.object(Config, 'LEGACY_TIMESTAMP_STRINGS', False):
+            message = post_to_proto(post)
+
+        self.assertEqual(message.created_at, '')
+        self.assertEqual(message.created_time.ToDatetime(), created_at)
+
+
+if __name__ == '__main__':
+    unittest.main()
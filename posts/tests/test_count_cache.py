@@ -0,0 +1,150 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from sqlalchemy.orm import Session
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from count_cache import CountCache, count_key
+from cache_invalidation import CacheInvalidationListener
+from config import Config
+from posts_service import PostsService
+
+
+class TestCountCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = CountCache(ttl=60, max_size=100)
+
+    def test_get_set(self):
+        self.cache.set(count_key(None, None), 10)
+
+        self.assertEqual(self.cache.get(count_key(None, None)), 10)
+        self.assertIsNone(self.cache.get(count_key(1, None)))
+
+    def test_expired_entry(self):
+        cache = CountCache(ttl=-1, max_size=100)
+        cache.set(count_key(None, None), 10)
+
+        self.assertIsNone(cache.get(count_key(None, None)))
+
+    def test_lru_eviction(self):
+        cache = CountCache(ttl=60, max_size=2)
+        cache.set(count_key(None, ['a']), 1)
+        cache.set(count_key(None, ['b']), 2)
+        cache.get(count_key(None, ['a']))
+        cache.set(count_key(None, ['c']), 3)
+
+        self.assertEqual(cache.get(count_key(None, ['a'])), 1)
+        self.assertIsNone(cache.get(count_key(None, ['b'])))
+
+    def test_invalidate_public_post(self):
+        self.cache.set(count_key(None, None), 1)
+        self.cache.set(count_key(5, ['python']), 2)
+        self.cache.set(count_key(5, ['go']), 3)
+
+        self.cache.invalidate(author_id=1, tags=['python'], is_public=True)
+
+        self.assertIsNone(self.cache.get(count_key(None, None)))
+        self.assertIsNone(self.cache.get(count_key(5, ['python'])))
+        self.assertEqual(self.cache.get(count_key(5, ['go'])), 3)
+
+    def test_invalidate_multi_tag_filters(self):
+        any_key = count_key(None, ['python', 'rust'])
+        all_key = count_key(None, ['python', 'rust'], match_all=True)
+        self.cache.set(any_key, 1)
+        self.cache.set(all_key, 2)
+
+        self.cache.invalidate(author_id=1, tags=['python'], is_public=True)
+
+        self.assertIsNone(self.cache.get(any_key))
+        self.assertEqual(self.cache.get(all_key), 2)
+
+        self.cache.invalidate(author_id=1, tags=['python', 'rust', 'go'], is_public=True)
+
+        self.assertIsNone(self.cache.get(all_key))
+
+    def test_invalidate_private_post_only_affects_author(self):
+        self.cache.set(count_key(None, None), 1)
+        self.cache.set(count_key(1, None), 2)
+        self.cache.set(count_key(2, None), 3)
+
+        self.cache.invalidate(author_id=1, tags=[], is_public=False)
+
+        self.assertEqual(self.cache.get(count_key(None, None)), 1)
+        self.assertIsNone(self.cache.get(count_key(1, None)))
+        self.assertEqual(self.cache.get(count_key(2, None)), 3)
+
+    def test_stale_generation_is_not_stored(self):
+        generation = self.cache.generation()
+        self.cache.invalidate(author_id=1, tags=[], is_public=True)
+        self.cache.set(count_key(None, None), 10, generation)
+
+        self.assertIsNone(self.cache.get(count_key(None, None)))
+
+    def test_listener_applies_count_invalidation(self):
+        post_cache = MagicMock()
+        listener = CacheInvalidationListener('localhost:9092', 'post_cache_invalidations', post_cache, self.cache)
+        self.cache.set(count_key(None, ['python']), 1)
+        self.cache.set(count_key(None, ['go']), 2)
+
+        listener.apply({'event_type': 'post_count_invalidation', 'author_id': 1, 'tags': ['python'],
+                        'is_public': True, 'timestamp': '2025-03-01T12:00:00'})
+
+        self.assertIsNone(self.cache.get(count_key(None, ['python'])))
+        self.assertEqual(self.cache.get(count_key(None, ['go'])), 2)
+        post_cache.invalidate.assert_not_called()
+
+
+class TestListPostsCountModes(unittest.TestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+        self.db_session = MagicMock(return_value=self.session)
+        self.posts_service = PostsService(self.db_session)
+        self.filtered = self.session.query.return_value.filter.return_value
+        self.filtered.count.return_value = 7
+        self.filtered.order_by.return_value.offset.return_value.limit.return_value.all.return_value = []
+
+    def test_cached_count_is_reused(self):
+        first, _ = self.posts_service.list_posts(user_id=1, count_mode='cached')
+        second, _ = self.posts_service.list_posts(user_id=1, count_mode='cached')
+
+        self.assertEqual(first['total_count'], 7)
+        self.assertEqual(second['total_count'], 7)
+        self.assertEqual(second['count_mode'], 'cached')
+        self.filtered.count.assert_called_once()
+
+    def test_created_post_invalidates_other_replicas(self):
+        self.posts_service.event_producer = MagicMock()
+        self.posts_service.list_posts(count_mode='cached')
+
+        with patch.object(Config, 'POST_CACHE_INVALIDATION_TOPIC', 'post_cache_invalidations'):
+            self.posts_service.create_post('Title', 'Text', user_id=1, tags=['python'])
+        result, _ = self.posts_service.list_posts(count_mode='cached')
+
+        self.posts_service.event_producer.send_count_invalidation_event.assert_called_once_with(
+            'post_cache_invalidations', author_id=1, tags=['python'], is_public=True
+        )
+        self.assertEqual(self.filtered.count.call_count, 2)
+        self.assertEqual(result['total_count'], 7)
+
+    def test_no_count(self):
+        result, _ = self.posts_service.list_posts(user_id=1, count_mode='none')
+
+        self.assertIsNone(result['total_count'])
+        self.assertIsNone(result['total_pages'])
+        self.filtered.count.assert_not_called()
+
+    def test_estimated_count_falls_back_to_cache_with_tag(self):
+        self.session.query.return_value.filter.return_value.filter.return_value = self.filtered
+
+        result, _ = self.posts_service.list_posts(tag='python', count_mode='estimated')
+
+        self.assertEqual(result['total_count'], 7)
+        self.assertEqual(result['count_mode'], 'cached')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Config
+from db_pool import TimedQueuePool, TimedAsyncQueuePool, engine_options, watch_pool
+from interceptors import DeadlineSession
+from models import init_db
+
+
+class TestDbPool(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine(
+            'sqlite://', poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05
+        )
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def _sample(self, name):
+        return REGISTRY.get_sample_value(name) or 0
+
+    def test_checkout_is_timed(self):
+        before = self._sample('posts_db_pool_checkout_wait_seconds_count')
+
+        with self.engine.connect():
+            pass
+
+        self.assertEqual(self._sample('posts_db_pool_checkout_wait_seconds_count'), before + 1)
+
+    def test_checkout_timeout_counted(self):
+        before = self._sample('posts_db_pool_checkout_timeouts_total')
+
+        with self.engine.connect():
+            with self.assertRaises(PoolTimeoutError):
+                self.engine.connect()
+
+        self.assertEqual(self._sample('posts_db_pool_checkout_timeouts_total'), before + 1)
+
+    def test_saturation(self):
+        with patch.object(Config, 'DB_POOL_SIZE', 1), patch.object(Config, 'DB_MAX_OVERFLOW', 1):
+            watch_pool(self.engine.pool)
+
+        with self.engine.connect():
+            self.assertEqual(self._sample('posts_db_pool_checked_out'), 1)
+            self.assertEqual(self._sample('posts_db_pool_saturation'), 0.5)
+        self.assertEqual(self._sample('posts_db_pool_saturation'), 0)
+
+    def test_engine_options(self):
+        with patch.object(Config, 'DB_PGBOUNCER', True):
+            sync_options = engine_options()
+            async_options = engine_options(async_driver=True)
+
+        self.assertIs(sync_options['poolclass'], TimedQueuePool)
+        self.assertNotIn('connect_args', sync_options)
+        self.assertIs(async_options['poolclass'], TimedAsyncQueuePool)
+        self.assertEqual(async_options['connect_args']['statement_cache_size'], 0)
+        self.assertEqual(async_options['connect_args']['prepared_statement_cache_size'], 0)
+
+    def test_extra_engine_keeps_options_but_pool_size(self):
+        with patch('db_pool.watch_pool') as watch, patch.object(Config, 'DB_POOL_TIMEOUT', 3):
+            db_session = init_db('sqlite://', pool_size=1)
+        engine = db_session.kw['bind']
+
+        self.assertIsInstance(engine.pool, TimedQueuePool)
+        self.assertEqual((engine.pool.size(), engine.pool._max_overflow, engine.pool._timeout), (1, 0, 3))
+        self.assertTrue(issubclass(db_session.class_, DeadlineSession))
+        watch.assert_not_called()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from datetime import datetime, timezone
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import event_codec
+import events_pb2
+
+
+class TestEventCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.event = {
+            'event_type': 'post_comment',
+            'user_id': 1,
+            'post_id': 2**40,
+            'comment_id': 3,
+            'timestamp': '2025-03-01T12:30:15.250999'
+        }
+
+    def test_protobuf_round_trip(self):
+        [(suffix, value)] = event_codec.encode(self.event, 'protobuf')
+
+        decoded = event_codec.decode(value)
+
+        self.assertEqual(suffix, event_codec.PROTOBUF_TOPIC_SUFFIX)
+        self.assertEqual(decoded['event_type'], 'post_comment')
+        self.assertEqual(decoded['post_id'], 2**40)
+        self.assertEqual(decoded['comment_id'], 3)
+        # Millisecond precision
+        self.assertEqual(decoded['timestamp'], datetime(2025, 3, 1, 12, 30, 15, 250000))
+        self.assertLess(len(value), len(event_codec.encode_json(self.event)) / 2)
+
+    def test_json_decoded_the_same_way(self):
+        [(suffix, value)] = event_codec.encode(self.event, 'json')
+
+        decoded = event_codec.decode(value)
+
+        self.assertEqual(suffix, '')
+        self.assertEqual(decoded['comment_id'], 3)
+        self.assertEqual(decoded['timestamp'], datetime(2025, 3, 1, 12, 30, 15, 250999))
+
+    def test_dual_writes_both_formats(self):
+        records = event_codec.encode(self.event, 'dual')
+
+        self.assertEqual([suffix for suffix, _ in records], ['', '.pb'])
+        self.assertEqual(event_codec.decode(records[0][1])['post_id'],
+                         event_codec.decode(records[1][1])['post_id'])
+
+    def test_events_without_message_stay_json(self):
+        event = {'event_type': 'post_cache_invalidation', 'post_id': 1, 'version': None,
+                 'timestamp': '2025-03-01T12:00:00'}
+
+        self.assertEqual(event_codec.encode(event, 'protobuf'), [('', event_codec.encode_json(event))])
+
+    def test_aware_timestamp_converted_to_utc(self):
+        timestamp = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+        self.assertEqual(event_codec.from_millis(event_codec.to_millis(timestamp)), datetime(2025, 3, 1, 12, 0))
+
+    def test_newer_schema_version_rejected(self):
+        message = events_pb2.PostViewEvent(user_id=1, post_id=2)
+        message.header.schema_version = event_codec.SCHEMA_VERSION + 1
+        message.header.event_type = 'post_view'
+
+        with self.assertRaises(ValueError):
+            event_codec.decode(message.SerializeToString())
+
+
+if __name__ == '__main__':
+    unittest.main()
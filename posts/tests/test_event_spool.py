@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from event_spool import EventSpool, SpoolReplay
+
+
+class TestEventSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.spool = self.open_spool()
+
+    def tearDown(self):
+        self.spool.close()
+        self.directory.cleanup()
+
+    def open_spool(self, max_bytes=1024 * 1024):
+        return EventSpool(self.directory.name, max_bytes=max_bytes, segment_bytes=100, fsync_interval=0)
+
+    def replay(self, spool, acknowledged=None):
+        published = []
+
+        def publish(records):
+            published.extend(records)
+            return acknowledged or [True] * len(records)
+
+        replay = SpoolReplay(spool, lambda: True, publish, batch_size=3)
+        while spool.pending() and replay.replay_batch():
+            pass
+        return published
+
+    def test_records_replayed_in_order_across_segments(self):
+        for i in range(10):
+            self.spool.append('post_views', str(i).encode(), b'value %d' % i)
+
+        published = self.replay(self.spool)
+
+        self.assertEqual([value for _, _, value in published], [b'value %d' % i for i in range(10)])
+        self.assertEqual(published[3], ('post_views', b'3', b'value 3'))
+        self.assertFalse(self.spool.pending())
+        segments = [name for name in os.listdir(self.directory.name) if name.endswith('.log')]
+        self.assertEqual(len(segments), 1)
+
+    def test_replay_resumes_after_restart(self):
+        for i in range(5):
+            self.spool.append('user_registrations', None, b'%d' % i)
+        records = self.spool.read(2)
+        self.spool.commit(records[-1][0], records[-1][1])
+        self.spool.close()
+
+        self.spool = self.open_spool()
+        published = self.replay(self.spool)
+
+        self.assertEqual([value for _, _, value in published], [b'2', b'3', b'4'])
+        self.assertIsNone(published[0][1])
+
+    def test_replay_stops_at_first_failure(self):
+        for i in range(3):
+            self.spool.append('post_views', None, b'%d' % i)
+
+        replay = SpoolReplay(self.spool, lambda: True, MagicMock(return_value=[True, False, True]))
+        self.assertEqual(replay.replay_batch(), 1)
+
+        self.assertEqual([value for _, _, value in self.replay(self.spool)], [b'1', b'2'])
+
+    def test_no_replay_without_broker(self):
+        self.spool.append('post_views', None, b'0')
+        publish = MagicMock()
+
+        self.assertEqual(SpoolReplay(self.spool, lambda: False, publish).replay_batch(), 0)
+        publish.assert_not_called()
+        self.assertTrue(self.spool.pending())
+
+    def test_full_spool_drops(self):
+        spool = EventSpool(os.path.join(self.directory.name, 'small'), max_bytes=40,
+                           segment_bytes=100, fsync_interval=0)
+
+        self.assertTrue(spool.append('t', None, b'x' * 10))
+        self.assertFalse(spool.append('t', None, b'x' * 10))
+        spool.close()
+
+    def test_directory_locked(self):
+        with self.assertRaises(BlockingIOError):
+            self.open_spool()
+
+    def test_torn_record_skipped(self):
+        self.spool.append('t', None, b'kept')
+        self.spool.close()
+        segment = sorted(name for name in os.listdir(self.directory.name) if name.endswith('.log'))[-1]
+        with open(os.path.join(self.directory.name, segment), 'ab') as f:
+            f.write(b'\x00\x01torn')
+
+        self.spool = self.open_spool()
+
+        self.assertEqual([value for _, _, value in self.replay(self.spool)], [b'kept'])
+        self.assertFalse(self.spool.pending())
+
+
+if __name__ == '__main__':
+    unittest.main()
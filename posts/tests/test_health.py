@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import Base
+from health import ReadinessProbe, database_ready, kafka_ready, SERVICES, SERVING, NOT_SERVING
+
+
+class TestReadiness(unittest.TestCase):
+
+    def setUp(self):
+        self.servicer = MagicMock()
+        self.engine = MagicMock()
+        self.inspector_patch = patch('migrate.inspect')
+        self.inspector = self.inspector_patch.start().return_value
+        self.inspector.get_table_names.return_value = [
+            'posts', 'post_counters', 'post_likes', 'post_views', 'comments', 'outbox', 'outbox_dead_letters'
+        ]
+        self.inspector.get_columns.side_effect = lambda table: [
+            {'name': name} for name in Base.metadata.tables[table].columns.keys()
+        ]
+        self.inspector.get_unique_constraints.return_value = [{'column_names': ['post_id', 'user_id']}]
+        self.inspector.get_indexes.side_effect = lambda table: [
+            {'name': name} for name in ('ix_posts_created_at_id', 'ix_posts_tags', 'ix_comments_post_id_created_at_id',
+                                        'ix_outbox_txid_id', 'ix_outbox_views_txid_id')
+        ]
+        self.event_producer = MagicMock(spool=None)
+        self.event_producer.connected.return_value = True
+
+    def tearDown(self):
+        self.inspector_patch.stop()
+
+    def statuses(self):
+        return {call[0][0]: call[0][1] for call in self.servicer.set.call_args_list}
+
+    def test_starts_not_serving(self):
+        ReadinessProbe(self.servicer, self.engine, self.event_producer)
+
+        self.assertEqual(self.statuses(), {service: NOT_SERVING for service in SERVICES})
+
+    def test_serving_when_dependencies_ready(self):
+        probe = ReadinessProbe(self.servicer, self.engine, self.event_producer)
+
+        self.assertEqual(probe.check(), SERVING)
+        self.assertEqual(self.statuses(), {service: SERVING for service in SERVICES})
+
+        self.servicer.set.reset_mock()
+        probe.check()
+        self.servicer.set.assert_not_called()
+
+    def test_not_serving_before_migration(self):
+        self.inspector.get_table_names.return_value = ['posts']
+
+        ready, reason = database_ready(self.engine)
+
+        self.assertFalse(ready)
+        self.assertIn('table post_counters', reason)
+        self.assertIn('migrate.py', reason)
+
+    def test_not_serving_without_constraint(self):
+        self.inspector.get_unique_constraints.return_value = []
+
+        ready, reason = database_ready(self.engine)
+
+        self.assertFalse(ready)
+        self.assertIn('constraint uq_post_likes_post_id_user_id', reason)
+
+    def test_not_serving_without_database(self):
+        self.engine.connect.side_effect = Exception("connection refused")
+        probe = ReadinessProbe(self.servicer, self.engine, self.event_producer)
+
+        self.assertEqual(probe.check(), NOT_SERVING)
+
+    def test_kafka_ready_with_spool(self):
+        self.event_producer.connected.return_value = False
+        self.assertFalse(kafka_ready(self.event_producer)[0])
+
+        self.event_producer.spool = MagicMock()
+        self.assertTrue(kafka_ready(self.event_producer)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,237 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+import grpc
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import posts_pb2
+from interceptors import MetricsInterceptor, AsyncMetricsInterceptor, error_kind, track_db_time
+from interceptors import DeadlineInterceptor, DeadlineExceeded, track_deadlines
+from interceptors import db_time, deadline
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def call_details(method):
+    details = MagicMock()
+    details.method = f'/posts.PostService/{method}'
+    return details
+
+
+def rpc_context(time_remaining):
+    context = MagicMock()
+    context.time_remaining.return_value = time_remaining
+    context.abort.side_effect = grpc.RpcError
+    return context
+
+
+class TestMetricsInterceptor(unittest.TestCase):
+
+    def test_unary_latency_and_error(self):
+        handler = grpc.unary_unary_rpc_method_handler(
+            lambda request, context: posts_pb2.PostResponse(error="Post not found")
+        )
+        before_count = sample('posts_grpc_server_handling_seconds_count', method='GetPost')
+        before_errors = sample('posts_grpc_server_errors_total', method='GetPost', kind='not_found')
+
+        wrapped = MetricsInterceptor().intercept_service(lambda details: handler, call_details('GetPost'))
+        response = wrapped.unary_unary(posts_pb2.GetPostRequest(post_id=1), None)
+
+        self.assertEqual(response.error, "Post not found")
+        self.assertEqual(sample('posts_grpc_server_handling_seconds_count', method='GetPost'), before_count + 1)
+        self.assertEqual(sample('posts_grpc_server_errors_total', method='GetPost', kind='not_found'),
+                         before_errors + 1)
+        self.assertEqual(sample('posts_grpc_server_in_flight', method='GetPost'), 0)
+
+    def test_unsuccessful_response_counted(self):
+        handler = grpc.unary_unary_rpc_method_handler(
+            lambda request, context: posts_pb2.ViewPostResponse(
+                success=False, message="Access denied: this post is private")
+        )
+        before = sample('posts_grpc_server_errors_total', method='ViewPost', kind='access_denied')
+
+        wrapped = MetricsInterceptor().intercept_service(lambda details: handler, call_details('ViewPost'))
+        wrapped.unary_unary(posts_pb2.ViewPostRequest(post_id=1), None)
+
+        self.assertEqual(sample('posts_grpc_server_errors_total', method='ViewPost', kind='access_denied'),
+                         before + 1)
+
+    def test_stream_timed_until_last_message(self):
+        def stream(request, context):
+            self.assertEqual(sample('posts_grpc_server_in_flight', method='StreamPosts'), 1)
+            yield posts_pb2.StreamPostsResponse(cursor='a')
+            yield posts_pb2.StreamPostsResponse(cursor='b')
+
+        handler = grpc.unary_stream_rpc_method_handler(stream)
+        before = sample('posts_grpc_server_handling_seconds_count', method='StreamPosts')
+
+        wrapped = MetricsInterceptor().intercept_service(lambda details: handler, call_details('StreamPosts'))
+        responses = list(wrapped.unary_stream(posts_pb2.StreamPostsRequest(), None))
+
+        self.assertEqual([response.cursor for response in responses], ['a', 'b'])
+        self.assertEqual(sample('posts_grpc_server_handling_seconds_count', method='StreamPosts'), before + 1)
+        self.assertEqual(sample('posts_grpc_server_in_flight', method='StreamPosts'), 0)
+
+    def test_exception_counted(self):
+        def fail(request, context):
+            raise RuntimeError("boom")
+
+        handler = grpc.unary_unary_rpc_method_handler(fail)
+        before = sample('posts_grpc_server_errors_total', method='LikePost', kind='exception')
+
+        wrapped = MetricsInterceptor().intercept_service(lambda details: handler, call_details('LikePost'))
+        with self.assertRaises(RuntimeError):
+            wrapped.unary_unary(posts_pb2.LikePostRequest(), None)
+
+        self.assertEqual(sample('posts_grpc_server_errors_total', method='LikePost', kind='exception'), before + 1)
+        self.assertEqual(sample('posts_grpc_server_in_flight', method='LikePost'), 0)
+
+    def test_aborted_rpc_counted_by_status(self):
+        def abort(request, context):
+            context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline exceeded")
+
+        handler = grpc.unary_unary_rpc_method_handler(abort)
+        context = rpc_context(0)
+        context.code.return_value = grpc.StatusCode.DEADLINE_EXCEEDED
+        before = sample('posts_grpc_server_errors_total', method='ListPosts', kind='deadline_exceeded')
+
+        wrapped = MetricsInterceptor().intercept_service(lambda details: handler, call_details('ListPosts'))
+        with self.assertRaises(grpc.RpcError):
+            wrapped.unary_unary(posts_pb2.ListPostsRequest(), context)
+
+        self.assertEqual(sample('posts_grpc_server_errors_total', method='ListPosts', kind='deadline_exceeded'),
+                         before + 1)
+
+    def test_error_kind(self):
+        self.assertEqual(error_kind("Post not found"), 'not_found')
+        self.assertEqual(error_kind("Access denied: only the author can delete this post"), 'access_denied')
+        self.assertEqual(error_kind("Invalid cursor"), 'invalid_argument')
+        self.assertEqual(error_kind("Database error: connection refused"), 'internal')
+
+
+class TestAsyncMetricsInterceptor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_unary(self):
+        async def get_post(request, context):
+            return posts_pb2.PostResponse(post=posts_pb2.Post(id=request.post_id))
+
+        async def continuation(details):
+            return grpc.unary_unary_rpc_method_handler(get_post)
+
+        before = sample('posts_grpc_server_handling_seconds_count', method='BatchGetPosts')
+
+        wrapped = await AsyncMetricsInterceptor().intercept_service(continuation, call_details('BatchGetPosts'))
+        response = await wrapped.unary_unary(posts_pb2.GetPostRequest(post_id=3), None)
+
+        self.assertEqual(response.post.id, 3)
+        self.assertEqual(sample('posts_grpc_server_handling_seconds_count', method='BatchGetPosts'), before + 1)
+
+
+class TestDeadlineInterceptor(unittest.TestCase):
+
+    def intercept(self, behavior):
+        handler = grpc.unary_unary_rpc_method_handler(behavior)
+        return DeadlineInterceptor().intercept_service(lambda details: handler, call_details('GetPost'))
+
+    def test_expired_on_arrival_not_handled(self):
+        behavior = MagicMock()
+        context = rpc_context(0)
+
+        with self.assertRaises(grpc.RpcError):
+            self.intercept(behavior).unary_unary(posts_pb2.GetPostRequest(), context)
+
+        behavior.assert_not_called()
+        context.abort.assert_called_once()
+        self.assertEqual(context.abort.call_args[0][0], grpc.StatusCode.DEADLINE_EXCEEDED)
+
+    def test_statement_timeout_follows_deadline(self):
+        connection = MagicMock()
+
+        def get_post(request, context):
+            deadline._apply_statement_timeout(None, None, connection)
+            return posts_pb2.PostResponse()
+
+        self.intercept(get_post).unary_unary(posts_pb2.GetPostRequest(), rpc_context(2.5))
+
+        statement = connection.exec_driver_sql.call_args[0][0]
+        self.assertTrue(statement.startswith("SET LOCAL statement_timeout = "))
+        self.assertTrue(2400 < int(statement.rsplit(' ', 1)[1]) <= 2500)
+
+    def test_no_statement_timeout_without_deadline(self):
+        connection = MagicMock()
+
+        def get_post(request, context):
+            deadline._apply_statement_timeout(None, None, connection)
+            return posts_pb2.PostResponse()
+
+        # grpc reports calls without a deadline with a huge time_remaining()
+        self.intercept(get_post).unary_unary(posts_pb2.GetPostRequest(), rpc_context(2.0 ** 62))
+
+        connection.exec_driver_sql.assert_not_called()
+
+    def test_deadline_exceeded_instead_of_error_string(self):
+        engine = create_engine('sqlite://')
+        track_deadlines(engine)
+
+        def get_post(request, context):
+            time.sleep(0.06)
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text('select 1'))
+            except DeadlineExceeded as e:
+                return posts_pb2.PostResponse(error=f"Database error: {str(e)}")
+            return posts_pb2.PostResponse()
+
+        context = rpc_context(0.05)
+        with self.assertRaises(grpc.RpcError):
+            self.intercept(get_post).unary_unary(posts_pb2.GetPostRequest(), context)
+
+        self.assertEqual(context.abort.call_args[0][0], grpc.StatusCode.DEADLINE_EXCEEDED)
+        engine.dispose()
+
+    def test_cancelled_rpc_cancels_running_statement(self):
+        running = MagicMock()
+        context = rpc_context(10)
+
+        def get_post(request, context):
+            rpc = deadline._rpc.get()
+            rpc.running = running
+            # The client goes away while the statement runs
+            context.add_callback.call_args[0][0]()
+            return posts_pb2.PostResponse(error="Database error: canceling statement due to user request")
+
+        with self.assertRaises(grpc.RpcError):
+            self.intercept(get_post).unary_unary(posts_pb2.GetPostRequest(), context)
+
+        running.cancel.assert_called_once()
+        self.assertEqual(context.abort.call_args[0][0], grpc.StatusCode.CANCELLED)
+        self.assertIsNone(deadline._rpc.get())
+
+
+class TestDbTime(unittest.TestCase):
+
+    def test_statement_time_added_to_rpc(self):
+        engine = create_engine('sqlite://')
+        track_db_time(engine)
+
+        with engine.connect() as conn:
+            conn.execute(text('select 1'))
+            db_time.start()
+            conn.execute(text('select 1'))
+            elapsed = db_time.stop()
+            conn.execute(text('select 1'))
+
+        self.assertGreater(elapsed, 0)
+        self.assertEqual(db_time.stop(), 0)
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from prometheus_client import REGISTRY
+from kafka.errors import KafkaTimeoutError
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from kafka_producer import EventProducer, RoundRobinPartitioner, compression_type, make_partitioner
+from config import Config
+import event_codec
+
+
+def events(topic, outcome):
+    return REGISTRY.get_sample_value('posts_kafka_events_total', {'topic': topic, 'outcome': outcome}) or 0
+
+
+class TestEventProducer(unittest.TestCase):
+
+    def setUp(self):
+        self.kafka_patch = patch('kafka_producer.KafkaProducer')
+        self.mock_kafka = self.kafka_patch.start().return_value
+        self.future = MagicMock()
+        self.mock_kafka.send.return_value = self.future
+        self.producer = EventProducer('kafka:9092')
+
+    def tearDown(self):
+        self.kafka_patch.stop()
+
+    def deliver(self):
+        """Run the delivery callback of the last queued event"""
+        callback, *args = self.future.add_callback.call_args[0]
+        callback(*args, MagicMock(topic='post_views', partition=0, offset=1))
+
+    def test_async_send_does_not_wait(self):
+        before = events('post_views', 'sent')
+
+        self.assertTrue(self.producer.send_view_event(user_id=1, post_id=2))
+
+        self.future.get.assert_not_called()
+        self.assertEqual(self.producer.pending, 1)
+        self.deliver()
+        self.assertEqual(self.producer.pending, 0)
+        self.assertEqual(events('post_views', 'sent'), before + 1)
+
+    def test_delivery_failure_counted(self):
+        before = events('post_likes', 'failed')
+
+        self.producer.send_like_event(user_id=1, post_id=2)
+        errback, *args = self.future.add_errback.call_args[0]
+        errback(*args, Exception("broker down"))
+
+        self.assertEqual(self.producer.pending, 0)
+        self.assertEqual(events('post_likes', 'failed'), before + 1)
+
+    def test_full_buffer_drops(self):
+        before = events('post_views', 'dropped')
+
+        with patch.object(Config, 'KAFKA_MAX_PENDING', 1):
+            self.assertTrue(self.producer.send_view_event(user_id=1, post_id=2))
+            self.assertFalse(self.producer.send_view_event(user_id=1, post_id=3))
+
+        self.assertEqual(self.mock_kafka.send.call_count, 1)
+        self.assertEqual(events('post_views', 'dropped'), before + 1)
+
+    def test_full_buffer_blocks_until_delivery(self):
+        with patch.object(Config, 'KAFKA_MAX_PENDING', 1), \
+                patch.object(Config, 'KAFKA_BUFFER_FULL_POLICY', 'block'), \
+                patch.object(Config, 'KAFKA_MAX_BLOCK_MS', 5000):
+            self.producer.send_view_event(user_id=1, post_id=2)
+            threading.Timer(0.05, self.deliver).start()
+
+            self.assertTrue(self.producer.send_view_event(user_id=1, post_id=3))
+
+        self.assertEqual(self.mock_kafka.send.call_count, 2)
+
+    def test_sync_send_waits_for_acknowledgement(self):
+        with patch.object(Config, 'KAFKA_ASYNC_SEND', False):
+            producer = EventProducer('kafka:9092')
+        self.future.get.side_effect = Exception("timed out")
+
+        self.assertFalse(producer.send_view_event(user_id=1, post_id=2))
+        self.future.get.assert_called_once_with(timeout=Config.KAFKA_SEND_TIMEOUT)
+
+    def test_send_events_async(self):
+        sent = self.producer.send_view_events([(1, 2), (3, 4)])
+
+        self.assertEqual(sent, 2)
+        self.mock_kafka.flush.assert_not_called()
+
+    def test_dual_format_writes_both_topics(self):
+        with patch.object(Config, 'EVENT_FORMAT', 'dual'):
+            producer = EventProducer('kafka:9092')
+
+        self.assertTrue(producer.send_view_event(user_id=1, post_id=2))
+
+        topics = [call[0][0] for call in self.mock_kafka.send.call_args_list]
+        self.assertEqual(topics, ['post_views', 'post_views.pb'])
+        protobuf_value = self.mock_kafka.send.call_args_list[1][0][1]
+        self.assertEqual(event_codec.decode(protobuf_value)['post_id'], 2)
+        self.assertEqual(producer.pending, 2)
+
+    def test_publish_needs_every_format_delivered(self):
+        with patch.object(Config, 'EVENT_FORMAT', 'dual'):
+            producer = EventProducer('kafka:9092')
+        self.future.is_done = True
+        self.future.failed.side_effect = [False, True]
+        self.future.exception = KafkaTimeoutError()
+        record = ('post_views', '2', {'event_type': 'post_view', 'user_id': 1, 'post_id': 2,
+                                      'timestamp': '2025-03-01T12:00:00'})
+
+        self.assertEqual(producer.publish([record]), [self.future.exception])
+
+    def test_post_events_keyed_by_post(self):
+        self.producer.send_like_event(user_id=1, post_id=42)
+        self.producer.send_view_events([(7, 1), (8, 1)])
+
+        keys = [call[1]['key'] for call in self.mock_kafka.send.call_args_list]
+        self.assertEqual(keys, [b'42', b'7', b'8'])
+
+    def test_unavailable_compression_sends_uncompressed(self):
+        with patch.dict('kafka_producer._COMPRESSION_CODECS', {'zstd': lambda: True}):
+            self.assertIsNone(compression_type('zstd', (0, 10)))
+            self.assertEqual(compression_type('zstd', (2, 1)), 'zstd')
+        with patch.dict('kafka_producer._COMPRESSION_CODECS', {'lz4': lambda: False}):
+            self.assertIsNone(compression_type('lz4', (0, 10)))
+        self.assertIsNone(compression_type('brotli', (2, 1)))
+
+    def test_pluggable_partitioner(self):
+        self.assertIsInstance(make_partitioner('round_robin'), RoundRobinPartitioner)
+        self.assertIsInstance(make_partitioner('kafka_producer:RoundRobinPartitioner'), RoundRobinPartitioner)
+
+        cluster = MagicMock()
+        cluster.partitions_for_topic.return_value = {0, 1, 2}
+        cluster.available_partitions_for_topic.return_value = {0, 2}
+        partitioner = RoundRobinPartitioner()
+        chosen = [partitioner.partition('post_views', None, b'1', None, None, cluster) for _ in range(3)]
+        self.assertEqual(chosen, [0, 2, 0])
+
+    def test_close_flushes(self):
+        self.producer.close()
+
+        self.mock_kafka.close.assert_called_once_with(timeout=Config.KAFKA_SEND_TIMEOUT)
+
+
+class TestEventProducerSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config_patch = patch.multiple(Config, KAFKA_SPOOL_DIR=self.directory.name,
+                                           KAFKA_SPOOL_FSYNC_INTERVAL=0, KAFKA_SPOOL_RETRY_INTERVAL=60)
+        self.config_patch.start()
+        # Replayed by the tests instead of the thread
+        self.replay_patch = patch('kafka_producer.SpoolReplay.run')
+        self.replay_patch.start()
+        self.kafka_patch = patch('kafka_producer.KafkaProducer')
+        self.kafka = self.kafka_patch.start()
+
+    def tearDown(self):
+        self.producer.close()
+        self.kafka_patch.stop()
+        self.replay_patch.stop()
+        self.config_patch.stop()
+        self.directory.cleanup()
+
+    def test_events_spooled_without_broker_and_replayed(self):
+        self.kafka.side_effect = [Exception("no brokers"), MagicMock()]
+        self.producer = EventProducer('kafka:9092')
+        self.assertIsNone(self.producer.producer)
+
+        self.assertTrue(self.producer.send_like_event(user_id=1, post_id=2))
+        self.assertTrue(self.producer.spool.pending())
+
+        future = MagicMock()
+        future.succeeded.return_value = True
+        self.kafka.side_effect = None
+        self.kafka.return_value.send.return_value = future
+        self.assertEqual(self.producer.spool_replay.replay_batch(), 1)
+
+        topic, value = self.kafka.return_value.send.call_args[0]
+        self.assertEqual(topic, 'post_likes')
+        self.assertEqual(self.kafka.return_value.send.call_args[1]['key'], b'2')
+        self.assertEqual(event_codec.decode(value)['post_id'], 2)
+        self.assertFalse(self.producer.spool.pending())
+
+    def test_failed_delivery_spooled_and_later_events_queued_behind(self):
+        future = MagicMock()
+        self.kafka.return_value.send.return_value = future
+        self.producer = EventProducer('kafka:9092')
+
+        self.producer.send_like_event(user_id=1, post_id=2)
+        for errback, *args in [call[0] for call in future.add_errback.call_args_list]:
+            errback(*args, Exception("broker down"))
+        self.producer.send_like_event(user_id=1, post_id=3)
+
+        self.assertEqual(self.kafka.return_value.send.call_count, 1)
+        self.assertEqual([event_codec.decode(record[4])['post_id'] for record in self.producer.spool.read(10)],
+                         [2, 3])
+
+    def test_publish_not_spooled(self):
+        self.kafka.side_effect = Exception("no brokers")
+        self.producer = EventProducer('kafka:9092')
+        record = ('post_views', '2', {'event_type': 'post_view', 'user_id': 1, 'post_id': 2,
+                                      'timestamp': '2025-03-01T12:00:00'})
+
+        [error] = self.producer.publish([record])
+        self.assertIsNotNone(error)
+        self.assertFalse(self.producer.spool.pending())
+
+
+class TestEventProducerLazyConnect(unittest.TestCase):
+
+    def setUp(self):
+        self.config_patch = patch.multiple(Config, KAFKA_LAZY_CONNECT=True, KAFKA_RECONNECT_INTERVAL=0.01)
+        self.config_patch.start()
+        self.kafka_patch = patch('kafka_producer.KafkaProducer')
+        self.kafka = self.kafka_patch.start()
+
+    def tearDown(self):
+        self.producer.close()
+        self.kafka_patch.stop()
+        self.config_patch.stop()
+
+    def test_connects_in_background_until_broker_reachable(self):
+        connected = threading.Event()
+        producer = MagicMock()
+
+        def create(**kwargs):
+            if self.kafka.call_count < 3:
+                raise Exception("no brokers")
+            connected.set()
+            return producer
+
+        self.kafka.side_effect = create
+        self.producer = EventProducer('kafka:9092')
+
+        self.assertTrue(connected.wait(5))
+        self.assertEqual(self.kafka.call_count, 3)
+        self.assertTrue(self.producer.connected())
+
+    def test_not_connected_while_deliveries_cannot_reach_a_broker(self):
+        self.kafka.return_value.send.return_value = future = MagicMock()
+        self.producer = EventProducer('kafka:9092')
+        self.producer.connect()
+        self.assertTrue(self.producer.connected())
+
+        self.producer.send_like_event(user_id=1, post_id=2)
+        errback, *args = future.add_errback.call_args[0]
+        errback(*args, KafkaTimeoutError("Failed to update metadata"))
+        self.assertFalse(self.producer.connected())
+
+        self.producer.send_like_event(user_id=1, post_id=2)
+        callback, *args = future.add_callback.call_args[0]
+        callback(*args, MagicMock(topic='post_likes', partition=0, offset=1))
+        self.assertTrue(self.producer.connected())
+
+    def test_not_connected_without_producer(self):
+        self.kafka.side_effect = Exception("no brokers")
+        self.producer = EventProducer('kafka:9092')
+
+        self.assertFalse(self.producer.connected())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from sqlalchemy.dialects import postgresql
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import Base, Post, PostView, OutboxEvent
+from migrate import (
+    find_missing, missing_schema, add_column, add_unique_constraint, create_index_concurrently, migrate
+)
+
+# Tables of the schema the service created for itself before migrate.py
+BASELINE_TABLES = ['posts', 'post_likes', 'post_views', 'comments']
+
+
+def inspector(tables=BASELINE_TABLES, unique=(), indexes=(), missing_columns=()):
+    inspector = MagicMock()
+    inspector.get_table_names.return_value = list(tables)
+    inspector.get_columns.side_effect = lambda table: [
+        {'name': name} for name in Base.metadata.tables[table].columns.keys()
+        if f'{table}.{name}' not in missing_columns
+    ]
+    inspector.get_unique_constraints.side_effect = lambda table: [
+        {'column_names': list(columns)} for name, columns in unique if name == table
+    ]
+    inspector.get_indexes.side_effect = lambda table: [{'name': name} for name in indexes]
+    return inspector
+
+
+class TestMigrate(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = MagicMock()
+        self.connection.dialect = postgresql.dialect()
+        self.connection.execute.return_value.rowcount = 2
+
+    def sql(self):
+        return [str(call[0][0].compile(dialect=postgresql.dialect()))
+                for call in self.connection.execute.call_args_list]
+
+    def test_baseline_schema_misses_constraints(self):
+        tables, columns, constraints, indexes = find_missing(inspector())
+
+        self.assertEqual({table.name for table in tables}, {'post_counters', 'outbox', 'outbox_dead_letters'})
+        self.assertEqual(columns, [])
+        self.assertEqual({constraint.name for constraint in constraints},
+                         {'uq_post_likes_post_id_user_id', 'uq_post_views_post_id_user_id'})
+        self.assertEqual({index.name for index in indexes},
+                         {'ix_posts_created_at_id', 'ix_posts_tags', 'ix_comments_post_id_created_at_id'})
+
+    def test_constraint_found_by_columns(self):
+        with patch('migrate.inspect', return_value=inspector(
+                unique=[('post_views', ['user_id', 'post_id']), ('post_likes', ['post_id', 'user_id'])])):
+            missing = missing_schema(self.connection)
+
+        self.assertNotIn('constraint uq_post_views_post_id_user_id', missing)
+        self.assertNotIn('constraint uq_post_likes_post_id_user_id', missing)
+        self.assertIn('table post_counters', missing)
+        self.assertIn('index ix_posts_tags', missing)
+
+    def test_outbox_columns_added_to_existing_table(self):
+        current = inspector(tables=BASELINE_TABLES + ['post_counters', 'outbox', 'outbox_dead_letters'],
+                            missing_columns=['outbox.txid', 'outbox.claimed_until'])
+        with patch('migrate.inspect', return_value=current):
+            missing = missing_schema(self.connection)
+
+        self.assertIn('column outbox.txid', missing)
+        self.assertIn('column outbox.claimed_until', missing)
+        self.assertNotIn('table outbox', missing)
+        self.assertIn('index ix_outbox_views_txid_id', missing)
+
+        add_column(self.connection, OutboxEvent.__table__.c.txid)
+
+        self.assertEqual([str(call[0][0]) for call in self.connection.execute.call_args_list],
+                         ['ALTER TABLE outbox ADD COLUMN txid BIGINT DEFAULT txid_current() NOT NULL'])
+
+    def test_duplicates_deleted_before_constraint_added(self):
+        constraint = next(constraint for constraint in PostView.__table__.constraints
+                          if constraint.name == 'uq_post_views_post_id_user_id')
+
+        deleted = add_unique_constraint(self.connection, constraint)
+
+        lock, dedupe, alter = self.sql()
+        self.assertEqual(deleted, 2)
+        self.assertIn('LOCK TABLE post_views', lock)
+        self.assertIn('DELETE FROM post_views WHERE EXISTS', dedupe)
+        self.assertIn('earlier.post_id = post_views.post_id', dedupe)
+        self.assertIn('earlier.id < post_views.id', dedupe)
+        self.assertIn('ALTER TABLE post_views ADD CONSTRAINT uq_post_views_post_id_user_id UNIQUE (post_id, user_id)',
+                      alter)
+
+    def test_index_built_concurrently(self):
+        tags_index = next(index for index in Post.__table__.indexes if index.name == 'ix_posts_tags')
+
+        create_index_concurrently(self.connection, tags_index)
+
+        self.assertEqual(self.sql(),
+                         ['CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_tags ON posts USING gin (tags)'])
+        self.assertFalse(tags_index.dialect_options['postgresql']['concurrently'])
+
+    def test_migrate_upgrades_baseline_schema(self):
+        engine = MagicMock()
+        engine.begin.return_value.__enter__.return_value = self.connection
+        autocommit = MagicMock()
+        engine.connect.return_value.__enter__.return_value = autocommit
+
+        with patch('migrate.inspect', return_value=inspector()), \
+                patch('migrate.Base.metadata.create_all') as create_all, \
+                patch('migrate.Session'), patch('migrate.reconcile_counters', return_value=3) as reconcile:
+            changes = migrate(engine)
+
+        create_all.assert_called_once_with(self.connection)
+        reconcile.assert_called_once()
+        self.assertIn('post_counters backfilled (3 rows)', changes)
+        self.assertIn('table post_counters', changes)
+        self.assertIn('constraint uq_post_likes_post_id_user_id (2 duplicate rows deleted)', changes)
+        self.assertIn('constraint uq_post_views_post_id_user_id (2 duplicate rows deleted)', changes)
+        self.assertIn('index ix_posts_tags', changes)
+        autocommit.execution_options.assert_called_once_with(isolation_level='AUTOCOMMIT')
+        created = [str(call[0][0].compile(dialect=postgresql.dialect())) for call in autocommit.execute.call_args_list]
+        self.assertIn('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_tags ON posts USING gin (tags)', created)
+
+    def test_counters_left_alone_when_schema_up_to_date(self):
+        engine = MagicMock()
+        engine.begin.return_value.__enter__.return_value = self.connection
+        current = inspector(
+            tables=BASELINE_TABLES + ['post_counters', 'outbox', 'outbox_dead_letters'],
+            unique=[('post_views', ['post_id', 'user_id']), ('post_likes', ['post_id', 'user_id'])],
+            indexes=['ix_posts_created_at_id', 'ix_posts_tags', 'ix_comments_post_id_created_at_id',
+                     'ix_outbox_txid_id', 'ix_outbox_views_txid_id']
+        )
+
+        with patch('migrate.inspect', return_value=current), patch('migrate.Base.metadata.create_all'), \
+                patch('migrate.reconcile_counters') as reconcile:
+            changes = migrate(engine)
+
+        self.assertEqual(changes, [])
+        reconcile.assert_not_called()
+        engine.connect.assert_not_called()
+
+    def test_keyset_pagination_indexes_built_on_upgrade(self):
+        engine = MagicMock()
+        engine.begin.return_value.__enter__.return_value = self.connection
+        autocommit = MagicMock()
+        engine.connect.return_value.__enter__.return_value = autocommit
+
+        with patch('migrate.inspect', return_value=inspector(indexes=['ix_posts_tags'])), \
+                patch('migrate.Base.metadata.create_all'), \
+                patch('migrate.Session'), patch('migrate.reconcile_counters', return_value=0):
+            migrate(engine)
+
+        created = [str(call[0][0].compile(dialect=postgresql.dialect())) for call in autocommit.execute.call_args_list]
+        self.assertEqual(created, [
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_created_at_id ON posts (created_at DESC, id DESC)',
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_comments_post_id_created_at_id '
+            'ON comments (post_id, created_at DESC, id DESC)'
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
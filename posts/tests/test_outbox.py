@@ -0,0 +1,277 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta
+from itertools import cycle
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql
+from kafka.errors import KafkaConnectionError, KafkaTimeoutError, MessageSizeTooLargeError
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import OutboxEvent
+from outbox import OutboxRelay, ViewAggregator, VIEW_EVENT, delivered_ids
+import event_codec
+
+NOT_VIEWS = OutboxEvent.event_type != VIEW_EVENT
+
+
+def outbox_event(event_id, post_id, attempts=0, user_id=7, created_at=datetime(2025, 1, 1)):
+    return OutboxEvent(
+        id=event_id, topic='post_views', key=str(post_id), event_type='post_view',
+        payload={'user_id': user_id, 'post_id': post_id}, created_at=created_at, attempts=attempts
+    )
+
+
+class TestOutboxRelay(unittest.TestCase):
+
+    def setUp(self):
+        # A round claims the batch in one session and settles it in another
+        self.claim_session = MagicMock(spec=Session)
+        self.settle_session = MagicMock(spec=Session)
+        self.db_session = MagicMock(side_effect=cycle([self.claim_session, self.settle_session]))
+        self.producer = MagicMock()
+        self.relay = OutboxRelay(self.db_session, self.producer, batch_size=10)
+
+    def queue(self, events):
+        # The advisory lock is taken and no other relay's claim is running
+        self.claim_session.execute.return_value.scalar.side_effect = cycle([True, False])
+        self.claim_session.execute.return_value.scalars.return_value.all.return_value = events
+
+    def claim_sql(self):
+        return [str(call[0][0].compile(dialect=postgresql.dialect()))
+                for call in self.claim_session.execute.call_args_list]
+
+    def test_event_data(self):
+        event = outbox_event(1, 3)
+
+        self.assertEqual(event.event_data(), {
+            'event_type': 'post_view', 'user_id': 7, 'post_id': 3, 'timestamp': '2025-01-01T00:00:00'
+        })
+
+    def test_failure_holds_back_later_events_of_the_post(self):
+        events = [outbox_event(1, 1), outbox_event(2, 2), outbox_event(3, 1), outbox_event(4, 2)]
+
+        delivered, failed = delivered_ids(events, [False, True, True, True])
+
+        self.assertEqual(delivered, [2, 4])
+        self.assertEqual(failed, [1])
+
+    def test_lock_held_by_another_relay(self):
+        self.claim_session.execute.return_value.scalar.return_value = False
+
+        self.assertEqual(self.relay.relay_events(NOT_VIEWS), (0, 0))
+
+        self.producer.publish.assert_not_called()
+        self.claim_session.close.assert_called_once()
+
+    def test_batch_claimed_by_another_relay(self):
+        self.claim_session.execute.return_value.scalar.return_value = True
+
+        self.assertEqual(self.relay.relay_events(NOT_VIEWS), (0, 0))
+
+        self.producer.publish.assert_not_called()
+        self.settle_session.execute.assert_not_called()
+
+    def test_only_events_of_finished_transactions_read(self):
+        self.queue([outbox_event(1, 1)])
+        self.producer.publish.return_value = [None]
+
+        self.relay.relay_events(NOT_VIEWS)
+
+        read = self.claim_sql()[2]
+        self.assertIn('AND outbox.txid < txid_snapshot_xmin(txid_current_snapshot())', read)
+        self.assertIn('ORDER BY outbox.txid, outbox.id', read)
+
+    def test_published_outside_of_transactions(self):
+        self.queue([outbox_event(1, 1), outbox_event(2, 2)])
+        self.producer.publish.return_value = [None, None]
+        steps = MagicMock()
+        steps.attach_mock(self.claim_session.commit, 'claim_commit')
+        steps.attach_mock(self.producer.publish, 'publish')
+        steps.attach_mock(self.settle_session.execute, 'settle_execute')
+        steps.attach_mock(self.settle_session.commit, 'settle_commit')
+
+        self.relay.relay_events(NOT_VIEWS)
+
+        self.assertEqual([step[0] for step in steps.mock_calls],
+                         ['claim_commit', 'publish', 'settle_execute', 'settle_execute', 'settle_commit'])
+        claim = self.claim_session.execute.call_args_list[3][0][0]
+        self.assertEqual(claim.table.name, 'outbox')
+        self.assertIn(timedelta(seconds=60), claim.compile().params.values())
+        self.claim_session.expunge_all.assert_called_once()
+
+    def test_delivered_events_deleted(self):
+        self.queue([outbox_event(1, 1), outbox_event(2, 2)])
+        self.producer.publish.return_value = [None, None]
+
+        self.assertEqual(self.relay.relay_events(NOT_VIEWS), (2, 0))
+
+        records = self.producer.publish.call_args[0][0]
+        self.assertEqual([(topic, key) for topic, key, _ in records], [('post_views', '1'), ('post_views', '2')])
+        # Lock, claim check, read and claim, then delete and release of the claim
+        self.assertEqual(self.claim_session.execute.call_count, 4)
+        self.assertEqual(self.settle_session.execute.call_count, 2)
+        self.claim_session.commit.assert_called_once()
+        self.settle_session.commit.assert_called_once()
+
+    def test_rejected_events_kept_for_retry(self):
+        self.queue([outbox_event(1, 1)])
+        self.settle_session.execute.return_value.all.return_value = []
+        self.producer.publish.return_value = [MessageSizeTooLargeError()]
+
+        self.assertEqual(self.relay.relay_events(NOT_VIEWS), (1, 1))
+
+        # Attempts + 1, move of exhausted events and release of the claim
+        self.assertEqual(self.settle_session.execute.call_count, 3)
+        release = self.settle_session.execute.call_args_list[2][0][0]
+        self.assertEqual(release.compile().params, {'claimed_until': None, 'id_1': [1]})
+        self.settle_session.commit.assert_called_once()
+
+    def test_exhausted_events_moved_to_dead_letters(self):
+        self.queue([outbox_event(1, 1, attempts=9)])
+        exhausted = MagicMock(id=1, topic='post_views')
+        exhausted._asdict.return_value = {'id': 1, 'topic': 'post_views', 'attempts': 10}
+        self.settle_session.execute.return_value.all.return_value = [exhausted]
+        self.producer.publish.return_value = [MessageSizeTooLargeError("too large")]
+
+        self.relay.relay_events(NOT_VIEWS)
+
+        statement, rows = self.settle_session.execute.call_args_list[-2][0]
+        self.assertEqual(statement.table.name, 'outbox_dead_letters')
+        self.assertEqual(rows, [{'id': 1, 'topic': 'post_views', 'attempts': 10,
+                                 'error': str(MessageSizeTooLargeError("too large"))}])
+
+    def test_outage_loses_no_events(self):
+        events = [outbox_event(1, 1), outbox_event(2, 2)]
+        self.queue(events)
+        relay = OutboxRelay(self.db_session, self.producer, batch_size=10, retry_interval=5, max_attempts=10)
+
+        # 60 s of retries every retry_interval: first without a producer, then with the broker down
+        outage = [KafkaConnectionError("Kafka producer not initialized")] * 2
+        for attempt in range(int(60 / relay.retry_interval) + 1):
+            self.producer.publish.return_value = outage if attempt < 6 else [KafkaTimeoutError()] * 2
+            self.assertEqual(relay.relay_events(NOT_VIEWS), (2, 2))
+        # Only the claim is released: no attempts counted, nothing deleted or moved
+        self.assertEqual(self.settle_session.execute.call_count, 13)
+        for call in self.settle_session.execute.call_args_list:
+            self.assertEqual(call[0][0].compile().params, {'claimed_until': None, 'id_1': [1, 2]})
+
+        self.settle_session.execute.reset_mock()
+        self.producer.publish.return_value = [None, None]
+        self.assertEqual(relay.relay_events(NOT_VIEWS), (2, 0))
+
+        delete_statement = self.settle_session.execute.call_args_list[0][0][0]
+        self.assertEqual(delete_statement.table.name, 'outbox')
+        self.assertEqual(delete_statement.compile().params, {'id_1': [1, 2]})
+
+
+class TestViewSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.claim_session = MagicMock(spec=Session)
+        self.settle_session = MagicMock(spec=Session)
+        self.claim_session.execute.return_value.scalar.side_effect = cycle([True, False])
+        self.producer = MagicMock()
+        self.relay = OutboxRelay(MagicMock(side_effect=cycle([self.claim_session, self.settle_session])),
+                                 self.producer, batch_size=10, summary_window=60,
+                                 summary_topic='post_view_counts', raw_views_topic='post_views_raw')
+
+    def queue(self, views):
+        self.claim_session.execute.return_value.scalars.return_value.all.return_value = [
+            outbox_event(event_id, post_id, user_id=user_id, created_at=datetime(2025, 1, 1, 0, 0, second))
+            for event_id, (post_id, user_id, second) in enumerate(views, start=1)
+        ]
+
+    def deleted(self):
+        statement = self.settle_session.execute.call_args_list[0][0][0]
+        self.assertEqual(statement.table.name, 'outbox')
+        return statement.compile().params['id_1']
+
+    def test_one_summary_per_post(self):
+        aggregator = ViewAggregator()
+        for post_id, user_id, second in [(1, 10, 5), (1, 11, 1), (1, 10, 9), (2, 10, 3)]:
+            aggregator.add_view(post_id, user_id, datetime(2025, 1, 1, 0, 0, second))
+
+        summaries = aggregator.summaries()
+
+        self.assertEqual({event['post_id']: (event['views'], event['viewers']) for event in summaries},
+                         {1: (3, 2), 2: (1, 1)})
+        self.assertEqual(summaries[0]['window_start_ms'], 1735689601000)
+        self.assertEqual(summaries[0]['window_end_ms'], 1735689609000)
+        self.assertEqual(event_codec.decode(event_codec.encode_protobuf(summaries[0]))['views'], 3)
+
+    def test_summarized_once_the_window_is_over(self):
+        self.queue([(1, 10, 0)])
+        self.producer.publish.side_effect = lambda records: [None] * len(records)
+
+        self.relay.relay_view_summary()
+
+        read = self.claim_session.execute.call_args_list[2][0][0]
+        sql = str(read.compile(dialect=postgresql.dialect()))
+        self.assertIn('outbox.event_type = %(event_type_1)s::VARCHAR AND (EXISTS (SELECT oldest.id', sql)
+        self.assertIn('oldest.created_at <= timezone', sql)
+        self.assertIn(timedelta(seconds=60), read.compile().params.values())
+
+    def test_raw_views_and_summaries_published(self):
+        self.queue([(1, 10, 0), (1, 11, 1), (2, 10, 2)])
+        self.producer.publish.side_effect = lambda records: [None] * len(records)
+
+        self.assertEqual(self.relay.relay_view_summary(), (3, 0))
+
+        raw, summaries = [call[0][0] for call in self.producer.publish.call_args_list]
+        self.assertEqual([(topic, key) for topic, key, _ in raw],
+                         [('post_views_raw', '1'), ('post_views_raw', '1'), ('post_views_raw', '2')])
+        self.assertEqual([(topic, key, event['views']) for topic, key, event in summaries],
+                         [('post_view_counts', '1', 2), ('post_view_counts', '2', 1)])
+        self.assertEqual(self.deleted(), [1, 2, 3])
+
+    def test_views_kept_until_their_summary_is_acknowledged(self):
+        self.queue([(1, 10, 0), (2, 10, 1), (1, 11, 2)])
+        self.producer.publish.side_effect = [[None, None, None], [KafkaTimeoutError(), None]]
+
+        self.assertEqual(self.relay.relay_view_summary(), (3, 2))
+
+        self.assertEqual(self.deleted(), [2])
+        release = self.settle_session.execute.call_args_list[-1][0][0]
+        self.assertEqual(release.compile().params, {'claimed_until': None, 'id_1': [1, 2, 3]})
+
+    def test_view_not_counted_before_its_raw_event_is_delivered(self):
+        self.queue([(1, 10, 0), (2, 10, 1), (1, 11, 2)])
+        self.producer.publish.side_effect = [[KafkaTimeoutError(), None, None], [None]]
+
+        self.assertEqual(self.relay.relay_view_summary(), (3, 1))
+
+        summaries = self.producer.publish.call_args_list[1][0][0]
+        self.assertEqual([(key, event['views']) for _, key, event in summaries], [('2', 1)])
+        self.assertEqual(self.deleted(), [2])
+
+    def test_raw_views_dropped_without_raw_topic(self):
+        self.relay.raw_views_topic = ''
+        self.queue([(1, 10, 0), (1, 10, 1)])
+        self.producer.publish.return_value = [None]
+
+        self.assertEqual(self.relay.relay_view_summary(), (2, 0))
+
+        summaries = self.producer.publish.call_args[0][0]
+        self.assertEqual([(key, event['views'], event['viewers']) for _, key, event in summaries], [('1', 2, 1)])
+        self.producer.publish.assert_called_once()
+
+    def test_views_relayed_apart_from_other_events(self):
+        self.relay.relay_events = MagicMock(return_value=(2, 0))
+        self.relay.relay_view_summary = MagicMock(return_value=(3, 1))
+
+        self.assertEqual(self.relay.relay_batch(), (5, 1))
+        self.relay.summary_window = 0
+        self.relay.relay_batch()
+
+        conditions = [str(call[0][0].compile(dialect=postgresql.dialect()))
+                      for call in self.relay.relay_events.call_args_list]
+        self.assertEqual(conditions, ['outbox.event_type != %(event_type_1)s::VARCHAR'] * 2
+                         + ['outbox.event_type = %(event_type_1)s::VARCHAR'])
+        self.relay.relay_view_summary.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from datetime import datetime, timedelta
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from post_cache import PostCache
+from cache_invalidation import CacheInvalidationListener
+
+
+class TestPostCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = PostCache(max_size=100, ttl=60)
+        self.v1 = datetime(2025, 1, 1, 12, 0, 0)
+        self.v2 = self.v1 + timedelta(seconds=1)
+
+    def test_get_put(self):
+        self.cache.put(1, {'id': 1}, self.v1)
+
+        self.assertEqual(self.cache.get(1), {'id': 1})
+        self.assertIsNone(self.cache.get(2))
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hit_rate(), 0.5)
+
+    def test_expired_entry(self):
+        cache = PostCache(max_size=100, ttl=0.000001)
+        cache.put(1, {'id': 1}, self.v1)
+
+        self.assertIsNone(cache.get(1))
+
+    def test_disabled(self):
+        cache = PostCache(max_size=0, ttl=60)
+        cache.put(1, {'id': 1}, self.v1)
+
+        self.assertFalse(cache.enabled)
+        self.assertIsNone(cache.get(1))
+
+    def test_lru_eviction(self):
+        cache = PostCache(max_size=2, ttl=60)
+        cache.put(1, {'id': 1}, self.v1)
+        cache.put(2, {'id': 2}, self.v1)
+        cache.get(1)
+        cache.put(3, {'id': 3}, self.v1)
+
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertIsNotNone(cache.get(3))
+
+    def test_invalidate_rejects_stale_snapshot(self):
+        self.cache.put(1, {'id': 1, 'title': 'old'}, self.v1)
+        self.cache.invalidate(1, self.v2)
+
+        self.assertIsNone(self.cache.get(1))
+
+        # A reader that loaded the post before the update finishes late
+        self.cache.put(1, {'id': 1, 'title': 'old'}, self.v1)
+        self.assertIsNone(self.cache.get(1))
+
+        self.cache.put(1, {'id': 1, 'title': 'new'}, self.v2)
+        self.assertEqual(self.cache.get(1)['title'], 'new')
+
+    def test_invalidate_keeps_newer_snapshot(self):
+        self.cache.put(1, {'id': 1, 'title': 'new'}, self.v2)
+        self.cache.invalidate(1, self.v1)
+
+        self.assertEqual(self.cache.get(1)['title'], 'new')
+
+    def test_deletion_rejects_every_version(self):
+        self.cache.put(1, {'id': 1}, self.v2)
+        self.cache.invalidate(1)
+        self.cache.invalidate(1, self.v2)
+
+        self.cache.put(1, {'id': 1}, self.v2 + timedelta(seconds=1))
+        self.assertIsNone(self.cache.get(1))
+
+    def test_listener_applies_invalidation(self):
+        listener = CacheInvalidationListener('localhost:9092', 'post_cache_invalidations', self.cache)
+        self.cache.put(1, {'id': 1}, self.v1)
+        self.cache.put(2, {'id': 2}, self.v1)
+
+        listener.apply({'post_id': 1, 'version': self.v2.isoformat()})
+        listener.apply({'post_id': 2, 'version': None})
+
+        self.assertIsNone(self.cache.get(1))
+        self.assertIsNone(self.cache.get(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
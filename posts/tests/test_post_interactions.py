@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import MagicMock, patch
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql
 from datetime import datetime
 import sys
 import os
@@ -8,7 +9,10 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from posts_service import PostsService
-from models import Post, PostView, PostLike, Comment
+from models import Post, Comment, OutboxEvent
+from pagination import encode_cursor, decode_cursor
+from converters import view_batches, record_views_response
+import posts_pb2
 
 
 class TestPostInteractions(unittest.TestCase):
@@ -26,239 +30,163 @@ class TestPostInteractions(unittest.TestCase):
     def tearDown(self):
         self.event_producer_patch.stop()
 
+    def _mock_statement_result(self, found=1, allowed=True, inserted=0, deleted=0):
+        result = MagicMock()
+        result.found = found
+        result.allowed = allowed
+        result.inserted = inserted
+        result.deleted = deleted
+        self.session.execute.return_value.one.return_value = result
+
+    def _executed_sql(self):
+        statement = self.session.execute.call_args[0][0]
+        return str(statement.compile(dialect=postgresql.dialect()))
+
     def test_view_post(self):
-        mock_post = MagicMock(spec=Post)
-        mock_post.id = 1
-        mock_post.user_id = 1
-        mock_post.is_private = False
-        
-        query_post = MagicMock()
-        filter_post = MagicMock()
-        query_post.filter.return_value = filter_post
-        filter_post.first.return_value = mock_post
-        
-        query_view = MagicMock()
-        filter_view1 = MagicMock()
-        filter_view2 = MagicMock()
-        query_view.filter.return_value = filter_view1
-        filter_view1.filter.return_value = filter_view2
-        filter_view2.first.return_value = None
-        
-        def query_side_effect(model):
-            if model == Post:
-                return query_post
-            elif model == PostView:
-                return query_view
-            return MagicMock()
-            
-        self.session.query.side_effect = query_side_effect
+        self._mock_statement_result(inserted=1)
         
         success, message = self.posts_service.view_post(post_id=1, user_id=2)
         
         self.assertTrue(success)
         self.assertIn("viewed successfully", message)
+        self.session.execute.assert_called_once()
+        self.session.query.assert_not_called()
+        self.session.commit.assert_called_once()
+        # The event is queued in the outbox by the same statement
+        self.assertIn("INSERT INTO outbox", self._executed_sql())
+        self.mock_event_producer_instance.send_view_event.assert_not_called()
 
     def test_view_post_already_viewed(self):
-        mock_post = MagicMock(spec=Post)
-        mock_post.id = 1
-        mock_post.user_id = 1
-        mock_post.is_private = False
-        
-        query_post = MagicMock()
-        filter_post = MagicMock()
-        query_post.filter.return_value = filter_post
-        filter_post.first.return_value = mock_post
-        
-        mock_view = MagicMock(spec=PostView)
-        query_view = MagicMock()
-        filter_view1 = MagicMock()
-        filter_view2 = MagicMock()
-        query_view.filter.return_value = filter_view1
-        filter_view1.filter.return_value = filter_view2
-        filter_view2.first.return_value = mock_view
-        
-        def query_side_effect(model):
-            if model == Post:
-                return query_post
-            elif model == PostView:
-                return query_view
-            return MagicMock()
-            
-        self.session.query.side_effect = query_side_effect
+        self._mock_statement_result(inserted=0)
         
         success, message = self.posts_service.view_post(post_id=1, user_id=2)
         
         self.assertTrue(success)
         self.assertIn("viewed successfully", message)
-        self.session.add.assert_not_called()
-        self.session.commit.assert_not_called()
+        self.session.execute.assert_called_once()
         self.mock_event_producer_instance.send_view_event.assert_not_called()
 
     def test_view_private_post_denied(self):
-        mock_post = MagicMock(spec=Post)
-        mock_post.id = 1
-        mock_post.user_id = 1
-        mock_post.is_private = True
-        
-        query = MagicMock()
-        filter_result = MagicMock()
-        query.filter.return_value = filter_result
-        filter_result.first.return_value = mock_post
-        
-        self.session.query.return_value = query
+        self._mock_statement_result(allowed=False)
         
         success, message = self.posts_service.view_post(post_id=1, user_id=2)
         
         self.assertFalse(success)
         self.assertIn("Access denied", message)
-        self.session.add.assert_not_called()
         self.session.commit.assert_not_called()
         self.mock_event_producer_instance.send_view_event.assert_not_called()
 
     def test_view_post_not_found(self):
-        query = MagicMock()
-        filter_result = MagicMock()
-        query.filter.return_value = filter_result
-        filter_result.first.return_value = None
-        
-        self.session.query.return_value = query
+        self._mock_statement_result(found=0, allowed=False)
         
         success, message = self.posts_service.view_post(post_id=999, user_id=2)
         
         self.assertFalse(success)
         self.assertIn("not found", message)
-        self.session.add.assert_not_called()
         self.session.commit.assert_not_called()
         self.mock_event_producer_instance.send_view_event.assert_not_called()
 
+    def test_record_views(self):
+        self.session.execute.return_value.all.return_value = [
+            MagicMock(post_id=1, user_id=2, found=True, allowed=True, inserted=True),
+            MagicMock(post_id=1, user_id=3, found=True, allowed=True, inserted=False),
+            MagicMock(post_id=5, user_id=2, found=True, allowed=False, inserted=False),
+            MagicMock(post_id=9, user_id=2, found=False, allowed=False, inserted=False)
+        ]
+
+        result, error = self.posts_service.record_views([(1, 2), (1, 3), (1, 2), (5, 2), (9, 2)])
+
+        self.assertIsNone(error)
+        self.assertEqual([success for success, _ in result['results']], [True, True, True, False, False])
+        self.assertIn("Access denied", result['results'][3][1])
+        self.assertIn("not found", result['results'][4][1])
+        self.assertEqual(result['recorded'], 1)
+        self.session.execute.assert_called_once()
+        self.session.commit.assert_called_once()
+        self.assertIn("INSERT INTO outbox", self._executed_sql())
+        self.mock_event_producer_instance.send_view_events.assert_not_called()
+
+    def test_record_views_error(self):
+        self.session.execute.side_effect = Exception("Database error")
+
+        result, error = self.posts_service.record_views([(1, 2)])
+
+        self.assertIsNone(result)
+        self.assertEqual(error, "Database error")
+        self.session.rollback.assert_called_once()
+        self.mock_event_producer_instance.send_view_events.assert_not_called()
+
+    def test_view_batches(self):
+        requests = [posts_pb2.ViewPostRequest(post_id=i, user_id=7) for i in range(5)]
+
+        batches = list(view_batches(iter(requests), 2))
+
+        self.assertEqual(batches, [[(0, 7), (1, 7)], [(2, 7), (3, 7)], [(4, 7)]])
+
+    def test_record_views_response_keeps_results_before_error(self):
+        response = record_views_response([(True, "Post viewed successfully")], 1, "Database error")
+
+        self.assertEqual(len(response.results), 1)
+        self.assertTrue(response.results[0].success)
+        self.assertEqual(response.recorded, 1)
+        self.assertEqual(response.error, "Database error")
+
     def test_like_post(self):
-        mock_post = MagicMock(spec=Post)
-        mock_post.id = 1
-        mock_post.user_id = 1
-        mock_post.is_private = False
-        
-        query_post = MagicMock()
-        filter_post = MagicMock()
-        query_post.filter.return_value = filter_post
-        filter_post.first.return_value = mock_post
-        
-        query_like = MagicMock()
-        filter_like1 = MagicMock()
-        filter_like2 = MagicMock()
-        query_like.filter.return_value = filter_like1
-        filter_like1.filter.return_value = filter_like2
-        filter_like2.first.return_value = None
-        
-        def query_side_effect(model):
-            if model == Post:
-                return query_post
-            elif model == PostLike:
-                return query_like
-            return MagicMock()
-            
-        self.session.query.side_effect = query_side_effect
+        self._mock_statement_result(inserted=1)
         
         success, message = self.posts_service.like_post(post_id=1, user_id=2)
         
         self.assertTrue(success)
-        self.assertIn("liked successfully", message)
+        self.assertEqual("Post liked successfully", message)
+        self.session.execute.assert_called_once()
+        self.session.commit.assert_called_once()
+        self.assertIn("INSERT INTO outbox", self._executed_sql())
+        self.mock_event_producer_instance.send_like_event.assert_not_called()
 
     def test_unlike_post(self):
-        mock_post = MagicMock(spec=Post)
-        mock_post.id = 1
-        mock_post.user_id = 1
-        mock_post.is_private = False
-        
-        query_post = MagicMock()
-        filter_post = MagicMock()
-        query_post.filter.return_value = filter_post
-        filter_post.first.return_value = mock_post
-        
-        mock_like = MagicMock(spec=PostLike)
-        query_like = MagicMock()
-        filter_like1 = MagicMock()
-        filter_like2 = MagicMock()
-        query_like.filter.return_value = filter_like1
-        filter_like1.filter.return_value = filter_like2
-        filter_like2.first.return_value = mock_like
-        
-        def query_side_effect(model):
-            if model == Post:
-                return query_post
-            elif model == PostLike:
-                return query_like
-            return MagicMock()
-            
-        self.session.query.side_effect = query_side_effect
+        self._mock_statement_result(deleted=1)
         
         success, message = self.posts_service.like_post(post_id=1, user_id=2)
         
         self.assertTrue(success)
         self.assertIn("unliked successfully", message)
+        self.session.execute.assert_called_once()
+        self.session.commit.assert_called_once()
+        # The unlike event is queued from the deleted row by the same statement
+        self.assertIn("post_unlike_queued AS", self._executed_sql())
+        self.mock_event_producer_instance.send_like_event.assert_not_called()
+
+    def test_like_post_concurrent_duplicate(self):
+        self._mock_statement_result(inserted=0, deleted=0)
+
+        success, message = self.posts_service.like_post(post_id=1, user_id=2)
+
+        self.assertTrue(success)
+        self.assertEqual("Post liked successfully", message)
+        self.mock_event_producer_instance.send_like_event.assert_not_called()
 
     def test_like_private_post_denied(self):
-        mock_post = MagicMock(spec=Post)
-        mock_post.id = 1
-        mock_post.user_id = 1
-        mock_post.is_private = True
-        
-        query = MagicMock()
-        filter_result = MagicMock()
-        query.filter.return_value = filter_result
-        filter_result.first.return_value = mock_post
-        
-        self.session.query.return_value = query
+        self._mock_statement_result(allowed=False)
         
         success, message = self.posts_service.like_post(post_id=1, user_id=2)
         
         self.assertFalse(success)
         self.assertIn("Access denied", message)
-        self.session.add.assert_not_called()
         self.session.commit.assert_not_called()
         self.mock_event_producer_instance.send_like_event.assert_not_called()
 
     def test_like_post_not_found(self):
-        query = MagicMock()
-        filter_result = MagicMock()
-        query.filter.return_value = filter_result
-        filter_result.first.return_value = None
-        
-        self.session.query.return_value = query
+        self._mock_statement_result(found=0, allowed=False)
         
         success, message = self.posts_service.like_post(post_id=999, user_id=2)
         
         self.assertFalse(success)
         self.assertIn("not found", message)
-        self.session.add.assert_not_called()
         self.session.commit.assert_not_called()
         self.mock_event_producer_instance.send_like_event.assert_not_called()
 
     def test_like_post_error(self):
-        mock_post = MagicMock(spec=Post)
-        mock_post.id = 1
-        mock_post.user_id = 1
-        mock_post.is_private = False
-        
-        query_post = MagicMock()
-        filter_post = MagicMock()
-        query_post.filter.return_value = filter_post
-        filter_post.first.return_value = mock_post
-        
-        query_like = MagicMock()
-        filter_like1 = MagicMock()
-        filter_like2 = MagicMock()
-        query_like.filter.return_value = filter_like1
-        filter_like1.filter.return_value = filter_like2
-        filter_like2.first.return_value = None
-        
-        def query_side_effect(model):
-            if model == Post:
-                return query_post
-            elif model == PostLike:
-                return query_like
-            return MagicMock()
-            
-        self.session.query.side_effect = query_side_effect
+        self._mock_statement_result(inserted=1)
         
         self.session.commit.side_effect = Exception("Database error")
         
@@ -266,6 +194,8 @@ class TestPostInteractions(unittest.TestCase):
         
         self.assertFalse(success)
         self.assertIn("Database error", message)
+        self.session.rollback.assert_called_once()
+        self.mock_event_producer_instance.send_like_event.assert_not_called()
 
     def test_create_comment(self):
         mock_post = MagicMock(spec=Post)
@@ -295,7 +225,6 @@ class TestPostInteractions(unittest.TestCase):
         mock_comment.user_id = 2
         mock_comment.content = 'Test comment'
         mock_comment.created_at = now
-        mock_comment.to_dict.return_value = expected_result
         
         with patch('posts_service.Comment', return_value=mock_comment):
             result, error = self.posts_service.create_comment(
@@ -304,13 +233,15 @@ class TestPostInteractions(unittest.TestCase):
                 content='Test comment'
             )
             
-            self.assertEqual(result, expected_result)
+            self.assertEqual(result.to_dict(), expected_result)
             self.assertIsNone(error)
-            self.session.add.assert_called_once()
+            self.assertEqual(self.session.add.call_count, 2)
+            event = self.session.add.call_args_list[1][0][0]
+            self.assertIsInstance(event, OutboxEvent)
+            self.assertEqual(event.key, '1')
+            self.assertEqual(event.payload, {'user_id': 2, 'post_id': 1, 'comment_id': 1})
             self.session.commit.assert_called_once()
-            self.mock_event_producer_instance.send_comment_event.assert_called_once_with(
-                user_id=2, post_id=1, comment_id=1
-            )
+            self.mock_event_producer_instance.send_comment_event.assert_not_called()
 
     def test_create_comment_on_private_post_denied(self):
         mock_post = MagicMock(spec=Post)
@@ -380,72 +311,39 @@ class TestPostInteractions(unittest.TestCase):
         
         self.assertIsNone(result)
         self.assertIn("Database error", error)
-        self.session.add.assert_called_once()
+        self.assertEqual(self.session.add.call_count, 2)
         self.session.rollback.assert_called_once()
         self.mock_event_producer_instance.send_comment_event.assert_not_called()
 
+    def _mock_comment(self, comment_id, user_id, content, created_at):
+        mock_comment = MagicMock(spec=Comment)
+        mock_comment.id = comment_id
+        mock_comment.post_id = 1
+        mock_comment.user_id = user_id
+        mock_comment.content = content
+        mock_comment.created_at = created_at
+        return mock_comment
+
+    def _mock_comment_queries(self, comments, post_row):
+        query_comments = MagicMock()
+        ordered = query_comments.filter.return_value.order_by.return_value
+        ordered.offset.return_value.limit.return_value.all.return_value = comments
+        ordered.filter.return_value.limit.return_value.all.return_value = comments
+
+        self.session.query.return_value = query_comments
+        self.session.execute.return_value.first.return_value = post_row
+        return ordered
+
     def test_list_comments(self):
-        mock_post = MagicMock(spec=Post)
-        mock_post.id = 1
-        
-        query_post = MagicMock()
-        filter_post = MagicMock()
-        query_post.filter.return_value = filter_post
-        filter_post.first.return_value = mock_post
-        
         now = datetime.utcnow()
-        
-        mock_comment1 = MagicMock(spec=Comment)
-        mock_comment1.id = 1
-        mock_comment1.post_id = 1
-        mock_comment1.user_id = 2
-        mock_comment1.content = 'First comment'
-        mock_comment1.created_at = now
-        mock_comment1.to_dict.return_value = {
-            'id': 1,
-            'post_id': 1,
-            'user_id': 2,
-            'content': 'First comment',
-            'created_at': now.isoformat()
-        }
-        
-        mock_comment2 = MagicMock(spec=Comment)
-        mock_comment2.id = 2
-        mock_comment2.post_id = 1
-        mock_comment2.user_id = 3
-        mock_comment2.content = 'Second comment'
-        mock_comment2.created_at = now
-        mock_comment2.to_dict.return_value = {
-            'id': 2,
-            'post_id': 1,
-            'user_id': 3,
-            'content': 'Second comment',
-            'created_at': now.isoformat()
-        }
-        
-        query_comments = MagicMock()
-        filter_comments = MagicMock()
-        count_result = MagicMock()
-        order_by_result = MagicMock()
-        offset_result = MagicMock()
-        limit_result = MagicMock()
-        
-        query_comments.filter.return_value = filter_comments
-        filter_comments.count.return_value = 2
-        filter_comments.order_by.return_value = order_by_result
-        order_by_result.offset.return_value = offset_result
-        offset_result.limit.return_value = limit_result
-        limit_result.all.return_value = [mock_comment1, mock_comment2]
-        
-        def query_side_effect(model):
-            if model == Post:
-                return query_post
-            elif model == Comment:
-                return query_comments
-            return MagicMock()
-            
-        self.session.query.side_effect = query_side_effect
-        
+        comments = [
+            self._mock_comment(1, 2, 'First comment', now),
+            self._mock_comment(2, 3, 'Second comment', now)
+        ]
+        post_row = MagicMock()
+        post_row.comments_count = 2
+        self._mock_comment_queries(comments, post_row)
+
         result, error = self.posts_service.list_comments(post_id=1, page=1, per_page=10)
         
         self.assertIsNotNone(result)
@@ -454,25 +352,45 @@ class TestPostInteractions(unittest.TestCase):
         self.assertEqual(result['total_count'], 2)
         self.assertEqual(result['page'], 1)
         self.assertEqual(result['total_pages'], 1)
+        self.assertFalse(result['has_more'])
+        self.assertIsNone(result['next_cursor'])
         
-        self.assertEqual(result['comments'][0]['id'], 1)
-        self.assertEqual(result['comments'][0]['content'], 'First comment')
-        self.assertEqual(result['comments'][1]['id'], 2)
-        self.assertEqual(result['comments'][1]['content'], 'Second comment')
+        self.assertEqual(result['comments'][0].id, 1)
+        self.assertEqual(result['comments'][0].content, 'First comment')
+        self.assertEqual(result['comments'][1].id, 2)
+        self.assertEqual(result['comments'][1].content, 'Second comment')
+
+    def test_list_comments_with_cursor_single_query(self):
+        now = datetime.utcnow()
+        comments = [
+            self._mock_comment(9, 2, 'Newer', now),
+            self._mock_comment(8, 3, 'Older', now),
+            self._mock_comment(7, 4, 'Oldest', now)
+        ]
+        ordered = self._mock_comment_queries(comments, None)
+
+        result, error = self.posts_service.list_comments(
+            post_id=1,
+            per_page=2,
+            cursor=encode_cursor(now, 10),
+            with_count=False
+        )
+
+        self.assertIsNone(error)
+        self.assertEqual([comment.id for comment in result['comments']], [9, 8])
+        self.assertTrue(result['has_more'])
+        self.assertEqual(decode_cursor(result['next_cursor']), (now, 8))
+        self.assertIsNone(result['total_count'])
+        ordered.offset.assert_not_called()
+        self.session.execute.assert_not_called()
 
     def test_list_comments_post_not_found(self):
-        query = MagicMock()
-        filter_result = MagicMock()
-        query.filter.return_value = filter_result
-        filter_result.first.return_value = None
-        
-        self.session.query.return_value = query
+        self._mock_comment_queries([], None)
         
         result, error = self.posts_service.list_comments(post_id=999, page=1, per_page=10)
         
         self.assertIsNone(result)
         self.assertIn("not found", error)
 
-
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,5 +1,7 @@
 import unittest
 from unittest.mock import MagicMock, patch
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import Session
 from datetime import datetime
 import sys
@@ -7,17 +9,33 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from posts_service import PostsService
-from models import Post
+from posts_service import PostsService, merge_tags
+from models import Post, PostCounters, PostRow
+from queries import post_rows
+from pagination import encode_cursor, decode_cursor
+
+
+def post_row(post_id, user_id=1, is_private=False, created_at=None):
+    """A result row of queries.post_rows, in POST_ROW_COLUMNS order"""
+    created_at = created_at or datetime(2025, 3, 1, 12, 0, 0)
+    return (post_id, f'Post {post_id}', 'Description', user_id, is_private, [],
+            created_at, created_at, 0, 0, 0)
 
 
 class TestPostsService(unittest.TestCase):
 
     def setUp(self):
+        self.event_producer_patch = patch('posts_service.EventProducer')
+        self.mock_event_producer = self.event_producer_patch.start()
+        self.mock_event_producer_instance = self.mock_event_producer.return_value
+
         self.session = MagicMock(spec=Session)
         self.db_session = MagicMock(return_value=self.session)
         self.posts_service = PostsService(self.db_session)
 
+    def tearDown(self):
+        self.event_producer_patch.stop()
+
     def test_create_post_fixed(self):
         session = MagicMock()
         self.db_session.return_value = session
@@ -31,7 +49,10 @@ class TestPostsService(unittest.TestCase):
             'is_private': False,
             'tags': ['test'],
             'created_at': now.isoformat(),
-            'updated_at': now.isoformat()
+            'updated_at': now.isoformat(),
+            'likes_count': 0,
+            'views_count': 0,
+            'comments_count': 0
         }
 
         mock_post = MagicMock()
@@ -43,7 +64,7 @@ class TestPostsService(unittest.TestCase):
         mock_post.tags = ['test']
         mock_post.created_at = now
         mock_post.updated_at = now
-        mock_post.to_dict.return_value = expected_result
+        mock_post.counters = None
 
         with patch('posts_service.Post', return_value=mock_post):
             result, error = self.posts_service.create_post(
@@ -54,7 +75,7 @@ class TestPostsService(unittest.TestCase):
                 tags=['test']
             )
 
-            self.assertEqual(result, expected_result)
+            self.assertEqual(result.to_dict(), expected_result)
             self.assertIsNone(error)
             session.add.assert_called_once()
             session.commit.assert_called_once()
@@ -91,17 +112,7 @@ class TestPostsService(unittest.TestCase):
         mock_post.tags = ['test']
         mock_post.created_at = datetime.utcnow()
         mock_post.updated_at = datetime.utcnow()
-
-        mock_post.to_dict.return_value = {
-            'id': mock_post.id,
-            'title': mock_post.title,
-            'description': mock_post.description,
-            'user_id': mock_post.user_id,
-            'is_private': mock_post.is_private,
-            'tags': mock_post.tags,
-            'created_at': mock_post.created_at.isoformat(),
-            'updated_at': mock_post.updated_at.isoformat()
-        }
+        mock_post.counters = PostCounters(likes_count=3, views_count=10, comments_count=2)
 
         self.session.query.return_value.filter.return_value.first.return_value = mock_post
 
@@ -109,14 +120,16 @@ class TestPostsService(unittest.TestCase):
 
         self.assertIsNotNone(result)
         self.assertIsNone(error)
-        self.assertEqual(result['id'], 1)
-        self.assertEqual(result['title'], 'Test Post')
+        self.assertEqual(result.id, 1)
+        self.assertEqual(result.title, 'Test Post')
+        self.assertEqual(result.likes_count, 3)
 
     def test_get_private_post_denied(self):
         mock_post = MagicMock(spec=Post)
         mock_post.id = 1
         mock_post.is_private = True
         mock_post.user_id = 1
+        mock_post.updated_at = datetime.utcnow()
 
         self.session.query.return_value.filter.return_value.first.return_value = mock_post
 
@@ -126,6 +139,53 @@ class TestPostsService(unittest.TestCase):
         self.assertIsNotNone(error)
         self.assertIn("Access denied", error)
 
+    def test_get_post_served_from_cache(self):
+        mock_post = MagicMock(spec=Post)
+        mock_post.id = 1
+        mock_post.user_id = 1
+        mock_post.is_private = True
+        mock_post.updated_at = datetime.utcnow()
+
+        self.session.query.return_value.filter.return_value.first.return_value = mock_post
+
+        first, _ = self.posts_service.get_post(post_id=1, user_id=1)
+        second, _ = self.posts_service.get_post(post_id=1, user_id=1)
+        denied, error = self.posts_service.get_post(post_id=1, user_id=2)
+
+        self.assertEqual(first, second)
+        self.assertIsNone(denied)
+        self.assertIn("Access denied", error)
+        self.db_session.assert_called_once()
+        self.assertEqual(self.posts_service.post_cache.hits, 2)
+
+    def test_batch_get_posts(self):
+        rows = self.session.query.return_value.with_entities.return_value.outerjoin.return_value
+        rows.filter.return_value.all.return_value = [
+            post_row(2, user_id=2, is_private=True),
+            post_row(1, user_id=2)
+        ]
+
+        results, error = self.posts_service.batch_get_posts(post_ids=[3, 1, 2, 1], user_id=5)
+
+        self.assertIsNone(error)
+        self.assertEqual(
+            [(post.id if post else None, item_error) for post, item_error in results],
+            [
+                (None, "Post not found"),
+                (1, None),
+                (None, "Access denied: this post is private"),
+                (1, None)
+            ]
+        )
+        self.session.query.assert_called_once_with(Post)
+
+    def test_batch_get_posts_too_many_ids(self):
+        results, error = self.posts_service.batch_get_posts(post_ids=list(range(1000)), user_id=1)
+
+        self.assertIsNone(results)
+        self.assertIn("Too many post ids", error)
+        self.db_session.assert_not_called()
+
     def test_update_post(self):
         mock_post = MagicMock(spec=Post)
         mock_post.id = 1
@@ -137,17 +197,6 @@ class TestPostsService(unittest.TestCase):
         mock_post.created_at = datetime.utcnow()
         mock_post.updated_at = datetime.utcnow()
 
-        mock_post.to_dict.return_value = {
-            'id': mock_post.id,
-            'title': 'Updated Title',
-            'description': mock_post.description,
-            'user_id': mock_post.user_id,
-            'is_private': mock_post.is_private,
-            'tags': mock_post.tags,
-            'created_at': mock_post.created_at.isoformat(),
-            'updated_at': mock_post.updated_at.isoformat()
-        }
-
         self.session.query.return_value.filter.return_value.first.return_value = mock_post
 
         result, error = self.posts_service.update_post(
@@ -158,8 +207,13 @@ class TestPostsService(unittest.TestCase):
 
         self.assertIsNotNone(result)
         self.assertIsNone(error)
-        self.assertEqual(result['title'], 'Updated Title')
+        self.assertEqual(result.title, 'Updated Title')
         self.session.commit.assert_called_once()
+        self.mock_event_producer_instance.send_cache_invalidation_event.assert_called_once_with(
+            'post_cache_invalidations',
+            post_id=1,
+            version=mock_post.updated_at
+        )
 
     def test_update_post_not_owner(self):
         mock_post = MagicMock(spec=Post)
@@ -191,6 +245,11 @@ class TestPostsService(unittest.TestCase):
         self.assertIn("successfully", message)
         self.session.delete.assert_called_once_with(mock_post)
         self.session.commit.assert_called_once()
+        self.mock_event_producer_instance.send_cache_invalidation_event.assert_called_once_with(
+            'post_cache_invalidations',
+            post_id=1,
+            version=None
+        )
 
     def test_delete_post_not_found(self):
         self.session.query.return_value.filter.return_value.first.return_value = None
@@ -201,51 +260,10 @@ class TestPostsService(unittest.TestCase):
         self.assertIn("not found", message)
 
     def test_list_posts(self):
-        mock_post1 = MagicMock(spec=Post)
-        mock_post1.id = 1
-        mock_post1.title = 'Post 1'
-        mock_post1.description = 'Description 1'
-        mock_post1.user_id = 1
-        mock_post1.is_private = False
-        mock_post1.tags = ['tag1']
-        mock_post1.created_at = datetime.utcnow()
-        mock_post1.updated_at = datetime.utcnow()
-
-        mock_post1.to_dict.return_value = {
-            'id': mock_post1.id,
-            'title': mock_post1.title,
-            'description': mock_post1.description,
-            'user_id': mock_post1.user_id,
-            'is_private': mock_post1.is_private,
-            'tags': mock_post1.tags,
-            'created_at': mock_post1.created_at.isoformat(),
-            'updated_at': mock_post1.updated_at.isoformat()
-        }
-
-        mock_post2 = MagicMock(spec=Post)
-        mock_post2.id = 2
-        mock_post2.title = 'Post 2'
-        mock_post2.description = 'Description 2'
-        mock_post2.user_id = 2
-        mock_post2.is_private = False
-        mock_post2.tags = ['tag2']
-        mock_post2.created_at = datetime.utcnow()
-        mock_post2.updated_at = datetime.utcnow()
-
-        mock_post2.to_dict.return_value = {
-            'id': mock_post2.id,
-            'title': mock_post2.title,
-            'description': mock_post2.description,
-            'user_id': mock_post2.user_id,
-            'is_private': mock_post2.is_private,
-            'tags': mock_post2.tags,
-            'created_at': mock_post2.created_at.isoformat(),
-            'updated_at': mock_post2.updated_at.isoformat()
-        }
-
-        self.session.query.return_value.filter.return_value.count.return_value = 2
-        self.session.query.return_value.filter.return_value.order_by.return_value.offset.return_value.limit.return_value.all.return_value = [
-            mock_post1, mock_post2]
+        filtered = self.session.query.return_value.filter.return_value
+        filtered.count.return_value = 2
+        filtered.with_entities.return_value.outerjoin.return_value.order_by.return_value.offset.return_value.limit.return_value.all.return_value = [
+            post_row(1), post_row(2, user_id=2)]
 
         result, error = self.posts_service.list_posts(page=1, per_page=10)
 
@@ -255,6 +273,185 @@ class TestPostsService(unittest.TestCase):
         self.assertEqual(result['total_count'], 2)
         self.assertEqual(result['page'], 1)
 
+    def test_list_posts_with_cursor(self):
+        created_at = datetime(2025, 3, 1, 12, 0, 0)
+        rows = self.session.query.return_value.filter.return_value.with_entities.return_value.outerjoin.return_value
+        ordered = rows.order_by.return_value
+        ordered.filter.return_value.limit.return_value.all.return_value = [
+            post_row(post_id, created_at=created_at) for post_id in (5, 4, 3)]
+
+        result, error = self.posts_service.list_posts(
+            per_page=2,
+            cursor=encode_cursor(created_at, 6),
+            count_mode='none'
+        )
+
+        self.assertIsNone(error)
+        self.assertEqual([post.id for post in result['posts']], [5, 4])
+        self.assertTrue(result['has_more'])
+        self.assertEqual(decode_cursor(result['next_cursor']), (created_at, 4))
+        self.assertIsNone(result['total_count'])
+        ordered.offset.assert_not_called()
+        ordered.filter.return_value.limit.assert_called_once_with(3)
+        self.session.query.return_value.filter.return_value.count.assert_not_called()
+
+    def test_list_posts_invalid_cursor(self):
+        result, error = self.posts_service.list_posts(cursor='not a cursor')
+
+        self.assertIsNone(result)
+        self.assertEqual(error, "Invalid cursor")
+        self.db_session.assert_not_called()
+
+    def test_stream_posts(self):
+        created_at = datetime(2025, 3, 1, 12, 0, 0)
+        self.session.execute.return_value = [post_row(post_id, created_at=created_at) for post_id in (1, 2)]
+
+        stream, error = self.posts_service.stream_posts(author_id=3, batch_size=10)
+        results = list(stream)
+
+        self.assertIsNone(error)
+        self.assertEqual([post.id for post, _ in results], [1, 2])
+        self.assertEqual(decode_cursor(results[-1][1]), (created_at, 2))
+        self.session.close.assert_called_once()
+
+    def test_stream_posts_reads_requested_columns(self):
+        created_at = datetime(2025, 3, 1, 12, 0, 0)
+        row = MagicMock()
+        row._mapping = {'id': 1, 'user_id': 3, 'is_private': False, 'created_at': created_at,
+                        'title': 'Post 1', 'excerpt': 'Desc'}
+        self.session.execute.return_value = [row]
+
+        stream, error = self.posts_service.stream_posts(
+            author_id=3, fields=frozenset({'title', 'excerpt'}), excerpt_length=4
+        )
+        [(post, cursor)] = list(stream)
+
+        self.assertIsNone(error)
+        self.assertEqual((post.title, post.excerpt), ('Post 1', 'Desc'))
+        self.assertIsNone(post.description)
+        self.assertEqual(decode_cursor(cursor), (created_at, 1))
+        statement = self.session.execute.call_args[0][0]
+        self.assertEqual([column.name for column in statement.selected_columns],
+                         ['id', 'title', 'user_id', 'is_private', 'created_at', 'excerpt'])
+        self.assertNotIn('post_counters', str(statement.compile(dialect=postgresql.dialect())))
+
+    def test_stream_posts_unknown_field(self):
+        stream, error = self.posts_service.stream_posts(fields=frozenset({'password'}))
+
+        self.assertIsNone(stream)
+        self.assertEqual(error, "Invalid field mask: unknown fields password")
+        self.db_session.assert_not_called()
+
+    def test_stream_posts_invalid_cursor(self):
+        stream, error = self.posts_service.stream_posts(cursor='not a cursor')
+
+        self.assertIsNone(stream)
+        self.assertEqual(error, "Invalid cursor")
+
+    def test_merge_tags(self):
+        self.assertEqual(merge_tags(None, None), [])
+        self.assertEqual(merge_tags('python', None), ['python'])
+        self.assertEqual(merge_tags('python', ['sql', 'python']), ['sql', 'python'])
+
+    def test_list_posts_filters_by_all_tags(self):
+        tagged = self.session.query.return_value.filter.return_value
+        tagged.filter.return_value.count.return_value = 0
+        tagged.filter.return_value.with_entities.return_value.outerjoin.return_value.order_by.return_value.offset.return_value.limit.return_value.all.return_value = []
+
+        result, error = self.posts_service.list_posts(tags=['python', 'sql'], match_all=True)
+
+        self.assertIsNone(error)
+        tag_filter = self.session.query.return_value.filter.call_args[0][0]
+        self.assertEqual(tag_filter.operator.opstring, '@>')
+
+    def test_get_post_sparse_reads_requested_columns(self):
+        row = MagicMock()
+        row._mapping = {'id': 1, 'user_id': 1, 'is_private': False,
+                        'created_at': datetime(2025, 3, 1), 'title': 'Post 1', 'excerpt': 'Desc'}
+        self.session.execute.return_value.first.return_value = row
+
+        result, error = self.posts_service.get_post(
+            post_id=1, user_id=2, fields=frozenset({'title', 'excerpt'}), excerpt_length=4
+        )
+
+        self.assertIsNone(error)
+        self.assertEqual(result.title, 'Post 1')
+        self.assertEqual(result.excerpt, 'Desc')
+        self.assertIsNone(result.description)
+        self.session.query.assert_not_called()
+        self.assertIsNone(self.posts_service.post_cache.get(1))
+
+    def test_get_post_excerpt_from_cached_post(self):
+        created_at = datetime(2025, 3, 1)
+        self.posts_service.post_cache.put(
+            1, PostRow(1, 'Post', 'A long description', 1, False, [], created_at, created_at), created_at
+        )
+
+        result, error = self.posts_service.get_post(
+            post_id=1, user_id=1, fields=frozenset({'excerpt'}), excerpt_length=6
+        )
+
+        self.assertIsNone(error)
+        self.assertEqual(result.excerpt, 'A long')
+        self.assertIsNone(self.posts_service.post_cache.get(1).excerpt)
+        self.db_session.assert_not_called()
+
+    def test_list_posts_unknown_field(self):
+        result, error = self.posts_service.list_posts(fields=frozenset({'title', 'password'}))
+
+        self.assertIsNone(result)
+        self.assertEqual(error, "Invalid field mask: unknown fields password")
+        self.db_session.assert_not_called()
+
+    def test_post_rows_selects_requested_columns(self):
+        statement = post_rows(select(Post), frozenset({'title', 'excerpt'}), 100)
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+
+        self.assertEqual([column.name for column in statement.selected_columns],
+                         ['id', 'title', 'user_id', 'is_private', 'created_at', 'excerpt'])
+        self.assertIn('left(posts.description', sql)
+        self.assertNotIn('post_counters', sql)
+
+        with_counters = str(post_rows(select(Post), frozenset({'likes_count'})).compile(
+            dialect=postgresql.dialect()))
+        self.assertIn('LEFT OUTER JOIN post_counters', with_counters)
+
+    def test_cursor_round_trip(self):
+        created_at = datetime(2025, 3, 1, 12, 0, 0, 123456)
+
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+
+    def test_post_to_dict_reads_counters(self):
+        now = datetime.utcnow()
+        post = Post(
+            id=1,
+            title='Post',
+            description='Description',
+            user_id=1,
+            is_private=False,
+            tags=[],
+            created_at=now,
+            updated_at=now,
+            counters=PostCounters(likes_count=3, views_count=10, comments_count=2)
+        )
+
+        result = post.to_dict()
+
+        self.assertEqual(result['likes_count'], 3)
+        self.assertEqual(result['views_count'], 10)
+        self.assertEqual(result['comments_count'], 2)
+
+    def test_post_to_dict_without_counters(self):
+        now = datetime.utcnow()
+        post = Post(id=1, title='Post', description='Description', user_id=1,
+                    is_private=False, tags=[], created_at=now, updated_at=now)
+
+        result = post.to_dict()
+
+        self.assertEqual(result['likes_count'], 0)
+        self.assertEqual(result['views_count'], 0)
+        self.assertEqual(result['comments_count'], 0)
+
 
 if __name__ == '__main__':
     unittest.main()
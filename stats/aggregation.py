@@ -0,0 +1,67 @@
+"""In-memory aggregation of a micro-batch of post events.
+
+Every record of a batch is decoded (JSON or protobuf, see event_codec.py)
+and folded into per-post deltas, so a batch of any size ends up as one row
+per post and table.
+"""
+from collections import Counter
+import logging
+from google.protobuf.message import DecodeError
+import event_codec
+import metrics
+
+
+class StatsBatch:
+    """Per-post deltas of the events of a batch.
+
+    views, likes and comments count the events per post id (a
+    post_view_summary adds its views, a post_unlike takes a like back, so a
+    delta can be negative or zero); view_rows are the raw post_view events
+    for the post_views table; offsets is the last offset added per (topic,
+    partition).
+    """
+
+    def __init__(self):
+        self.views = Counter()
+        self.likes = Counter()
+        self.comments = Counter()
+        self.view_rows = []
+        self.offsets = {}
+        self.applied = Counter()
+
+    def add_record(self, record):
+        """Add a Kafka record; returns False when it is not a post event it can count"""
+        self.offsets[(record.topic, record.partition)] = record.offset
+        try:
+            added = self.add(event_codec.decode(record.value))
+        except (ValueError, KeyError, TypeError, DecodeError) as e:
+            logging.error(f"Invalid event at {record.topic}/{record.partition}@{record.offset}: {str(e)}")
+            added = False
+
+        if added:
+            self.applied[record.topic] += 1
+        else:
+            metrics.EVENTS.labels(record.topic, 'invalid').inc()
+        return added
+
+    def add(self, event_data):
+        event_type = event_data.get('event_type')
+        post_id = event_data['post_id']
+        if event_type == 'post_view':
+            self.views[post_id] += 1
+            self.view_rows.append({
+                'post_id': post_id,
+                'user_id': event_data['user_id'],
+                'timestamp': event_data['timestamp']
+            })
+        elif event_type == 'post_view_summary':
+            self.views[post_id] += event_data['views']
+        elif event_type == 'post_like':
+            self.likes[post_id] += 1
+        elif event_type == 'post_unlike':
+            self.likes[post_id] -= 1
+        elif event_type == 'post_comment':
+            self.comments[post_id] += 1
+        else:
+            return False
+        return True
@@ -0,0 +1,35 @@
+from consumer import StatsConsumer, create_consumer
+from models import init_db
+from metrics import start_metrics_server
+from config import Config
+import logging
+import signal
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+def main():
+    start_metrics_server()
+    stats_consumer = StatsConsumer(
+        create_consumer(),
+        init_db(Config.DATABASE_URL),
+        Config.STATS_TOPICS,
+        max_batch_size=Config.STATS_BATCH_MAX_SIZE,
+        max_latency=Config.STATS_BATCH_MAX_LATENCY_MS / 1000,
+        retry_interval=Config.STATS_RETRY_INTERVAL
+    )
+
+    # The pending batch is applied and committed before exiting
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stats_consumer.stop())
+
+    logging.info("Stats service started")
+    stats_consumer.run()
+    logging.info("Stats service stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+from kafka import KafkaConsumer, ConsumerRebalanceListener
+from kafka.structs import OffsetAndMetadata, TopicPartition
+from store import apply_records
+from config import Config
+import metrics
+import logging
+import threading
+import time
+
+
+def create_consumer():
+    return KafkaConsumer(
+        bootstrap_servers=Config.KAFKA_BOOTSTRAP_SERVERS,
+        api_version=Config.KAFKA_API_VERSION,
+        group_id=Config.KAFKA_GROUP_ID,
+        enable_auto_commit=False,
+        auto_offset_reset='earliest',
+        max_poll_records=Config.STATS_BATCH_MAX_SIZE
+    )
+
+
+def commit_offsets(records):
+    """Offsets to commit after records: the one after the last record of each partition"""
+    offsets = {}
+    for record in records:
+        offsets[TopicPartition(record.topic, record.partition)] = OffsetAndMetadata(record.offset + 1, '', -1)
+    return offsets
+
+
+class StatsConsumer(ConsumerRebalanceListener):
+    """Applies the post events of the subscribed topics to the stats tables in micro-batches.
+
+    Records are polled until the batch holds max_batch_size of them or its
+    first record waited max_latency seconds, then applied in one transaction
+    (apply_records) and only after its commit are the offsets committed to
+    Kafka. A batch the database rejects is retried every retry_interval
+    seconds without polling further. The pending batch is also applied before
+    partitions are revoked in a rebalance and on stop.
+    """
+
+    def __init__(self, consumer, db_session, topics, max_batch_size=5000, max_latency=1.0, retry_interval=5):
+        self.consumer = consumer
+        self.db_session = db_session
+        self.topics = topics
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.retry_interval = retry_interval
+        self.records = []
+        self.batch_started = None
+        self._stopped = threading.Event()
+
+    def run(self):
+        self.consumer.subscribe(self.topics, listener=self)
+        logging.info(f"Consuming {', '.join(self.topics)} in batches of up to {self.max_batch_size} records")
+        try:
+            while not self._stopped.is_set():
+                self.poll()
+                if self.batch_due():
+                    self.flush()
+            self.flush()
+        finally:
+            self.consumer.close(autocommit=False)
+
+    def poll(self):
+        timeout = self.max_latency
+        if self.batch_started is not None:
+            timeout = max(self.batch_started + self.max_latency - time.monotonic(), 0)
+        polled = self.consumer.poll(
+            timeout_ms=int(timeout * 1000),
+            max_records=max(self.max_batch_size - len(self.records), 1)
+        )
+        for records in polled.values():
+            self.records.extend(records)
+        if self.records and self.batch_started is None:
+            self.batch_started = time.monotonic()
+
+    def batch_due(self):
+        if not self.records:
+            return False
+        return (len(self.records) >= self.max_batch_size
+                or time.monotonic() - self.batch_started >= self.max_latency)
+
+    def flush(self):
+        """Apply the pending batch, then commit its offsets; False when stopped before it was applied"""
+        if not self.records:
+            return True
+
+        while True:
+            try:
+                apply_records(self.db_session, self.records)
+                break
+            except Exception as e:
+                metrics.BATCH_FAILURES.inc()
+                logging.error(f"Failed to apply a batch of {len(self.records)} events: {str(e)}")
+                if self._stopped.wait(self.retry_interval):
+                    return False
+
+        records = self.records
+        self.records = []
+        self.batch_started = None
+        try:
+            self.consumer.commit(commit_offsets(records))
+        except Exception as e:
+            # Read again after the rebalance and skipped by their stored offsets
+            logging.warning(f"Offset commit failed after applying {len(records)} events: {str(e)}")
+        return True
+
+    def on_partitions_revoked(self, revoked):
+        self.flush()
+
+    def on_partitions_assigned(self, assigned):
+        logging.info(f"Assigned partitions: {', '.join(f'{tp.topic}/{tp.partition}' for tp in assigned)}")
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,101 @@
+"""Serialization of the Kafka events, for producers and consumers.
+
+Events are dicts such as {'event_type': 'post_view', 'user_id': 1,
+'post_id': 2, 'timestamp': '2025-01-01T12:00:00.123456'}. They are written as
+JSON to their topic, as it has always been done, and as events.proto messages
+to the topic with PROTOBUF_TOPIC_SUFFIX; EVENT_FORMAT=dual writes both while
+consumers move over. decode() reads either format.
+
+The users and stats services have copies of this module and of
+events_pb2.py, keep them in sync.
+"""
+import json
+from datetime import datetime, timedelta, timezone
+import events_pb2
+
+SCHEMA_VERSION = 1
+PROTOBUF_TOPIC_SUFFIX = '.pb'
+EVENT_FORMATS = ('json', 'protobuf', 'dual')
+
+EVENT_MESSAGES = {
+    'post_view': events_pb2.PostViewEvent,
+    'post_like': events_pb2.PostLikeEvent,
+    'post_unlike': events_pb2.PostUnlikeEvent,
+    'post_comment': events_pb2.PostCommentEvent,
+    'post_view_summary': events_pb2.PostViewSummaryEvent,
+    'user_registration': events_pb2.UserRegistrationEvent
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_millis(value):
+    """Epoch milliseconds of a datetime or ISO string, naive values being UTC"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // timedelta(milliseconds=1)
+
+
+def from_millis(millis):
+    """Naive UTC datetime of epoch milliseconds"""
+    return _EPOCH + timedelta(milliseconds=millis)
+
+
+def encode_json(event_data):
+    return json.dumps(event_data).encode('utf-8')
+
+
+def encode_protobuf(event_data):
+    message = EVENT_MESSAGES[event_data['event_type']]()
+    message.header.schema_version = SCHEMA_VERSION
+    message.header.event_type = event_data['event_type']
+    message.header.timestamp_ms = to_millis(event_data['timestamp'])
+    for name, value in event_data.items():
+        if name not in ('event_type', 'timestamp'):
+            setattr(message, name, value)
+    return message.SerializeToString()
+
+
+def encode(event_data, event_format):
+    """(topic suffix, value) pairs an event is written as in event_format.
+
+    Events without a protobuf message are always written as JSON.
+    """
+    if event_format == 'json' or event_data.get('event_type') not in EVENT_MESSAGES:
+        return [('', encode_json(event_data))]
+
+    records = []
+    if event_format == 'dual':
+        records.append(('', encode_json(event_data)))
+    records.append((PROTOBUF_TOPIC_SUFFIX, encode_protobuf(event_data)))
+    return records
+
+
+def decode_message(value):
+    """events.proto message of a value written in the protobuf format"""
+    header = events_pb2.EventEnvelope.FromString(value).header
+    message_class = EVENT_MESSAGES.get(header.event_type)
+    if message_class is None:
+        raise ValueError(f"Unknown event type {header.event_type!r}")
+    if header.schema_version > SCHEMA_VERSION:
+        raise ValueError(f"Event schema version {header.schema_version} is newer than {SCHEMA_VERSION}")
+    return message_class.FromString(value)
+
+
+def decode(value):
+    """Event dict of a message value in either format, with the timestamp as a naive UTC datetime"""
+    # A protobuf event starts with the header tag, never with '{'
+    if value[:1] == b'{':
+        event_data = json.loads(value)
+        event_data['timestamp'] = datetime.fromisoformat(event_data['timestamp'])
+        return event_data
+
+    message = decode_message(value)
+    event_data = {'event_type': message.header.event_type}
+    for field in message.DESCRIPTOR.fields:
+        if field.name != 'header':
+            event_data[field.name] = getattr(message, field.name)
+    event_data['timestamp'] = from_millis(message.header.timestamp_ms)
+    return event_data
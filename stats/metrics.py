@@ -0,0 +1,32 @@
+import logging
+from prometheus_client import Counter, Histogram, start_http_server
+from config import Config
+
+EVENTS = Counter(
+    'stats_events_total',
+    'Consumed records by outcome: applied, duplicate (applied before) or invalid',
+    ['topic', 'outcome']
+)
+BATCH_SIZE = Histogram(
+    'stats_batch_records',
+    'Records per applied batch',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+)
+BATCH_APPLY_SECONDS = Histogram(
+    'stats_batch_apply_seconds',
+    'Time to apply a batch to the database, from the first statement to the commit',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+BATCH_FAILURES = Counter(
+    'stats_batch_failures_total',
+    'Attempts to apply a batch that failed and are retried'
+)
+
+
+def start_metrics_server():
+    if not Config.METRICS_PORT:
+        return None
+
+    start_http_server(Config.METRICS_PORT)
+    logging.info(f"Stats metrics served on port {Config.METRICS_PORT}")
+    return Config.METRICS_PORT
@@ -0,0 +1,60 @@
+"""Database schema of the stats service.
+
+The consumer doesn't create tables on startup, so this runs once per deploy
+before it:
+
+    python migrate.py           create the missing tables and indexes
+    python migrate.py check     exit with status 1 while tables are missing
+"""
+import logging
+import sys
+from sqlalchemy import create_engine, inspect
+from models import Base
+from config import Config
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+def missing_tables(connection):
+    """Names of the tables of the models that don't exist yet"""
+    existing = set(inspect(connection).get_table_names())
+    return [name for name in Base.metadata.tables if name not in existing]
+
+
+def migrate(engine):
+    """Create the missing tables and their indexes; returns the names of the created tables"""
+    with engine.begin() as connection:
+        created = missing_tables(connection)
+        Base.metadata.create_all(connection)
+    return created
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'create'
+    if command not in ('create', 'check'):
+        print(__doc__)
+        return 2
+
+    engine = create_engine(Config.DATABASE_URL)
+    try:
+        if command == 'check':
+            with engine.connect() as connection:
+                missing = missing_tables(connection)
+            if missing:
+                logging.error(f"Missing tables: {', '.join(missing)}")
+                return 1
+            logging.info("Stats schema is up to date")
+            return 0
+
+        created = migrate(engine)
+        logging.info(f"Created tables: {', '.join(created)}" if created else "Stats schema is up to date")
+        return 0
+    finally:
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,58 @@
+from sqlalchemy import create_engine, Column, Integer, BigInteger, String, DateTime, Index
+from sqlalchemy.orm import declarative_base, sessionmaker
+from datetime import datetime
+from config import Config
+
+Base = declarative_base()
+
+
+class PostView(Base):
+    """A post_view event; views counted from summaries have no rows here"""
+    __tablename__ = 'post_views'
+
+    id = Column(BigInteger, primary_key=True)
+    post_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_post_views_post_id_timestamp', post_id, timestamp),
+    )
+
+
+class PostViewsStats(Base):
+    __tablename__ = 'post_views_stats'
+
+    post_id = Column(BigInteger, primary_key=True)
+    views_count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PostLikesStats(Base):
+    __tablename__ = 'post_likes_stats'
+
+    post_id = Column(BigInteger, primary_key=True)
+    likes_count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PostCommentsStats(Base):
+    __tablename__ = 'post_comments_stats'
+
+    post_id = Column(BigInteger, primary_key=True)
+    comments_count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ConsumerOffset(Base):
+    """Last offset of each partition applied to the tables above, written in the same transaction"""
+    __tablename__ = 'consumer_offsets'
+
+    topic = Column(String(255), primary_key=True)
+    partition = Column(Integer, primary_key=True)
+    offset = Column(BigInteger, nullable=False)
+
+
+def init_db(database_url):
+    engine = create_engine(database_url, pool_size=Config.DB_POOL_SIZE, pool_pre_ping=True)
+    return sessionmaker(bind=engine)
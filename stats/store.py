@@ -0,0 +1,84 @@
+from datetime import datetime
+import time
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from aggregation import StatsBatch
+from models import PostView, PostViewsStats, PostLikesStats, PostCommentsStats, ConsumerOffset
+import metrics
+
+
+def applied_offsets(session, partitions):
+    """Last applied offset of each (topic, partition), locked until the transaction ends"""
+    rows = session.execute(
+        select(ConsumerOffset.topic, ConsumerOffset.partition, ConsumerOffset.offset)
+        .where(tuple_(ConsumerOffset.topic, ConsumerOffset.partition).in_(list(partitions)))
+        .with_for_update()
+    )
+    return {(topic, partition): offset for topic, partition, offset in rows}
+
+
+def add_counts(session, model, column, counts, now):
+    """Add per-post deltas, negative ones included, to a stats table with one multi-row upsert"""
+    # A like and its unlike in the same batch change nothing
+    post_ids = sorted(post_id for post_id, delta in counts.items() if delta)
+    if not post_ids:
+        return
+
+    # Rows in post_id order, so concurrent batches lock them in the same order
+    stmt = insert(model).values([
+        {'post_id': post_id, column: counts[post_id], 'updated_at': now} for post_id in post_ids
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[model.post_id],
+        set_={column: getattr(model, column) + getattr(stmt.excluded, column), 'updated_at': stmt.excluded.updated_at}
+    )
+    session.execute(stmt)
+
+
+def store_offsets(session, offsets):
+    stmt = insert(ConsumerOffset).values([
+        {'topic': topic, 'partition': partition, 'offset': offset}
+        for (topic, partition), offset in sorted(offsets.items())
+    ])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[ConsumerOffset.topic, ConsumerOffset.partition],
+        set_={'offset': stmt.excluded.offset}
+    ))
+
+
+def apply_records(db_session, records):
+    """Aggregate Kafka records and apply them in one transaction; returns the StatsBatch.
+
+    Records at or before the offset stored for their partition were applied
+    by an earlier transaction (the Kafka commit after it was lost) and are
+    skipped, so applying the same records again changes nothing.
+    """
+    started = time.monotonic()
+    with db_session() as session:
+        applied = applied_offsets(session, {(record.topic, record.partition) for record in records})
+        batch = StatsBatch()
+        duplicates = []
+        for record in records:
+            last = applied.get((record.topic, record.partition))
+            if last is not None and record.offset <= last:
+                duplicates.append(record.topic)
+                continue
+            batch.add_record(record)
+
+        if batch.offsets:
+            now = datetime.utcnow()
+            if batch.view_rows:
+                session.execute(insert(PostView), batch.view_rows)
+            add_counts(session, PostViewsStats, 'views_count', batch.views, now)
+            add_counts(session, PostLikesStats, 'likes_count', batch.likes, now)
+            add_counts(session, PostCommentsStats, 'comments_count', batch.comments, now)
+            store_offsets(session, batch.offsets)
+            session.commit()
+
+    metrics.BATCH_APPLY_SECONDS.observe(time.monotonic() - started)
+    metrics.BATCH_SIZE.observe(len(records))
+    for topic, count in batch.applied.items():
+        metrics.EVENTS.labels(topic, 'applied').inc(count)
+    for topic in duplicates:
+        metrics.EVENTS.labels(topic, 'duplicate').inc()
+    return batch
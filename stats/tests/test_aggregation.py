@@ -0,0 +1,148 @@
+import unittest
+from unittest.mock import MagicMock
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy.dialects import postgresql
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aggregation import StatsBatch
+from store import apply_records
+import event_codec
+
+Record = namedtuple('Record', 'topic partition offset value')
+
+
+def record(topic, offset, event_data, partition=0, event_format='json'):
+    event_data = dict(event_data, timestamp='2025-03-01T12:00:00')
+    [(_, value)] = event_codec.encode(event_data, event_format)
+    return Record(topic, partition, offset, value)
+
+
+def view(offset, post_id, user_id=1, **kwargs):
+    return record('post_views', offset, {'event_type': 'post_view', 'user_id': user_id, 'post_id': post_id},
+                  **kwargs)
+
+
+def like(offset, post_id, user_id=1, event_type='post_like', **kwargs):
+    return record('post_likes', offset, {'event_type': event_type, 'user_id': user_id, 'post_id': post_id},
+                  **kwargs)
+
+
+def unlike(offset, post_id, user_id=1, **kwargs):
+    return like(offset, post_id, user_id, event_type='post_unlike', **kwargs)
+
+
+class TestStatsBatch(unittest.TestCase):
+
+    def test_aggregates_per_post(self):
+        batch = StatsBatch()
+        for item in [view(0, 1), view(1, 1, user_id=2), view(2, 2, event_format='protobuf'), like(0, 1),
+                     record('post_comments', 0, {'event_type': 'post_comment', 'user_id': 3, 'post_id': 2,
+                                                 'comment_id': 7})]:
+            self.assertTrue(batch.add_record(item))
+
+        self.assertEqual(batch.views, {1: 2, 2: 1})
+        self.assertEqual(batch.likes, {1: 1})
+        self.assertEqual(batch.comments, {2: 1})
+        self.assertEqual(len(batch.view_rows), 3)
+        self.assertEqual(batch.view_rows[2], {'post_id': 2, 'user_id': 1, 'timestamp': datetime(2025, 3, 1, 12)})
+        self.assertEqual(batch.offsets, {('post_views', 0): 2, ('post_likes', 0): 0, ('post_comments', 0): 0})
+
+    def test_view_summary_adds_views(self):
+        batch = StatsBatch()
+        batch.add_record(record('post_view_counts', 4, {
+            'event_type': 'post_view_summary', 'post_id': 3, 'views': 40, 'viewers': 12,
+            'window_start_ms': 0, 'window_end_ms': 1000
+        }))
+
+        self.assertEqual(batch.views, {3: 40})
+        self.assertEqual(batch.view_rows, [])
+
+    def test_unlike_takes_like_back(self):
+        batch = StatsBatch()
+        for item in [like(0, 1), like(1, 1, user_id=2), unlike(2, 1), unlike(3, 2, event_format='protobuf'),
+                     like(4, 3), unlike(5, 3)]:
+            self.assertTrue(batch.add_record(item))
+
+        self.assertEqual(batch.likes, {1: 1, 2: -1, 3: 0})
+
+    def test_invalid_record_skipped(self):
+        batch = StatsBatch()
+
+        self.assertFalse(batch.add_record(Record('post_views', 0, 5, b'not an event')))
+        self.assertFalse(batch.add_record(record('post_views', 6, {'event_type': 'post_cache_invalidation',
+                                                                   'post_id': 1})))
+        self.assertEqual(batch.views, {})
+        # Still counted as consumed, so the offset moves past them
+        self.assertEqual(batch.offsets, {('post_views', 0): 6})
+
+
+class TestApplyRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.session = MagicMock()
+        self.stored_offsets = []
+        self.session.execute.side_effect = lambda *args: self.stored_offsets if len(self.statements()) == 1 else None
+        self.db_session = MagicMock()
+        self.db_session.return_value.__enter__.return_value = self.session
+
+    def statements(self):
+        return [call[0][0] for call in self.session.execute.call_args_list]
+
+    def sql(self, statement):
+        return str(statement.compile(dialect=postgresql.dialect()))
+
+    def test_one_upsert_per_table(self):
+        records = [view(offset, post_id) for offset, post_id in enumerate([1, 2, 1, 3, 2, 1])]
+        records += [like(offset, post_id) for offset, post_id in enumerate([1, 1, 2])]
+
+        batch = apply_records(self.db_session, records)
+
+        # Offsets lookup, view rows, views, likes, offsets
+        self.assertEqual(len(self.statements()), 5)
+        self.assertIn('FOR UPDATE', self.sql(self.statements()[0]))
+        view_rows = self.session.execute.call_args_list[1][0][1]
+        self.assertEqual(len(view_rows), 6)
+        views_sql = self.sql(self.statements()[2])
+        self.assertIn('INSERT INTO post_views_stats', views_sql)
+        self.assertIn('ON CONFLICT (post_id) DO UPDATE', views_sql)
+        self.assertIn('post_views_stats.views_count + excluded.views_count', views_sql)
+        self.assertEqual(batch.views, {1: 3, 2: 2, 3: 1})
+        self.assertIn('INSERT INTO consumer_offsets', self.sql(self.statements()[4]))
+        self.session.commit.assert_called_once()
+
+    def test_like_unlike_sequence(self):
+        records = [like(0, 1), like(1, 2), unlike(2, 1), like(3, 1, user_id=2), unlike(4, 2), unlike(5, 3)]
+
+        apply_records(self.db_session, records)
+
+        # Offsets lookup, likes, offsets; post 2 is liked and unliked in the batch
+        self.assertEqual(len(self.statements()), 3)
+        likes = self.statements()[1].compile(dialect=postgresql.dialect()).params
+        self.assertEqual({likes[f'post_id_m{i}']: likes[f'likes_count_m{i}'] for i in range(2)}, {1: 1, 3: -1})
+        self.assertIn('post_likes_stats.likes_count + excluded.likes_count', self.sql(self.statements()[1]))
+        self.session.commit.assert_called_once()
+
+    def test_applied_records_skipped(self):
+        self.stored_offsets = [('post_likes', 0, 1)]
+
+        batch = apply_records(self.db_session, [like(0, 1), like(1, 1), like(2, 5)])
+
+        self.assertEqual(batch.likes, {5: 1})
+        self.assertEqual(batch.offsets, {('post_likes', 0): 2})
+        self.session.commit.assert_called_once()
+
+    def test_nothing_written_when_all_applied(self):
+        self.stored_offsets = [('post_likes', 0, 1)]
+
+        apply_records(self.db_session, [like(0, 1), like(1, 1)])
+
+        self.assertEqual(len(self.statements()), 1)
+        self.session.commit.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
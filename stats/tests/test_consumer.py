@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from collections import namedtuple
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from consumer import StatsConsumer, commit_offsets
+from kafka.structs import TopicPartition
+
+Record = namedtuple('Record', 'topic partition offset value')
+
+
+def records(count, start=0, partition=0):
+    return [Record('post_likes', partition, offset, b'{}') for offset in range(start, start + count)]
+
+
+class TestStatsConsumer(unittest.TestCase):
+
+    def setUp(self):
+        self.kafka = MagicMock()
+        self.kafka.poll.return_value = {}
+        self.apply_patch = patch('consumer.apply_records')
+        self.apply_records = self.apply_patch.start()
+        self.db_session = MagicMock()
+        self.consumer = StatsConsumer(self.kafka, self.db_session, ['post_likes'],
+                                      max_batch_size=10, max_latency=60, retry_interval=0)
+
+    def tearDown(self):
+        self.apply_patch.stop()
+
+    def poll_returns(self, *batches):
+        self.kafka.poll.side_effect = [{TopicPartition('post_likes', 0): batch} for batch in batches]
+
+    def test_batch_applied_when_full(self):
+        self.poll_returns(records(6), records(4, start=6))
+
+        self.consumer.poll()
+        self.assertFalse(self.consumer.batch_due())
+        self.assertEqual(self.kafka.poll.call_args[1]['max_records'], 10)
+        self.consumer.poll()
+        self.assertEqual(self.kafka.poll.call_args[1]['max_records'], 4)
+        self.assertTrue(self.consumer.batch_due())
+
+        self.assertTrue(self.consumer.flush())
+        self.apply_records.assert_called_once()
+        self.assertEqual(len(self.apply_records.call_args[0][1]), 10)
+        self.kafka.commit.assert_called_once_with(commit_offsets(records(10)))
+        self.assertEqual(self.consumer.records, [])
+
+    def test_batch_applied_after_max_latency(self):
+        self.poll_returns(records(2))
+
+        with patch('consumer.time.monotonic', return_value=100):
+            self.consumer.poll()
+        with patch('consumer.time.monotonic', return_value=159):
+            self.assertFalse(self.consumer.batch_due())
+        with patch('consumer.time.monotonic', return_value=160):
+            self.assertTrue(self.consumer.batch_due())
+
+    def test_poll_waits_for_the_rest_of_the_latency(self):
+        self.poll_returns(records(2), [])
+
+        with patch('consumer.time.monotonic', return_value=100):
+            self.consumer.poll()
+        with patch('consumer.time.monotonic', return_value=130):
+            self.consumer.poll()
+
+        self.assertEqual(self.kafka.poll.call_args[1]['timeout_ms'], 30000)
+
+    def test_offsets_committed_only_after_apply(self):
+        self.poll_returns(records(3))
+        self.consumer.poll()
+        self.apply_records.side_effect = [Exception("database down"), Exception("database down"), MagicMock()]
+
+        def commit(offsets):
+            self.assertEqual(self.apply_records.call_count, 3)
+        self.kafka.commit.side_effect = commit
+
+        self.assertTrue(self.consumer.flush())
+        self.kafka.commit.assert_called_once()
+
+    def test_stopped_before_apply_commits_nothing(self):
+        self.poll_returns(records(3))
+        self.consumer.poll()
+        self.apply_records.side_effect = Exception("database down")
+        self.consumer.stop()
+
+        self.assertFalse(self.consumer.flush())
+        self.kafka.commit.assert_not_called()
+        self.assertEqual(len(self.consumer.records), 3)
+
+    def test_commit_failure_after_apply_drops_batch(self):
+        self.poll_returns(records(3))
+        self.consumer.poll()
+        self.kafka.commit.side_effect = Exception("rebalance in progress")
+
+        self.assertTrue(self.consumer.flush())
+        self.assertEqual(self.consumer.records, [])
+
+    def test_pending_batch_applied_on_revoke(self):
+        self.poll_returns(records(3))
+        self.consumer.poll()
+
+        self.consumer.on_partitions_revoked({TopicPartition('post_likes', 0)})
+
+        self.apply_records.assert_called_once()
+        self.kafka.commit.assert_called_once()
+
+    def test_commit_offsets_per_partition(self):
+        offsets = commit_offsets(records(3) + records(2, start=7, partition=1))
+
+        self.assertEqual(offsets[TopicPartition('post_likes', 0)].offset, 3)
+        self.assertEqual(offsets[TopicPartition('post_likes', 1)].offset, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
-from flask import Flask
+from flask import Flask, Response
+from sqlalchemy import text
 from flask_cors import CORS
-from routes.user_routes import user_blueprint
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from routes.user_routes import user_blueprint, event_producer
 from models import db
+from db_pool import watch_pool
+from migrate import missing_tables
 from config import Config
 
 app = Flask(__name__)
@@ -16,8 +20,35 @@ app.register_blueprint(user_blueprint, url_prefix='/api')
 def home():
     return {"message": "User Service is running", "version": "1.0.0"}
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """200 once the database is migrated and events can be published, 503 until then"""
+    reasons = []
+    try:
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+            missing = missing_tables(connection)
+        if missing:
+            reasons.append(f"missing tables: {', '.join(missing)}, run migrate.py")
+    except Exception as e:
+        reasons.append(f"database unavailable: {str(e)}")
+
+    # A disk spool keeps the events until Kafka is back
+    if event_producer.spool is None and not event_producer.connected():
+        reasons.append("Kafka unavailable")
+
+    if reasons:
+        return {"ready": False, "reasons": reasons}, 503
+    return {"ready": True}
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+# Tables are created by migrate.py, not on startup
 with app.app_context():
-    db.create_all()
+    watch_pool(db.engine.pool, Config.DB_POOL_SIZE + max(Config.DB_MAX_OVERFLOW, 0))
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Without the reloader: its watcher process would hold the event spool
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,25 @@
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+import metrics
+
+
+class TimedQueuePool(QueuePool):
+    """Records how long each checkout waited for a connection and how many timed out"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            metrics.DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def watch_pool(pool, capacity):
+    """Export the checked out connections and the saturation of an engine's pool"""
+    capacity = max(capacity, 1)
+    metrics.DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    metrics.DB_POOL_SATURATION.set_function(lambda: pool.checkedout() / capacity)
@@ -0,0 +1,43 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'users_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a connection from the pool',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_TIMEOUTS = Counter(
+    'users_db_pool_checkout_timeouts_total',
+    'Checkouts that gave up after DB_POOL_TIMEOUT'
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'users_db_pool_checked_out',
+    'Connections currently checked out of the pool'
+)
+DB_POOL_SATURATION = Gauge(
+    'users_db_pool_saturation',
+    'Checked out connections relative to DB_POOL_SIZE + DB_MAX_OVERFLOW'
+)
+KAFKA_DELIVERY_SECONDS = Histogram(
+    'users_kafka_delivery_seconds',
+    'Time from queueing an event until the broker acknowledged or rejected it',
+    ['topic'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+KAFKA_EVENTS = Counter(
+    'users_kafka_events_total',
+    'Events by outcome: sent, failed or dropped because the buffer was full',
+    ['topic', 'outcome']
+)
+KAFKA_PENDING = Gauge(
+    'users_kafka_pending_events',
+    'Events queued and not acknowledged yet'
+)
+KAFKA_SPOOL_RECORDS = Counter(
+    'users_kafka_spool_records_total',
+    'Spooled records by outcome: spooled, replayed, dropped when the spool was full or corrupt',
+    ['outcome']
+)
+KAFKA_SPOOL_BYTES = Gauge(
+    'users_kafka_spool_bytes',
+    'Bytes of spooled records waiting for replay'
+)
@@ -0,0 +1,59 @@
+"""Database schema of the users service.
+
+app.py doesn't create tables on startup, so this runs once per deploy
+before it:
+
+    python migrate.py           create the missing tables
+    python migrate.py check     exit with status 1 while tables are missing
+"""
+import logging
+import sys
+from sqlalchemy import inspect
+from flask import Flask
+from models import db
+from config import Config
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+def missing_tables(connection):
+    """Names of the tables of the models that don't exist yet"""
+    existing = set(inspect(connection).get_table_names())
+    return [name for name in db.metadata.tables if name not in existing]
+
+
+def create_app():
+    # Without the blueprints: importing them would start the Kafka producer
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'create'
+    if command not in ('create', 'check'):
+        print(__doc__)
+        return 2
+
+    with create_app().app_context():
+        with db.engine.connect() as connection:
+            missing = missing_tables(connection)
+
+        if command == 'check':
+            if missing:
+                logging.error(f"Missing tables: {', '.join(missing)}")
+                return 1
+            logging.info("Users schema is up to date")
+            return 0
+
+        db.create_all()
+        logging.info(f"Created tables: {', '.join(missing)}" if missing else "Users schema is up to date")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
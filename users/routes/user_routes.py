@@ -7,10 +7,13 @@ from models import User, db
 from config import Config
 from email_validator import validate_email, EmailNotValidError
 from kafka_producer import EventProducer
+import atexit
 import logging
 
 user_blueprint = Blueprint('users', __name__)
 event_producer = EventProducer(Config.KAFKA_BOOTSTRAP_SERVERS)
+# Deliver the events still queued when the process exits
+atexit.register(event_producer.close)
 
 
 class UserRegistrationSchema(Schema):
@@ -85,7 +88,7 @@ def register():
 
         # Send user registration event to Kafka
         if event_producer.send_user_registration_event(new_user.id):
-            logging.info(f"User registration event sent for user_id: {new_user.id}")
+            logging.info(f"User registration event queued for user_id: {new_user.id}")
         else:
             logging.error(f"Failed to send user registration event for user_id: {new_user.id}")
 
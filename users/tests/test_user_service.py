@@ -2,12 +2,16 @@ import pytest
 import sys
 import os
 import datetime
+from unittest.mock import MagicMock, patch
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app
 from models import db, User
 from services.user_service import UserService
+from kafka_producer import EventProducer
+import event_codec
+from config import Config
 
 
 @pytest.fixture
@@ -87,3 +91,92 @@ def test_update_user(client):
 
         assert updated_user.created_at == created_at
         assert updated_user.updated_at > created_at
+
+
+def test_metrics_endpoint(client):
+    """Тест экспорта метрик пула соединений"""
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert b'users_db_pool_checkout_wait_seconds' in response.data
+    assert b'users_db_pool_saturation' in response.data
+
+
+def test_registration_event_not_awaited():
+    """Тест асинхронной отправки события регистрации"""
+    with patch('kafka_producer.KafkaProducer') as kafka:
+        future = MagicMock()
+        kafka.return_value.send.return_value = future
+        producer = EventProducer('kafka:9092')
+
+        assert producer.send_user_registration_event(1)
+        future.get.assert_not_called()
+        assert producer.pending == 1
+
+        callback, *args = future.add_callback.call_args[0]
+        callback(*args, MagicMock(topic='user_registrations', partition=0, offset=0))
+        assert producer.pending == 0
+
+
+def test_registration_event_dropped_when_buffer_full():
+    """Тест отбрасывания событий при заполненном буфере"""
+    with patch('kafka_producer.KafkaProducer'), patch.object(Config, 'KAFKA_MAX_PENDING', 0):
+        producer = EventProducer('kafka:9092')
+
+        assert not producer.send_user_registration_event(1)
+        producer.producer.send.assert_not_called()
+
+
+def test_registration_event_protobuf_format():
+    """Тест отправки события регистрации в формате protobuf"""
+    with patch('kafka_producer.KafkaProducer') as kafka, patch.object(Config, 'EVENT_FORMAT', 'protobuf'):
+        producer = EventProducer('kafka:9092')
+
+        assert producer.send_user_registration_event(7)
+
+        topic, value = kafka.return_value.send.call_args[0]
+        assert topic == 'user_registrations.pb'
+        event = event_codec.decode(value)
+        assert event['event_type'] == 'user_registration'
+        assert event['user_id'] == 7
+
+
+def test_registration_event_keyed_by_user():
+    """Тест ключа партиционирования события регистрации"""
+    with patch('kafka_producer.KafkaProducer') as kafka:
+        producer = EventProducer('kafka:9092')
+
+        producer.send_user_registration_event(15)
+
+        assert kafka.return_value.send.call_args[1]['key'] == b'15'
+
+
+def test_ready_endpoint(client):
+    """Тест готовности: таблицы созданы, события можно публиковать"""
+    with patch('app.event_producer') as producer:
+        producer.spool = None
+        producer.connected.return_value = True
+        response = client.get('/ready')
+
+        assert response.status_code == 200
+        assert response.get_json() == {"ready": True}
+
+        producer.connected.return_value = False
+        response = client.get('/ready')
+
+        assert response.status_code == 503
+        assert response.get_json()['reasons'] == ["Kafka unavailable"]
+
+
+def test_ready_endpoint_without_tables(client):
+    """Тест готовности до миграции схемы"""
+    with app.app_context():
+        db.drop_all()
+
+    with patch('app.event_producer') as producer:
+        producer.spool = None
+        producer.connected.return_value = True
+        response = client.get('/ready')
+
+    assert response.status_code == 503
+    assert 'missing tables: users' in response.get_json()['reasons'][0]